@@ -0,0 +1,36 @@
+"""Add user_digests table
+
+Revision ID: 3f2a9c71d5e8
+Revises: b34d8605ec6d
+Create Date: 2026-10-18 00:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f2a9c71d5e8"
+down_revision: Union[str, Sequence[str], None] = "b34d8605ec6d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_digests",
+        sa.Column("plugin_name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("match_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("digest", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("plugin_name", "match_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_digests")
@@ -0,0 +1,38 @@
+"""Add user_period_digests table
+
+Revision ID: 8d41c6e2a7b3
+Revises: 3f2a9c71d5e8
+Create Date: 2026-10-18 00:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+import sarc.db.sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d41c6e2a7b3"
+down_revision: Union[str, Sequence[str], None] = "3f2a9c71d5e8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_period_digests",
+        sa.Column(
+            "end_date", sarc.db.sqlmodel.UTCDateTime(timezone=True), nullable=False
+        ),
+        sa.Column("digest", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("end_date"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_period_digests")
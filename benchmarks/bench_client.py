@@ -0,0 +1,30 @@
+"""Throughput of the client-side computations over job series, without the database."""
+
+from datetime import timedelta
+
+import pytest
+
+from sarc.client.series import compute_time_frames
+
+from . import synthetic
+
+N_JOBS = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def job_frame():
+    return synthetic.job_frame(N_JOBS, span=timedelta(days=365))
+
+
+@pytest.mark.parametrize(
+    "frame_size", [timedelta(hours=1), timedelta(days=1)], ids=["hourly", "daily"]
+)
+def test_compute_time_frames(bench, job_frame, frame_size):
+    def compute():
+        compute_time_frames(
+            job_frame,
+            columns=["elapsed_time", "requested_cpu_cost"],
+            frame_size=frame_size,
+        )
+
+    bench(compute, items=len(job_frame), unit="jobs", rounds=3)
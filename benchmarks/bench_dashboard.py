@@ -0,0 +1,152 @@
+"""Latency of the /dash/metrics endpoints over the synthetic jobs.
+
+Requests run as admin, logged in through a mock OAuth server: it is the widest
+scope and so the slowest one. `test_dash_mixed_load` sends slow and fast requests
+concurrently, to measure the throughput of the thread pool and the connection
+pool under load. `test_dash_page_load` requests the panels like the page does.
+"""
+
+import contextvars
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import gifnoc
+import pytest
+from easy_oauth.testing.utils import OAuthMock
+from fastapi import FastAPI
+
+from sarc.config import config
+from tests.conftest import custom_db_config
+from tests.functional.api.conftest import ModifiedTestClient
+
+from . import synthetic
+
+ROUNDS = 20
+
+ENDPOINTS = [
+    "job_counts",
+    "job_times_vs_limit",
+    "metric_distribution",
+    "metric_comparison",
+    "rgu_usage",
+    "rgu_by_cluster",
+    "metric_trend",
+    "rgu_by_user",
+    "jobs",
+]
+
+
+@pytest.fixture(scope="module")
+def dash_client(bench_dash_db, bench_scale):
+    from sarc.api.metrics import router
+
+    _, _, span = bench_scale
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        port = s.getsockname()[1]
+    metadata_url = f"http://127.0.0.1:{port}/.well-known/openid-configuration"
+    with (
+        OAuthMock(port=port) as oauth_mock,
+        custom_db_config(bench_dash_db),
+        gifnoc.overlay({"sarc.server.auth.server_metadata_url": metadata_url}),
+    ):
+        app = FastAPI()
+        app.include_router(router)
+        assert config.server.auth is not None
+        config.server.auth.install(app)
+        with ModifiedTestClient(app, oauth_mock) as client:
+            client.set_email("admin@admin.admin")
+            # The whole synthetic history.
+            client.window = {
+                "start": synthetic.BASE_TIME.date().isoformat(),
+                "end": (synthetic.BASE_TIME + span).date().isoformat(),
+            }
+            yield client
+
+
+def _get_concurrently(get, requests, workers):
+    """Call `get` on each of `requests`, from `workers` threads."""
+    # The config is in context variables, which threads don't inherit.
+    contexts = [contextvars.copy_context() for _ in requests]
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda ctx, request: ctx.run(get, request), contexts, requests))
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_dash_metrics(bench, dash_client, endpoint):
+    def get():
+        response = dash_client.get(
+            f"/dash/metrics/{endpoint}", params=dash_client.window
+        )
+        assert response.status_code == 200, response.text
+
+    bench(get, unit="requests", rounds=ROUNDS, name=f"/dash/metrics/{endpoint}")
+
+
+# Mixed load: multi-month queries alongside one-day ones, as when a few users
+# open the dashboard over the whole history while others browse the last day.
+SLOW_ENDPOINTS = ["rgu_by_user", "metric_trend", "job_times_vs_limit"]
+FAST_ENDPOINTS = ["jobs", "job_counts"]
+CONCURRENCY = 8
+
+
+def test_dash_mixed_load(bench, dash_client):
+    last_day = {
+        "start": (
+            date.fromisoformat(dash_client.window["end"]) - timedelta(days=1)
+        ).isoformat(),
+        "end": dash_client.window["end"],
+    }
+    requests = [(endpoint, dash_client.window) for endpoint in SLOW_ENDPOINTS] + [
+        (endpoint, last_day) for endpoint in FAST_ENDPOINTS
+    ] * (2 * len(SLOW_ENDPOINTS))
+
+    def get(request):
+        endpoint, params = request
+        response = dash_client.get(f"/dash/metrics/{endpoint}", params=params)
+        assert response.status_code == 200, response.text
+
+    bench(
+        lambda: _get_concurrently(get, requests, CONCURRENCY),
+        items=len(requests),
+        unit="requests",
+        rounds=ROUNDS // 4,
+        name=f"/dash/metrics mixed load x{CONCURRENCY}",
+    )
+
+
+# Page load: the cheap panels in one batch, and each slow panel on its own,
+# all at the same time, like the dashboard does.
+BATCHED_PANELS = [
+    "job_counts",
+    "rgu_usage",
+    "rgu_by_cluster",
+    "jobs",
+    "metric_distribution",
+]
+
+
+def test_dash_page_load(bench, dash_client):
+    def get(request):
+        url, params = request
+        response = dash_client.get(url, params=params)
+        assert response.status_code == 200, response.text
+
+    batch = ("/dash/metrics/batch", {**dash_client.window, "panels": BATCHED_PANELS})
+    alone = [
+        (f"/dash/metrics/{endpoint}", dash_client.window) for endpoint in SLOW_ENDPOINTS
+    ]
+
+    # Until the cheap panels show.
+    bench(
+        lambda: get(batch), unit="requests", rounds=ROUNDS, name="/dash/metrics/batch"
+    )
+
+    bench(
+        lambda: _get_concurrently(get, [batch, *alone], 1 + len(alone)),
+        items=1 + len(alone),
+        unit="requests",
+        rounds=ROUNDS // 4,
+        name="/dash page load",
+    )
@@ -0,0 +1,111 @@
+"""Throughput of the ingestion path: sacct parsing, job upserts, statistics, users."""
+
+import json
+from datetime import UTC, datetime
+
+import pytest
+from sqlmodel import select
+
+from sarc.config import config
+from sarc.db.job import SlurmJobDB, SlurmState
+from sarc.scraping.jobs import bulk_upsert_jobs, parse_cache_entry
+from sarc.scraping.jobs_utils import parse_raw
+from sarc.scraping.series import compute_job_statistics
+from sarc.users.mila_ldap import MilaLDAPScraper
+
+from . import synthetic
+
+
+def test_parse_raw(bench, sacct_jobs):
+    """sacct JSON to job dicts, without the database."""
+    payload = synthetic.sacct_payload(sacct_jobs)
+    scraped = datetime(2024, 1, 1, tzinfo=UTC)
+
+    def parse():
+        for _ in parse_raw(payload, synthetic.CLUSTER, scraped, scraped):
+            pass
+
+    bench(parse, items=len(sacct_jobs), unit="jobs")
+
+
+def test_parse_cache_entry(bench, bench_users_db, bench_scale, sacct_jobs):
+    """A full `sarc parse jobs` of one cache entry: user lookup, validation, upsert.
+
+    The warmup round inserts the jobs, the timed ones update them.
+    """
+    sess = bench_users_db
+    _, _, span = bench_scale
+    clusters_cache = synthetic.clusters_cache(sess)
+
+    def parse():
+        parse_cache_entry(
+            sess,
+            synthetic.cache_entry(sacct_jobs, span=span),
+            config.clusters,
+            clusters_cache,
+        )
+        sess.commit()
+
+    bench(parse, items=len(sacct_jobs), unit="jobs", rounds=3)
+
+
+def test_bulk_upsert_jobs(bench, bench_users_db, bench_scale, sacct_jobs):
+    """The upsert alone, in batches of the size parse_cache_entry uses."""
+    sess = bench_users_db
+    _, _, span = bench_scale
+    parse_cache_entry(
+        sess,
+        synthetic.cache_entry(sacct_jobs, span=span),
+        config.clusters,
+        synthetic.clusters_cache(sess),
+    )
+    sess.commit()
+    rows = [job.model_dump(exclude={"id"}) for job in sess.exec(select(SlurmJobDB))]
+
+    def upsert():
+        for i in range(0, len(rows), 500):
+            bulk_upsert_jobs(sess, rows[i : i + 500])
+        sess.commit()
+
+    bench(upsert, items=len(rows), unit="jobs", rounds=3)
+
+
+def test_compute_job_statistics(bench):
+    """Reduction of one job's Prometheus range query to its statistics."""
+    n_samples = 2880  # one day at a 30s step
+    series = synthetic.prometheus_range(n_samples)
+    # Just enough of a job for compute_job_statistics.
+    job = SlurmJobDB(job_id=1, job_state=SlurmState.COMPLETED, allocated_mem=65536)
+    bench(
+        lambda: compute_job_statistics(job, series),
+        items=n_samples * len(series),
+        unit="samples",
+        rounds=10,
+    )
+
+
+def test_harmonize_gpu_from_nodes(bench, sacct_jobs):
+    """GPU harmonization of the GPU jobs, as `parse jobs` and `fix_gpu_types` do it."""
+    cluster = config.clusters[synthetic.CLUSTER]
+    lookups = synthetic.gpu_lookups(sacct_jobs)
+
+    def harmonize():
+        for nodes, gpu_type in lookups:
+            cluster.harmonize_gpu_from_nodes(nodes, gpu_type)
+
+    bench(harmonize, items=len(lookups), unit="jobs", rounds=10)
+
+
+@pytest.mark.usefixtures("bench_users_db")
+def test_parse_mila_ldap(bench, histories):
+    """Mila LDAP dump to user matches, with the lookup of suspended users."""
+    payload = synthetic.ldap_payload(histories)
+    n_entries = len(json.loads(payload))
+    scraped = datetime(2024, 1, 1, tzinfo=UTC)
+    scraper = MilaLDAPScraper()
+
+    def parse():
+        for _ in scraper.parse_user_data(payload, scraped):
+            pass
+
+    bench(parse, items=n_entries, unit="entries", rounds=10)
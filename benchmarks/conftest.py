@@ -0,0 +1,195 @@
+"""Fixtures and reporting for the benchmarks.
+
+Benchmarks run against throwaway databases created like the test ones (see
+`DbConfiguration` in tests/conftest.py), filled with the synthetic data of
+`benchmarks.synthetic`. Run them with `tox -e bench`, or directly:
+
+    pytest -o python_files="bench_*.py" benchmarks/ --bench-jobs 20000 --bench-json out.json
+"""
+
+import json
+import statistics
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from pathlib import Path
+
+import gifnoc
+import pytest
+
+from sarc.config import config
+from tests.conftest import DbConfiguration, custom_db_config
+
+from . import synthetic
+
+_results: list["BenchResult"] = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench")
+    group.addoption(
+        "--bench-jobs",
+        type=int,
+        default=5000,
+        help="Number of synthetic jobs to ingest and to query",
+    )
+    group.addoption(
+        "--bench-users", type=int, default=200, help="Number of synthetic users"
+    )
+    group.addoption(
+        "--bench-json",
+        type=Path,
+        default=None,
+        help="Write the results to this file, to track them across runs",
+    )
+
+
+@dataclass
+class BenchResult:
+    name: str
+    unit: str
+    items: int
+    timings: list[float]
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    @property
+    def p95(self) -> float:
+        if len(self.timings) < 2:
+            return self.timings[0]
+        return statistics.quantiles(self.timings, n=20, method="inclusive")[-1]
+
+    @property
+    def throughput(self) -> float:
+        """Items per second, on the median round."""
+        return self.items / self.median
+
+    def summary(self) -> dict:
+        return {
+            **asdict(self),
+            "median": self.median,
+            "p95": self.p95,
+            "throughput": self.throughput,
+        }
+
+
+@pytest.fixture
+def bench(request):
+    """Time a function over a few rounds and record the result.
+
+    `items` is the number of `unit`s one call processes, used to report a
+    throughput. The first `warmup` calls are not timed.
+    """
+
+    def run(
+        fn: Callable[[], object],
+        *,
+        items: int = 1,
+        unit: str = "calls",
+        rounds: int = 5,
+        warmup: int = 1,
+        name: str | None = None,
+    ) -> BenchResult:
+        for _ in range(warmup):
+            fn()
+        timings = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - t0)
+        result = BenchResult(
+            name=name or request.node.name, unit=unit, items=items, timings=timings
+        )
+        _results.append(result)
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(
+        f"{'name':<50} {'median (ms)':>12} {'p95 (ms)':>10} {'throughput':>22}"
+    )
+    for r in _results:
+        terminalreporter.write_line(
+            f"{r.name:<50} {r.median * 1000:>12.2f} {r.p95 * 1000:>10.2f}"
+            f" {r.throughput:>14.1f} {r.unit}/s"
+        )
+    if (path := config.getoption("bench_json")) is not None:
+        path.write_text(json.dumps([r.summary() for r in _results], indent=2))
+        terminalreporter.write_line(f"results written to {path}")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def base_config():
+    with gifnoc.use(Path(__file__).parent.parent / "tests" / "sarc-test.yaml"):
+        yield
+
+
+@pytest.fixture(scope="session")
+def bench_scale(pytestconfig):
+    """(number of jobs, number of users, time span of the jobs)"""
+    n_jobs = pytestconfig.getoption("bench_jobs")
+    # About 100 jobs a day, whatever the scale, like a mid-sized cluster.
+    span = timedelta(days=max(n_jobs // 100, 1))
+    return n_jobs, pytestconfig.getoption("bench_users"), span
+
+
+@pytest.fixture(scope="session")
+def histories(bench_scale):
+    _, n_users, span = bench_scale
+    return synthetic.user_histories(n_users, span=span)
+
+
+@pytest.fixture(scope="session")
+def sacct_jobs(bench_scale, histories):
+    n_jobs, _, span = bench_scale
+    return synthetic.sacct_jobs(n_jobs, histories, span=span)
+
+
+bench_users_db_config_object = DbConfiguration("bench-users", empty=True).fixture()
+
+bench_dash_db_config_object = DbConfiguration(
+    "bench-dash", empty=True, read_only=True
+).fixture()
+
+
+@pytest.fixture
+def bench_users_db(bench_users_db_config_object, histories):
+    """Fresh database with the synthetic users, but no job."""
+    with custom_db_config(bench_users_db_config_object):
+        with config.db.session() as sess:
+            synthetic.seed_gpu_rgus(sess)
+            synthetic.seed_users(sess, histories)
+            sess.commit()
+            yield sess
+
+
+@pytest.fixture(scope="session")
+def bench_dash_db(bench_dash_db_config_object, bench_scale, histories, sacct_jobs):
+    """Database with the synthetic users, jobs and job statistics.
+
+    Jobs go through the regular parsing path, like in production.
+    """
+    from sarc.scraping.jobs import parse_cache_entry
+
+    _, _, span = bench_scale
+    with custom_db_config(bench_dash_db_config_object):
+        with config.db.session() as sess:
+            synthetic.seed_gpu_rgus(sess)
+            synthetic.seed_users(sess, histories)
+            parse_cache_entry(
+                sess,
+                synthetic.cache_entry(sacct_jobs, span=span),
+                config.clusters,
+                synthetic.clusters_cache(sess),
+            )
+            synthetic.seed_statistics(sess)
+            sess.commit()
+        yield bench_dash_db_config_object
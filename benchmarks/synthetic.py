@@ -0,0 +1,382 @@
+"""Deterministic synthetic data for the benchmarks.
+
+Everything here is derived from a seeded `random.Random`, so two runs with the
+same parameters produce byte-identical payloads and comparable timings.
+"""
+
+import io
+import json
+import random
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from zipfile import ZipFile
+
+import numpy
+import pandas
+from sqlalchemy.dialects.postgresql import Range
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, col, select
+
+from sarc.cache import CacheEntry
+from sarc.db.cluster import SlurmClusterDB
+from sarc.db.job import JobStatisticDB, SlurmJobDB
+from sarc.db.support import GpuRguDB
+from sarc.db.users import CredentialsDB, UserDB
+from sarc.scraping.jobs_utils import DATE_FORMAT_HOUR
+from sarc.scraping.series import JOB_STATISTICS_METRIC_NAMES
+
+# Start of the synthetic history. Jobs are submitted after it.
+BASE_TIME = datetime(2024, 1, 1, tzinfo=UTC)
+
+# Cluster of tests/sarc-test.yaml the synthetic jobs run on, with its domain.
+CLUSTER = "mila"
+DOMAIN = "mila"
+
+# Node ranges of CLUSTER, with the gres name of their GPUs and the harmonized
+# name tests/sarc-test.yaml maps it to. None is for CPU nodes.
+NODES = {
+    "cn-a": (32, "a100", "NVidia A100 SXM4 80GB"),
+    "cn-r": (16, "rtx8000", "NVidia Quadro RTX 8000"),
+    "cn-c": (40, None, None),
+}
+
+# Final states, weighted roughly like on the real clusters.
+STATES = {
+    "COMPLETED": 60,
+    "FAILED": 15,
+    "TIMEOUT": 10,
+    "CANCELLED": 10,
+    "OUT_OF_MEMORY": 5,
+}
+
+# Statistics stored per job, normalized to [0, 1] like the real ones.
+STATISTIC_NAMES = ("gpu_sm_occupancy", "gpu_utilization", "gpu_memory", "system_memory")
+
+SLURM_VERSION = {"major": 24, "minor": 11, "micro": 0}
+
+
+@dataclass
+class UserHistory:
+    display_name: str
+    email: str
+    # (username, valid_start, valid_end) for the synthetic cluster's domain.
+    credentials: list[tuple[str, datetime | None, datetime | None]] = field(
+        default_factory=list
+    )
+
+    def username_at(self, when: datetime) -> str | None:
+        for username, start, end in self.credentials:
+            if (start is None or start <= when) and (end is None or when < end):
+                return username
+        return None
+
+
+def user_histories(
+    n_users: int, *, span: timedelta, seed: int = 0
+) -> list[UserHistory]:
+    """Users with their credential history over `span` after BASE_TIME.
+
+    One user in four changes username somewhere in the span, and one in ten
+    only gets an account after BASE_TIME, so that some of their jobs cannot be
+    attributed.
+    """
+    rng = random.Random(seed)
+    histories = []
+    for i in range(n_users):
+        history = UserHistory(
+            display_name=f"Bench User {i}", email=f"bench{i:05}@example.com"
+        )
+        start = None
+        if rng.random() < 0.1:
+            start = BASE_TIME + span * rng.random() / 2
+        if rng.random() < 0.25:
+            renamed = BASE_TIME + span * rng.uniform(0.25, 0.75)
+            if start is not None and renamed <= start:
+                renamed = start + timedelta(days=1)
+            history.credentials.append((f"bench{i:05}", start, renamed))
+            history.credentials.append((f"bench{i:05}b", renamed, None))
+        else:
+            history.credentials.append((f"bench{i:05}", start, None))
+        histories.append(history)
+    return histories
+
+
+def seed_users(sess: Session, histories: Sequence[UserHistory]) -> None:
+    """Insert users and their credentials."""
+    users = [UserDB(display_name=h.display_name, email=h.email) for h in histories]
+    sess.add_all(users)
+    sess.flush()
+    sess.add_all(
+        CredentialsDB(
+            user_id=user.id,
+            domain=DOMAIN,
+            username=username,
+            valid=Range(start, end, bounds="[)"),
+        )
+        for user, history in zip(users, histories, strict=True)
+        for username, start, end in history.credentials
+    )
+    sess.flush()
+
+
+def ldap_payload(histories: Sequence[UserHistory], *, seed: int = 0) -> bytes:
+    """Raw Mila LDAP dump of the users, as `acquire users` saves it.
+
+    Half of the users are suspended. Users who changed username also keep a
+    long-suspended entry for their old one, whose credentials are closed.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i, history in enumerate(histories):
+        usernames = [username for username, _, _ in history.credentials]
+        for username in usernames:
+            current = username == usernames[-1]
+            suspended = not current or rng.random() < 0.5
+            entries.append(
+                {
+                    "displayName": [history.display_name],
+                    "mail": [f"{username}@mila.quebec"],
+                    "posixUid": [username],
+                    "uidNumber": [str(1500000000 + i)],
+                    "suspended": ["true" if suspended else "false"],
+                }
+            )
+    return json.dumps(entries).encode("utf-8")
+
+
+def clusters_cache(sess: Session) -> dict[str, SlurmClusterDB]:
+    """Clusters by name, as `parse_jobs` passes them to `parse_cache_entry`."""
+    return {c.name: c for c in sess.exec(select(SlurmClusterDB)).all()}
+
+
+def seed_gpu_rgus(sess: Session) -> None:
+    """Make the harmonized names of NODES valid GPU types."""
+    for _, _, harmonized in NODES.values():
+        if harmonized is not None:
+            sess.merge(GpuRguDB(name=harmonized, rgu=4.0, drac_rgu=4.0))
+    sess.flush()
+
+
+def _tres(cpus: int, mem: int, gpus: int, gres: str | None) -> list[dict]:
+    tres = [
+        {"type": "cpu", "name": "", "id": 1, "count": cpus},
+        {"type": "mem", "name": "", "id": 2, "count": mem},
+        {"type": "node", "name": "", "id": 4, "count": 1},
+        {"type": "billing", "name": "", "id": 5, "count": max(gpus, 1)},
+    ]
+    if gres is not None:
+        tres.append({"type": "gres", "name": f"gpu:{gres}", "id": 1001, "count": gpus})
+    return tres
+
+
+def _number(value: int) -> dict:
+    return {"set": True, "infinite": False, "number": value}
+
+
+def sacct_jobs(
+    n_jobs: int,
+    histories: Sequence[UserHistory],
+    *,
+    span: timedelta,
+    first_job_id: int = 1_000_000,
+    seed: int = 0,
+) -> list[dict]:
+    """Job entries as found in `sacct --json` for slurm SLURM_VERSION."""
+    rng = random.Random(seed)
+    node_kinds = list(NODES)
+    states, weights = zip(*STATES.items(), strict=True)
+    seconds = span.total_seconds()
+    jobs = []
+    for i in range(n_jobs):
+        history = rng.choice(histories)
+        submit = BASE_TIME + timedelta(seconds=seconds * i / n_jobs)
+        username = history.username_at(submit) or history.credentials[0][0]
+
+        kind = rng.choice(node_kinds)
+        count, gres, _ = NODES[kind]
+        node = f"{kind}{rng.randint(1, count):03}"
+        gpus = rng.choice((1, 1, 2, 4)) if gres is not None else 0
+        cpus = rng.choice((1, 2, 4, 8))
+        mem = rng.choice((4096, 16384, 32768, 65536))
+
+        limit = rng.choice((60, 180, 720, 1440, 2880))  # minutes
+        state = rng.choices(states, weights)[0]
+        start = int(submit.timestamp()) + rng.randint(0, 3600)
+        if state == "TIMEOUT":
+            elapsed = limit * 60
+        else:
+            elapsed = int(limit * 60 * rng.random())
+        jobs.append(
+            {
+                "account": "mila",
+                "array": {"job_id": 0, "task_id": _number(0)},
+                "cluster": CLUSTER,
+                "constraints": "",
+                "exit_code": {
+                    "status": ["SUCCESS" if state == "COMPLETED" else "ERROR"],
+                    "return_code": _number(0 if state == "COMPLETED" else 1),
+                    "signal": {"id": _number(0), "name": ""},
+                },
+                "flags": [rng.choice(("STARTED_ON_SCHEDULE", "STARTED_ON_BACKFILL"))],
+                "group": username,
+                "job_id": first_job_id + i,
+                "name": f"job-{i}",
+                "nodes": node,
+                "partition": rng.choice(("main", "long", "unkillable")),
+                "priority": _number(rng.randint(1, 10_000)),
+                "qos": "normal",
+                "state": {"current": [state], "reason": "None"},
+                "submit_line": "sbatch job.sh",
+                "time": {
+                    "elapsed": elapsed,
+                    "end": start + elapsed,
+                    "limit": _number(limit),
+                    "start": start,
+                    "submission": int(submit.timestamp()),
+                },
+                "tres": {
+                    "allocated": _tres(cpus, mem, gpus, gres),
+                    "requested": _tres(cpus, mem, gpus, gres),
+                },
+                "user": username,
+                "working_directory": f"/home/{username}",
+            }
+        )
+    return jobs
+
+
+def gpu_lookups(jobs: Sequence[dict], *, seed: int = 0) -> list[tuple[list[str], str]]:
+    """(nodes, gpu type) of the GPU jobs, as `harmonize_gpu_from_nodes` gets them.
+
+    GPU types come in the forms sacct and Prometheus use ("a100", "gpu:a100",
+    "gpu:a100:4", "A100"), and one job in ten spans a second node.
+    """
+    rng = random.Random(seed)
+    lookups = []
+    for job in jobs:
+        node = job["nodes"]
+        _, gres, _ = NODES[node[:4]]
+        if gres is None:
+            continue
+        nodes = [node]
+        if rng.random() < 0.1:
+            nodes.append(f"{node[:4]}{rng.randint(1, NODES[node[:4]][0]):03}")
+        gpu_type = rng.choice(
+            (gres, f"gpu:{gres}", f"gpu:{gres}:{rng.choice((1, 2, 4))}", gres.upper())
+        )
+        lookups.append((nodes, gpu_type))
+    return lookups
+
+
+def job_frame(n_jobs: int, *, span: timedelta, seed: int = 0) -> pandas.DataFrame:
+    """Jobs as `load_job_series` returns them, for the client-side computations.
+
+    Jobs start uniformly over `span` from BASE_TIME and run for an exponential
+    duration of 3 hours on average, so that most fit in one hourly frame and a
+    few span many.
+    """
+    rng = numpy.random.default_rng(seed)
+    start_time = pandas.Timestamp(BASE_TIME) + pandas.to_timedelta(
+        rng.integers(0, int(span.total_seconds()), n_jobs), unit="s"
+    )
+    elapsed_time = rng.exponential(3 * 3600, n_jobs).astype(int)
+    return pandas.DataFrame(
+        {
+            "job_id": numpy.arange(n_jobs),
+            "cluster_name": CLUSTER,
+            "start_time": start_time,
+            "end_time": start_time + pandas.to_timedelta(elapsed_time, unit="s"),
+            "elapsed_time": elapsed_time.astype(float),
+            "requested_cpu_cost": rng.random(n_jobs) * elapsed_time,
+        }
+    )
+
+
+def sacct_payload(jobs: Sequence[dict]) -> bytes:
+    """Raw `sacct --json` output for the given job entries."""
+    return json.dumps(
+        {"meta": {"slurm": {"version": SLURM_VERSION}}, "jobs": list(jobs)}
+    ).encode("utf-8")
+
+
+def cache_entry(jobs: Sequence[dict], *, span: timedelta) -> CacheEntry:
+    """In-memory jobs cache entry holding one sacct fetch of `jobs`, as `fetch jobs` saves it."""
+    end = BASE_TIME + span
+    key = f"{CLUSTER}_{BASE_TIME.strftime(DATE_FORMAT_HOUR)}_{end.strftime(DATE_FORMAT_HOUR)}"
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode="w") as zf:
+        zf.writestr(key, sacct_payload(jobs))
+    return CacheEntry(ZipFile(buffer, mode="r"), end)
+
+
+def prometheus_range(
+    n_samples: int, *, gpus: int = 2, cores: int = 4, step: int = 30, seed: int = 0
+) -> list[dict]:
+    """One job's series for JOB_STATISTICS_METRIC_NAMES, as returned by a range query.
+
+    GPU metrics get one series per GPU, the core usage counter one per core and
+    the memory usage a single series, each with `n_samples` samples.
+    """
+    rng = random.Random(seed)
+    start = BASE_TIME.timestamp()
+    series = []
+    for name in JOB_STATISTICS_METRIC_NAMES:
+        if name == "slurm_job_core_usage":
+            labels = [{"core": str(c)} for c in range(cores)]
+        elif name == "slurm_job_memory_usage":
+            labels = [{}]
+        else:
+            labels = [{"gpu": str(g)} for g in range(gpus)]
+        for extra in labels:
+            counter = 0.0
+            values = []
+            for k in range(n_samples):
+                if name == "slurm_job_core_usage":
+                    # Nanoseconds of CPU time, so a rate in [0, 1] per core.
+                    counter += step * 1e9 * rng.random()
+                    value = counter
+                elif name == "slurm_job_memory_usage":
+                    value = rng.uniform(1, 8) * 2**30
+                elif name == "slurm_job_power_gpu":
+                    value = rng.uniform(50, 400)
+                else:
+                    value = rng.uniform(0, 100)
+                values.append([start + k * step, str(value)])
+            series.append(
+                {
+                    "metric": {"__name__": name, "instance": "cn-a001", **extra},
+                    "values": values,
+                }
+            )
+    return series
+
+
+def seed_statistics(sess: Session, seed: int = 0, batch_size: int = 2000) -> None:
+    """Add STATISTIC_NAMES statistics to every GPU job."""
+    rng = random.Random(seed)
+    job_ids = sess.exec(
+        select(SlurmJobDB.id)
+        .where(col(SlurmJobDB.allocated_gres_gpu) > 0)
+        .order_by(col(SlurmJobDB.id))
+    ).all()
+    rows = []
+    for job_id in job_ids:
+        for name in STATISTIC_NAMES:
+            values = sorted(rng.random() for _ in range(5))
+            rows.append(
+                {
+                    "job_id": job_id,
+                    "name": name,
+                    "q05": values[0],
+                    "q25": values[1],
+                    "median": values[2],
+                    "q75": values[3],
+                    "max": values[4],
+                    "mean": sum(values) / len(values),
+                    "std": (values[4] - values[0]) / 4,
+                }
+            )
+    for i in range(0, len(rows), batch_size):
+        sess.exec(pg_insert(JobStatisticDB).values(rows[i : i + batch_size]))
+    sess.flush()
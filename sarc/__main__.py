@@ -0,0 +1,6 @@
+from sarc.cli import main
+
+if __name__ == "__main__":
+    returncode = main()
+    if returncode > 0:
+        raise SystemExit(returncode)
@@ -1,6 +1,7 @@
 import logging
 import math
 import os
+import sqlite3
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -52,7 +53,7 @@ def check_disk_space_for_cache(max_size_bytes: int) -> bool:
         return True
 
     logger.debug(f"[sarc-cache] folder: {cache_path}")
-    cache_size_bytes = _get_physical_size(cache_path)
+    cache_size_bytes = _get_cache_size(cache_path)
     if cache_size_bytes is None:
         logger.critical(
             f"[sarc-cache] cannot get size for cache folder (inexistent or permission error): {cache_path}"
@@ -67,6 +68,22 @@ def check_disk_space_for_cache(max_size_bytes: int) -> bool:
     return True
 
 
+def _get_cache_size(cache_path: Path) -> int | None:
+    """Size of the cache from its index, walking the cache only if it must."""
+    from sarc.cache import CacheIndex
+
+    if not cache_path.exists():
+        return 0
+    try:
+        return CacheIndex(cache_path).reconciled().total_size()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(
+            f"[sarc-cache] cannot use cache index, walking the cache: "
+            f"{type(e).__name__}: {e}"
+        )
+        return _get_physical_size(cache_path)
+
+
 def _get_physical_size(path: Path | str) -> int | None:
     if not os.path.exists(path):
         return 0
@@ -7,9 +7,8 @@ import sqlalchemy
 from sqlmodel import case, col, func, select
 
 from sarc.alerts.common import CheckResult, HealthCheck
-from sarc.alerts.usage_alerts.alert_sql_utils import SqlSymbols
+from sarc.alerts.usage_alerts.job_window import JobWindowCheck, job_source
 from sarc.db.cluster import SlurmClusterDB
-from sarc.db.job import SlurmJobDB
 
 logger = logging.getLogger(__name__)
 
@@ -53,8 +52,6 @@ def check_gpu_type_usage_per_node(
     bool
         True if check succeeds, False otherwise.
     """
-    from sarc.config import config
-
     if not gpu_type:
         logger.error("No GPU type specified.")
         return False
@@ -64,42 +61,39 @@ def check_gpu_type_usage_per_node(
         minimum_runtime = timedelta(seconds=0)
 
     ok = True
-    with config.db.session() as sess:
-        if not sess.exec(select(func.count(col(SlurmJobDB.id)))).one():
+    with job_source(time_interval) as source:
+        if not source.has_jobs:
             logger.warning("No jobs in database.")
             return False
 
-        # Determine [start, end] and clipped elapsed time for frame iteration and comparison.
-        start, end, clipped_elapsed_time = (
-            SqlSymbols.convert_job_time_interval_to_sql_bounds(sess, time_interval)
-        )
-        eff_start = SqlSymbols.eff_start
-        eff_end = SqlSymbols.eff_end
+        # [start, end] and clipped elapsed time for frame iteration and comparison.
+        start, end = source.start, source.end
+        jobs = source.c
 
         ignore_min_tasks_for_clusters = set(ignore_min_tasks_for_clusters or ())
         # Select only jobs in (start, end) where elapsed time >= minimum runtime and gres_gpu > 0.
         # `nodes` is a list of nodes. We explode this column to count each job for each of its node.
-        for cluster_name, node, nb_gpu_tasks, nb_tasks in sess.exec(
+        for cluster_name, node, nb_gpu_tasks, nb_tasks in source.sess.exec(
             select(
                 SlurmClusterDB.name,
-                func.jsonb_array_elements_text(SlurmJobDB.nodes).label("node"),
+                func.jsonb_array_elements_text(jobs.nodes).label("node"),
                 func.sum(
                     case(
-                        (SlurmJobDB.harmonized_gpu_type == gpu_type, 1),
-                        (SlurmJobDB.allocated_gpu_type == gpu_type, 1),
+                        (jobs.harmonized_gpu_type == gpu_type, 1),
+                        (jobs.allocated_gpu_type == gpu_type, 1),
                         else_=0,
                     )
                 ).label("nb_gpu_tasks"),
-                func.count(col(SlurmJobDB.id)).label("nb_tasks"),
+                func.count(jobs.id).label("nb_tasks"),
             )
-            .select_from(SlurmJobDB)
-            .join(SlurmClusterDB, col(SlurmJobDB.cluster_id) == col(SlurmClusterDB.id))
+            .select_from(source.jobs)
+            .join(SlurmClusterDB, jobs.cluster_id == col(SlurmClusterDB.id))
             .where(
-                eff_start < end,
-                eff_end > start,
-                clipped_elapsed_time
+                source.eff_start < end,
+                source.eff_end > start,
+                source.clipped_elapsed_time
                 >= sqlalchemy.literal(minimum_runtime, type_=sqlalchemy.Interval),
-                col(SlurmJobDB.allocated_gres_gpu) > 0,
+                jobs.allocated_gres_gpu > 0,
             )
             .group_by(SlurmClusterDB.name, sqlalchemy.text("node"))
         ):
@@ -121,7 +115,7 @@ def check_gpu_type_usage_per_node(
 
 
 @dataclass
-class NodeGpuUsageCheck(HealthCheck):
+class NodeGpuUsageCheck(JobWindowCheck, HealthCheck):
     """Health check for GPU usage per node"""
 
     gpu_type: str = ""  # ** required **
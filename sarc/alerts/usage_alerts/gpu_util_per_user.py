@@ -6,8 +6,7 @@ import sqlalchemy
 from sqlmodel import case, col, func, select
 
 from sarc.alerts.common import CheckResult, HealthCheck
-from sarc.alerts.usage_alerts.alert_sql_utils import SqlSymbols
-from sarc.db.job import SlurmJobDB
+from sarc.alerts.usage_alerts.job_window import JobWindowCheck, job_source
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +45,6 @@ def check_gpu_util_per_user(
     bool
         True if check succeeds, False otherwise.
     """
-    from sarc.config import config
     from sarc.db.job import JobStatisticDB
 
     if threshold is None:
@@ -58,17 +56,15 @@ def check_gpu_util_per_user(
         minimum_runtime = timedelta(seconds=0)
 
     ok = True
-    with config.db.session() as sess:
-        if not sess.exec(select(func.count(col(SlurmJobDB.id)))).one():
+    with job_source(time_interval) as source:
+        if not source.has_jobs:
             logger.error("No jobs in database.")
             return False
 
-        # Determine [start, end] and clipped elapsed time for frame iteration and comparison.
-        start, end, clipped_elapsed_time = (
-            SqlSymbols.convert_job_time_interval_to_sql_bounds(sess, time_interval)
-        )
-        eff_start = SqlSymbols.eff_start
-        eff_end = SqlSymbols.eff_end
+        # [start, end] and clipped elapsed time for frame iteration and comparison.
+        start, end = source.start, source.end
+        clipped_elapsed_time = source.clipped_elapsed_time
+        jobs = source.c
 
         # SQL query to compute average GPU-util per user.
         # GPU-util for a job = gpu_utilization * clipped_elapsed_time * allocated_gres_gpu.
@@ -79,28 +75,29 @@ def check_gpu_util_per_user(
         gpu_utilization = case((gpu_utilization > 1.0, None), else_=gpu_utilization)  # ty:ignore[unsupported-operator]
 
         clipped_elapsed_seconds = func.extract("epoch", clipped_elapsed_time)
-        gpu_equivalent_cost = clipped_elapsed_seconds * SlurmJobDB.allocated_gres_gpu
+        gpu_equivalent_cost = clipped_elapsed_seconds * jobs.allocated_gres_gpu
         gpu_util = gpu_utilization * gpu_equivalent_cost
 
         query = (
-            select(SlurmJobDB.cluster_user, func.avg(gpu_util).label("avg_gpu_util"))
+            select(jobs.cluster_user, func.avg(gpu_util).label("avg_gpu_util"))
+            .select_from(source.jobs)
             .join(
                 JobStatisticDB,
-                (col(JobStatisticDB.job_id) == col(SlurmJobDB.id))
+                (col(JobStatisticDB.job_id) == jobs.id)
                 & (JobStatisticDB.name == "gpu_utilization"),
                 isouter=True,
             )
             .where(
-                eff_start < end,
-                eff_end > start,
+                source.eff_start < end,
+                source.eff_end > start,
                 clipped_elapsed_time
                 >= sqlalchemy.literal(minimum_runtime, type_=sqlalchemy.Interval),
-                col(SlurmJobDB.allocated_gres_gpu) > 0,
+                jobs.allocated_gres_gpu > 0,
             )
-            .group_by(SlurmJobDB.cluster_user)
+            .group_by(jobs.cluster_user)
         )
 
-        for user, avg_gpu_util in sess.exec(query):
+        for user, avg_gpu_util in source.sess.exec(query):
             if avg_gpu_util is None:
                 logger.error(
                     f"[{user}] average gpu_util cannot be computed (no statistics found for matching jobs)."
@@ -117,7 +114,7 @@ def check_gpu_util_per_user(
 
 
 @dataclass
-class GpuUtilPerUserCheck(HealthCheck):
+class GpuUtilPerUserCheck(JobWindowCheck, HealthCheck):
     """Health check for GPU-utilization per user."""
 
     threshold: timedelta | None = None  # ** required **
@@ -0,0 +1,256 @@
+"""Jobs of a time window, shared by the SQL-based health checks.
+
+Several checks (GPU usage per node, GPU-util per user, same job ID, Prometheus
+stats occurrences) select the jobs which ran in [now - time_interval, now].
+When a health run has more than one of them, `shared_job_window` copies the jobs
+of the widest of these windows once, with their effective start and end
+precomputed, into a table that the checks query instead of `slurm_jobs`. The
+checks get their jobs through `job_source`, which falls back to `slurm_jobs`
+when no shared window covers their interval.
+
+The table is UNLOGGED, as it is only a copy, and is dropped at the end of the
+run. Each check reads it on its own connection, so they still run
+concurrently. A window left behind by a run which crashed is dropped by a later
+run after a day.
+"""
+
+import logging
+import secrets
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import sqlalchemy
+from sqlmodel import Session, col, func, select
+
+from sarc.alerts.usage_alerts.alert_sql_utils import SqlSymbols
+from sarc.db.job import SlurmJobDB
+
+logger = logging.getLogger(__name__)
+
+_WINDOW_PREFIX = "health_job_window_"
+
+# Age after which a window is left behind by a run which did not drop it.
+_STALE_WINDOW = timedelta(days=1)
+
+# Columns of slurm_jobs copied in the window: those the checks read.
+_WINDOW_COLUMNS = (
+    "id",
+    "cluster_id",
+    "job_id",
+    "cluster_user",
+    "nodes",
+    "submit_time",
+    "end_time",
+    "allocated_gres_gpu",
+    "allocated_gpu_type",
+    "harmonized_gpu_type",
+)
+
+
+class JobWindowCheck:
+    """Mixin for the checks which get their jobs through `job_source`."""
+
+    time_interval: timedelta | None
+
+    def job_window_interval(self) -> timedelta | None:
+        """Interval of the window [now - interval, now] the check reads, if any."""
+        return self.time_interval
+
+
+@dataclass
+class JobSource:
+    """Jobs a check reads, and the window [start, end] they are selected in.
+
+    `jobs` is either `slurm_jobs` or the table of a shared window. Its columns
+    have the same names in both cases, with `eff_start` and `eff_end` the
+    effective start and end of a job (see `SqlSymbols`).
+    """
+
+    sess: Session
+    jobs: sqlalchemy.FromClause
+    eff_start: Any
+    eff_end: Any
+    # Earliest effective start and latest effective end if the check reads all
+    # jobs, None if there are none.
+    start: datetime | None
+    end: datetime | None
+    # Time a job ran within [start, end], as an interval.
+    clipped_elapsed_time: Any
+    # Whether there are jobs at all in the database, not only in the window.
+    has_jobs: bool
+
+    @property
+    def c(self) -> sqlalchemy.ColumnCollection:
+        return self.jobs.c
+
+
+def _has_jobs(sess: Session) -> bool:
+    return sess.exec(select(SlurmJobDB.id).limit(1)).first() is not None
+
+
+def _drop_stale_windows(sess: Session, now: datetime) -> None:
+    names = (
+        sess.connection()
+        .execute(
+            sqlalchemy.text(
+                "SELECT tablename FROM pg_tables"
+                " WHERE schemaname = current_schema() AND starts_with(tablename, :prefix)"
+            ),
+            {"prefix": _WINDOW_PREFIX},
+        )
+        .scalars()
+    )
+    for name in names:
+        # The name is <prefix><creation timestamp>_<random suffix>.
+        created = datetime.fromtimestamp(int(name.split("_")[-2]), tz=UTC)
+        if now - created > _STALE_WINDOW:
+            logger.warning(f"Dropping job window left behind: {name}")
+            sess.connection().exec_driver_sql(f'DROP TABLE IF EXISTS "{name}"')
+
+
+class JobWindow:
+    """Table holding the jobs which ran in [end - interval, end]."""
+
+    def __init__(self, sess: Session, interval: timedelta):
+        self.end = datetime.now(tz=UTC)
+        self.start = self.end - interval
+        self.has_jobs = _has_jobs(sess)
+        _drop_stale_windows(sess, self.end)
+        self.table = self._create_table(sess)
+
+    def _create_table(self, sess: Session) -> sqlalchemy.Table:
+        jobs = SlurmJobDB.__table__  # ty:ignore[unresolved-attribute]
+        table_name = (
+            f"{_WINDOW_PREFIX}{int(self.end.timestamp())}_{secrets.token_hex(4)}"
+        )
+        table = sqlalchemy.Table(
+            table_name,
+            sqlalchemy.MetaData(),
+            *(sqlalchemy.Column(name, jobs.c[name].type) for name in _WINDOW_COLUMNS),
+            sqlalchemy.Column("eff_start", jobs.c.submit_time.type),
+            sqlalchemy.Column("eff_end", jobs.c.submit_time.type),
+            prefixes=["UNLOGGED"],
+        )
+        table.create(sess.connection())
+        # A superset of what each check selects: the checks still apply their
+        # own conditions. Jobs which have not ended are all kept, as the
+        # same job ID check selects them whatever their effective end.
+        query = select(  # ty:ignore[no-matching-overload]
+            *(jobs.c[name] for name in _WINDOW_COLUMNS),
+            SqlSymbols.eff_start,
+            SqlSymbols.eff_end,
+        ).where(
+            col(SlurmJobDB.submit_time) < self.end,
+            sqlalchemy.or_(
+                col(SlurmJobDB.end_time).is_(None),
+                col(SlurmJobDB.end_time) >= self.start,
+            ),
+        )
+        result = sess.connection().execute(
+            table.insert().from_select(
+                [*_WINDOW_COLUMNS, "eff_start", "eff_end"], query
+            )
+        )
+        sess.connection().exec_driver_sql(f'ANALYZE "{table.name}"')
+        logger.debug(f"Job window [{self.start}, {self.end}]: {result.rowcount} jobs")
+        return table
+
+    def covers(self, time_interval: timedelta | None) -> bool:
+        return time_interval is not None and self.end - time_interval >= self.start
+
+    def source(self, sess: Session, time_interval: timedelta) -> JobSource:
+        start = self.end - time_interval
+        eff_start = self.table.c.eff_start
+        eff_end = self.table.c.eff_end
+        return JobSource(
+            sess=sess,
+            jobs=self.table,
+            eff_start=eff_start,
+            eff_end=eff_end,
+            start=start,
+            end=self.end,
+            clipped_elapsed_time=func.least(eff_end, self.end)
+            - func.greatest(eff_start, start),
+            has_jobs=self.has_jobs,
+        )
+
+
+_job_window: ContextVar[JobWindow | None] = ContextVar("job_window", default=None)
+
+
+def job_window_interval(checks: Iterable[object]) -> timedelta | None:
+    """Interval of the window worth sharing between `checks`, if any.
+
+    It is the widest interval of the checks reading one, if at least two do:
+    copying the jobs for a single check would only add to its cost.
+    """
+    intervals = [
+        interval
+        for check in checks
+        if isinstance(check, JobWindowCheck)
+        and (interval := check.job_window_interval()) is not None
+    ]
+    return max(intervals) if len(intervals) > 1 else None
+
+
+@contextmanager
+def shared_job_window(interval: timedelta | None) -> Iterator[JobWindow | None]:
+    """Share the jobs of [now - interval, now] with the checks run in the block.
+
+    Does nothing if `interval` is None. The checks run in other threads must
+    run in a copy of this context (`contextvars.copy_context`) to see it.
+    """
+    if interval is None:
+        yield None
+        return
+
+    from sarc.config import config
+
+    with config.db.session() as sess:
+        window = JobWindow(sess, interval)
+        sess.commit()
+    token = _job_window.set(window)
+    try:
+        yield window
+    finally:
+        _job_window.reset(token)
+        with config.db.session() as sess:
+            window.table.drop(sess.connection(), checkfirst=True)
+            sess.commit()
+
+
+@contextmanager
+def job_source(time_interval: timedelta | None) -> Iterator[JobSource]:
+    """Jobs for a check reading the window [now - time_interval, now].
+
+    If `time_interval` is None, the jobs are all read from `slurm_jobs` and
+    `start` and `end` are the earliest effective start and latest effective end.
+    """
+    from sarc.config import config
+
+    window = _job_window.get()
+    if window is not None and window.covers(time_interval):
+        assert time_interval is not None
+        with config.db.session() as sess:
+            yield window.source(sess, time_interval)
+        return
+
+    with config.db.session() as sess:
+        has_jobs = _has_jobs(sess)
+        start, end, clipped_elapsed_time = (
+            SqlSymbols.convert_job_time_interval_to_sql_bounds(sess, time_interval)
+        )
+        yield JobSource(
+            sess=sess,
+            jobs=SlurmJobDB.__table__,  # ty:ignore[unresolved-attribute]
+            eff_start=SqlSymbols.eff_start,
+            eff_end=SqlSymbols.eff_end,
+            start=start,
+            end=end,
+            clipped_elapsed_time=clipped_elapsed_time,
+            has_jobs=has_jobs,
+        )
@@ -3,8 +3,8 @@ from collections import Counter
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 
-from sqlmodel import col, select
-from tqdm import tqdm
+import sqlalchemy
+from sqlmodel import col, func, select
 
 from sarc.alerts.common import CheckResult, HealthCheck
 from sarc.validators import datetime_utc
@@ -32,74 +32,83 @@ def check_old_running_jobs(since: datetime_utc | None = None) -> bool:
     from sarc.models.job import SlurmState
 
     now = datetime.now(tz=UTC)
-    jobs_over_limit: list[SlurmJobDB] = []
-    with config.db.session() as sess:
-        query = select(SlurmJobDB).where(
+    one_second = sqlalchemy.literal(timedelta(seconds=1), type_=sqlalchemy.Interval)
+    since_filter = [] if since is None else [col(SlurmJobDB.submit_time) >= since]
+    job_key = (col(SlurmJobDB.cluster_id), col(SlurmJobDB.job_id))
+
+    # RUNNING entries which should have already finished, as the maximum
+    # allowed end time is before current time, counted per job
+    # (cluster + job ID). NB: Database may contain many job entries with same
+    # cluster, same job ID, AND same job state `RUNNING`.
+    over_limit = (
+        select(*job_key, func.count().label("nb_entries"))
+        .where(
             SlurmJobDB.job_state == SlurmState.RUNNING,
             col(SlurmJobDB.time_limit).is_not(None),
+            col(SlurmJobDB.start_time) + col(SlurmJobDB.time_limit) * one_second < now,
+            *since_filter,
         )
-        if since is not None:
-            query = query.where(SlurmJobDB.submit_time >= since)
-        for job in sess.exec(query):
-            assert job.job_state == SlurmState.RUNNING, job
-            assert job.start_time is not None, job
-            assert job.end_time is None, job
-            assert job.time_limit is not None, job
-            # A running job should have already finished
-            # if maximum allowed end time is before current time.
-            max_end_time = job.start_time + timedelta(seconds=job.time_limit)
-            if max_end_time < now:
-                jobs_over_limit.append(job)
-
-    if jobs_over_limit:
-        # We have old RUNNING jobs
-        # Check if this job was re-submitted with a more recent status
-
-        # First, get job keys :cluster name + job ID
-        # NB: Database may contain many job entries with same cluster name,
-        # same job ID, AND same job state `RUNNING`
-        index_jobs: set[tuple[int, int]] = {
-            (job.cluster_id, job.job_id) for job in jobs_over_limit
-        }
-        job_story: dict[tuple[int, int], list[SlurmJobDB]] = {}
-        for cluster_id, job_id in tqdm(
-            index_jobs, total=len(index_jobs), desc="running job states"
-        ):
-            local_query = select(SlurmJobDB).where(
-                SlurmJobDB.cluster_id == cluster_id, SlurmJobDB.job_id == job_id
+        .group_by(*job_key)
+        .cte("over_limit")
+    )
+    # Story of each of these jobs: all its entries, latest submitted first,
+    # to check if it was re-submitted with a more recent status.
+    story = (
+        select(
+            over_limit.c.nb_entries,
+            SlurmJobDB.job_state,
+            func.row_number()
+            .over(
+                partition_by=job_key,
+                order_by=(
+                    col(SlurmJobDB.submit_time).desc(),
+                    col(SlurmJobDB.id).desc(),
+                ),
             )
-            if since is not None:
-                local_query = local_query.where(SlurmJobDB.submit_time >= since)
-            local_jobs = sorted(
-                sess.exec(local_query).all(), key=lambda jdb: jdb.submit_time
-            )
-            assert local_jobs
-            job_story[(cluster_id, job_id)] = local_jobs
-
-        # Now we get some stats
-
-        # nb. initial entries
-        nb_entries = len(jobs_over_limit)
-
-        # nb. initial jobs
-        assert len(index_jobs) == len(job_story)
-        nb_jobs = len(index_jobs)
-
-        # nb. jobs not re-submitted
-        nb_uniques = 0
-
-        # nb. latest found states for re-submitted jobs
-        nb_latest_state: Counter[SlurmState] = Counter()
-
-        for jobs in job_story.values():
-            if len(jobs) == 1:
-                nb_uniques += 1
+            .label("rank"),
+            (func.count().over(partition_by=job_key) > 1).label("resubmitted"),
+        )
+        .join(
+            over_limit,
+            (over_limit.c.cluster_id == SlurmJobDB.cluster_id)
+            & (over_limit.c.job_id == SlurmJobDB.job_id),
+        )
+        .where(*since_filter)
+        .subquery("story")
+    )
+    # One row per (re-submitted or not, latest state), with its number of jobs
+    # and of RUNNING entries.
+    query = (
+        select(
+            story.c.resubmitted,
+            story.c.job_state,
+            func.count().label("nb_jobs"),
+            func.sum(story.c.nb_entries).label("nb_entries"),
+        )
+        .where(story.c.rank == 1)
+        .group_by(story.c.resubmitted, story.c.job_state)
+        .order_by(story.c.resubmitted, story.c.job_state)
+    )
+
+    # nb. initial entries
+    nb_entries = 0
+    # nb. initial jobs
+    nb_jobs = 0
+    # nb. jobs not re-submitted
+    nb_uniques = 0
+    # nb. latest found states for re-submitted jobs
+    nb_latest_state: Counter[SlurmState] = Counter()
+    with config.db.session() as sess:
+        for is_resubmitted, latest_state, group_jobs, group_entries in sess.exec(query):
+            nb_jobs += group_jobs
+            nb_entries += int(group_entries)
+            if is_resubmitted:
+                nb_latest_state[latest_state] += group_jobs
             else:
-                # Jobs are already sorted by submit time
-                # Get and count latest job state
-                latest_job = jobs[-1]
-                nb_latest_state.update([latest_job.job_state])
-        # Now log detailed error
+                nb_uniques += group_jobs
+
+    if nb_entries:
+        # We have old RUNNING jobs. Log detailed error
         message = f"Found {nb_entries} RUNNING job entries"
         if since is not None:
             message += f", submitted since {since},"
@@ -111,7 +120,7 @@ def check_old_running_jobs(since: datetime_utc | None = None) -> bool:
             message += f", {latest_state_count} with a latest entry {latest_state.name}"
         logger.error(message)
 
-    return not jobs_over_limit
+    return not nb_entries
 
 
 @dataclass
@@ -9,9 +9,9 @@ import sqlalchemy
 from sqlmodel import case, col, func, select
 
 from sarc.alerts.common import CheckResult, HealthCheck
-from sarc.alerts.usage_alerts.alert_sql_utils import SqlSymbols
+from sarc.alerts.usage_alerts.job_window import JobWindowCheck, job_source
 from sarc.db.cluster import SlurmClusterDB
-from sarc.db.job import JobStatisticDB, SlurmJobDB
+from sarc.db.job import JobStatisticDB
 
 logger = logging.getLogger(__name__)
 
@@ -93,25 +93,23 @@ def check_prometheus_stats_occurrences(
     bool
         True if check succeeds, False otherwise.
     """
-    from sarc.config import config
-
     if cluster_names is None:
         cluster_names = []
 
     if minimum_runtime is None:
         minimum_runtime = timedelta(seconds=0)
 
-    with config.db.session() as sess:
-        if not sess.exec(select(func.count(col(SlurmJobDB.id)))).one():
+    with job_source(time_interval) as source:
+        if not source.has_jobs:
             logger.error("No Prometheus data available: no job found")
             return False
 
-        # Determine [start, end] and clipped elapsed time for frame iteration and comparison.
-        start, end, clipped_elapsed_time = (
-            SqlSymbols.convert_job_time_interval_to_sql_bounds(sess, time_interval)
-        )
-        eff_start = SqlSymbols.eff_start
-        eff_end = SqlSymbols.eff_end
+        # [start, end] and clipped elapsed time for frame iteration and comparison.
+        start, end = source.start, source.end
+        clipped_elapsed_time = source.clipped_elapsed_time
+        eff_start = source.eff_start
+        eff_end = source.eff_end
+        jobs = source.c
 
         # Use a Postgresql query: time frange + join
         # NB: Since we iterate over frames, we want to capture point jobs located at frame bounds,
@@ -126,22 +124,22 @@ def check_prometheus_stats_occurrences(
 
         exploded_query = (
             select(
-                col(SlurmJobDB.id).label("job_id"),
+                jobs.id.label("job_id"),
                 col(SlurmClusterDB.name).label("cluster_name"),
                 # Explode jobs per node and join with matching frames.
-                func.jsonb_array_elements_text(SlurmJobDB.nodes).label("node"),
+                func.jsonb_array_elements_text(jobs.nodes).label("node"),
                 frame_start.label("frame_start"),
             )
-            .select_from(SlurmJobDB)
-            .join(SlurmClusterDB, col(SlurmJobDB.cluster_id) == col(SlurmClusterDB.id))
+            .select_from(source.jobs)
+            .join(SlurmClusterDB, jobs.cluster_id == col(SlurmClusterDB.id))
             .join(frames, (eff_start < frame_end) & (eff_end >= frame_start))
             .where(
                 # Select only jobs where elapsed time >= minimum runtime,
                 # and jobs are GPU or CPU jobs, depending on `with_gres_gpu`
                 (
-                    (col(SlurmJobDB.allocated_gres_gpu) > 0)
+                    (jobs.allocated_gres_gpu > 0)
                     if with_gres_gpu
-                    else (SlurmJobDB.allocated_gres_gpu == 0)
+                    else (jobs.allocated_gres_gpu == 0)
                 ),
                 clipped_elapsed_time
                 >= sqlalchemy.literal(minimum_runtime, type_=sqlalchemy.Interval),
@@ -223,7 +221,7 @@ def check_prometheus_stats_occurrences(
                 sqlalchemy.literal_column("3"),
             )
         )
-        results = sess.exec(agg_query).all()
+        results = source.sess.exec(agg_query).all()
 
     if not results:
         if cluster_names:
@@ -300,7 +298,7 @@ def check_prometheus_stats_occurrences(
 
 
 @dataclass
-class PrometheusCpuStatCheck(HealthCheck):
+class PrometheusCpuStatCheck(JobWindowCheck, HealthCheck):
     """Health check for Prometheus CPU stats."""
 
     time_interval: timedelta | None = timedelta(days=7)
@@ -373,7 +371,7 @@ def check_prometheus_stats_for_gpu_jobs(
 
 
 @dataclass
-class PrometheusGpuStatCheck(HealthCheck):
+class PrometheusGpuStatCheck(JobWindowCheck, HealthCheck):
     """Health check for Prometheus GPU stats."""
 
     time_interval: timedelta | None = timedelta(days=7)
@@ -1,12 +1,14 @@
 import logging
 from collections import Counter
 from dataclasses import dataclass
-from datetime import UTC, datetime, timedelta
+from datetime import datetime, timedelta
 from typing import Dict
 
+import sqlalchemy
 import sqlmodel
 
 from sarc.alerts.common import CheckResult, HealthCheck
+from sarc.alerts.usage_alerts.job_window import JobWindowCheck, job_source
 from sarc.db.cluster import SlurmClusterDB
 from sarc.db.job import SlurmJobDB
 from sarc.validators import datetime_utc
@@ -40,49 +42,28 @@ def check_same_job_id(
     """
     from sarc.config import config
 
-    # Compute parameters `start` and `end` for function `get_jobs()`
-    if since is None:
-        if time_interval is None:
-            start: datetime | None = None
-            end: datetime | None = None
-        else:
-            end = datetime.now(tz=UTC)
-            start = end - time_interval
-    elif time_interval is None:
-        start = since
-        end = None
-    else:
-        start = since
-        end = start + time_interval
-
     # Collect job indices, and count occurrences of clusters
     # among jobs which have same job ID.
-    duplicates: Dict[int, Counter] = {}
-
-    with config.db.session() as sess:
-        query = sqlmodel.select(
-            SlurmJobDB.job_id, sqlmodel.func.array_agg(SlurmClusterDB.name)
-        ).join(
-            SlurmClusterDB,
-            sqlmodel.col(SlurmJobDB.cluster_id) == sqlmodel.col(SlurmClusterDB.id),
-        )
-        if end is not None:
-            query = query.where(sqlmodel.col(SlurmJobDB.submit_time) < end)
-        if start is not None:
-            query = query.where(
-                sqlmodel.or_(
-                    SlurmJobDB.end_time == None,  # noqa: E711
-                    sqlmodel.col(SlurmJobDB.end_time) > start,
-                )
+    if since is None and time_interval is not None:
+        # Interval [now - time_interval, now]
+        with job_source(time_interval) as source:
+            start, end = source.start, source.end
+            duplicates = _find_duplicates(source.sess, source.jobs, start, end)
+    else:
+        # Compute parameters `start` and `end` for the query.
+        start = since
+        if since is None or time_interval is None:
+            end: datetime | None = None
+        else:
+            end = since + time_interval
+        with config.db.session() as sess:
+            duplicates = _find_duplicates(
+                sess,
+                SlurmJobDB.__table__,  # ty:ignore[unresolved-attribute]
+                start,
+                end,
             )
 
-        for job_id, cluster_names in sess.exec(
-            query.group_by(sqlmodel.col(SlurmJobDB.job_id))
-            .having(sqlmodel.func.count() > 1)
-            .order_by(sqlmodel.col(SlurmJobDB.job_id))
-        ):
-            duplicates[job_id] = Counter(cluster_names)
-
     # Find duplicates.
     if duplicates:
         # Log alerts
@@ -112,13 +93,49 @@ def check_same_job_id(
     return not duplicates
 
 
+def _find_duplicates(
+    sess: sqlmodel.Session,
+    jobs: sqlalchemy.FromClause,
+    start: datetime | None,
+    end: datetime | None,
+) -> Dict[int, Counter]:
+    """Map each job ID found on many jobs in [start, end] to its clusters."""
+    query = (
+        sqlmodel.select(jobs.c.job_id, sqlmodel.func.array_agg(SlurmClusterDB.name))
+        .select_from(jobs)
+        .join(SlurmClusterDB, jobs.c.cluster_id == sqlmodel.col(SlurmClusterDB.id))
+    )
+    if end is not None:
+        query = query.where(jobs.c.submit_time < end)
+    if start is not None:
+        query = query.where(
+            sqlmodel.or_(
+                jobs.c.end_time == None,  # noqa: E711
+                jobs.c.end_time > start,
+            )
+        )
+
+    return {
+        job_id: Counter(cluster_names)
+        for job_id, cluster_names in sess.exec(
+            query.group_by(jobs.c.job_id)
+            .having(sqlmodel.func.count() > 1)
+            .order_by(jobs.c.job_id)
+        )
+    }
+
+
 @dataclass
-class SameJobIdCheck(HealthCheck):
+class SameJobIdCheck(JobWindowCheck, HealthCheck):
     """Health check for same job IDs"""
 
     time_interval: timedelta | None = timedelta(days=7)
     since: datetime_utc | None = None
 
+    def job_window_interval(self) -> timedelta | None:
+        # With `since`, the window does not end now.
+        return None if self.since is not None else self.time_interval
+
     def check(self) -> CheckResult:
         if check_same_job_id(time_interval=self.time_interval, since=self.since):
             return self.ok()
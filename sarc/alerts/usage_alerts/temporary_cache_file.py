@@ -13,18 +13,24 @@ class TemporaryCacheFileCheck(HealthCheck):
 
     New cache system is expected to create temporary cache files,
     which should no longer exist after any SARC operation is finished.
+    Files still being written by a running process are not reported.
     """
 
     def check(self) -> CheckResult:
+        from sarc.cache import CacheIndex
         from sarc.config import config
 
         cache = config.cache
-        if cache is None:
+        if cache is None or not cache.exists():
             return self.ok()
 
+        # The index registers the `.current` files when they are created,
+        # so that the cache does not need to be searched.
         found = False
-        for element in cache.rglob("*.current"):
-            logger.error(f"Found temporary cache file: {element}")
+        for write in CacheIndex(cache).reconciled().writes():
+            if write.in_progress() or not (cache / write.path).exists():
+                continue
+            logger.error(f"Found temporary cache file: {cache / write.path}")
             found = True
 
         return self.fail() if found else self.ok()
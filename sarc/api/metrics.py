@@ -1,20 +1,23 @@
 import hashlib
+import inspect
 import math
 import re
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from typing import Literal
+from typing import Annotated, Literal, get_origin
+from urllib.parse import parse_qs
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy import ARRAY, Float, literal, literal_column, nulls_last, text, true
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql.elements import Grouping
-from sqlmodel import Session, and_, case, col, func, select
+from sqlmodel import Session, and_, case, cast, col, func, select, tuple_
 
-from sarc.api.v0 import Requestor, requestor
+from sarc.api.v0 import Requestor, cancel_on_disconnect, query_session, requestor
 from sarc.config import config
 from sarc.db.cluster import SlurmClusterDB
 from sarc.db.job import JobStatisticDB
@@ -103,14 +106,19 @@ router = APIRouter(
 _JOIN_COLLAPSE_LIMIT = 12
 
 
-def session_dep() -> Generator[Session]:
-    with config.db.session() as sess:
-        # LOCAL so it dies with this request's transaction instead of riding the
-        # pooled connection into the next one (/v0 shares this engine); all /dash
-        # queries run in that transaction, so one statement covers them.
-        sess.connection().execute(
-            text(f"SET LOCAL join_collapse_limit = {_JOIN_COLLAPSE_LIMIT}")
-        )
+def _session() -> Generator[Session]:
+    # LOCAL (see query_session), as /v0 shares this engine; all /dash queries
+    # run in the request's transaction, so one setting covers them.
+    settings: dict[str, object] = {"join_collapse_limit": _JOIN_COLLAPSE_LIMIT}
+    if timeout := config.server.statement_timeout:
+        settings["statement_timeout"] = int(timeout.total_seconds() * 1000)
+    yield from query_session(**settings)
+
+
+async def session_dep(
+    request: Request, sess: Session = Depends(_session)
+) -> AsyncGenerator[Session]:
+    async with cancel_on_disconnect(request, sess):
         yield sess
 
 
@@ -647,49 +655,56 @@ def metrics_job_counts(
 _HEATMAP_BINS = 100
 
 
-def _build_heatmap_payload(
-    sess: Session, base_filters: list, x_expr, y_expr, x_max: float, y_max: float
-):
-    """Aggregate count(*) per (bin_x, bin_y) over NBINS×NBINS log-spaced bins.
+def _log_bin_scale(max_value):
+    """SQL factor of `_log_bin` for bins over [0, max_value].
+
+    Computed once, along with the maximum, rather than for every binned value.
+    """
+    # PostgreSQL: log() with one arg is base-10. Float throughout: the numeric
+    # variants of log and of the division are many times slower.
+    log_max = func.greatest(
+        func.log(cast(max_value, Float) + 1.0, type_=Float), 1e-9, type_=Float
+    )
+    return _HEATMAP_BINS / log_max
+
+
+def _log_bin(value, scale):
+    """SQL bin index of ``value`` among _HEATMAP_BINS log-spaced bins over
+    [0, max_value], clipped to [0, _HEATMAP_BINS - 1]. ``scale`` is
+    ``_log_bin_scale(max_value)``.
 
     Bins are uniform in log10(value+1) space so highly-skewed distributions
     (durations spanning many orders of magnitude) get even resolution rather
     than collapsing into the first linear bin. No data is dropped: every job
-    is counted in exactly one cell. The min is fixed at 0 and the +1 offset
+    is counted in exactly one bin. The min is fixed at 0 and the +1 offset
     avoids log10(0).
     """
-    log_x_max = max(math.log10(x_max + 1.0), 1e-9)
-    log_y_max = max(math.log10(y_max + 1.0), 1e-9)
-
-    # PostgreSQL: log(numeric) with one arg is base-10.
-    log_x = func.log(x_expr + 1.0)
-    log_y = func.log(y_expr + 1.0)
-    bin_x = func.least(
-        func.greatest(func.floor(log_x * _HEATMAP_BINS / log_x_max), 0),
-        _HEATMAP_BINS - 1,
-    ).label("bx")
-    bin_y = func.least(
-        func.greatest(func.floor(log_y * _HEATMAP_BINS / log_y_max), 0),
+    return func.least(
+        func.greatest(
+            func.floor(func.log(cast(value, Float) + 1.0, type_=Float) * scale), 0
+        ),
         _HEATMAP_BINS - 1,
-    ).label("by")
-    q = (
-        select(bin_x, bin_y, func.count().label("c"))
-        .where(*base_filters)
-        .group_by("bx", "by")
     )
-    z = [[0] * _HEATMAP_BINS for _ in range(_HEATMAP_BINS)]
-    total = 0
-    for bx, by, count in sess.exec(q):
-        c = int(count)
-        z[int(by)][int(bx)] = c
-        total += c
 
-    # Bin centres in log space then converted back to linear value (seconds).
-    log_x_step = log_x_max / _HEATMAP_BINS
-    log_y_step = log_y_max / _HEATMAP_BINS
-    xs = [10 ** ((i + 0.5) * log_x_step) - 1.0 for i in range(_HEATMAP_BINS)]
-    ys = [10 ** ((i + 0.5) * log_y_step) - 1.0 for i in range(_HEATMAP_BINS)]
-    return {"x": xs, "y": ys, "z": z, "total": total}
+
+def _log_bin_centres(max_value: float) -> list[float]:
+    """Centres of the bins of `_log_bin`, in log space then converted back to
+    linear value (seconds)."""
+    log_step = max(math.log10(max_value + 1.0), 1e-9) / _HEATMAP_BINS
+    return [10 ** ((i + 0.5) * log_step) - 1.0 for i in range(_HEATMAP_BINS)]
+
+
+def _heatmap_payload(cells: dict[tuple[int, int], int], x_max: float, y_max: float):
+    """Plotly payload of a grid of job counts per (bin_x, bin_y)."""
+    z = [[0] * _HEATMAP_BINS for _ in range(_HEATMAP_BINS)]
+    for (bx, by), count in cells.items():
+        z[by][bx] = count
+    return {
+        "x": _log_bin_centres(x_max),
+        "y": _log_bin_centres(y_max),
+        "z": z,
+        "total": sum(cells.values()),
+    }
 
 
 @router.get("/metrics/job_times_vs_limit")
@@ -717,70 +732,99 @@ def metrics_job_times_vs_limit(
     how well a job guessed its limit, and neither the queue wait nor the whole
     elapsed belongs to a slice of time.
 
-    **NB** This endpoint is the only one not yet optimized, because it would need
-    to add or expand covering indexes. We should later decide if we really need
-    this endpoint/plot (currently seen in admin view only).
+    Both grids come from one statement, which reads the jobs once, through the
+    covering ``ix_slurm_jobs_submit``: the jobs are materialized along with
+    their max limit, elapsed and wait (the bounds of the log bins), then counted
+    per cell with one grouping set per grid.
     """
     begin_dt, finish_dt = _apply_focus(*_date_range(start, end), focus_start, focus_end)
     cluster_ids = _resolve_cluster_ids(sess, clusters)
+    scope_user_id = _scope_or_view_as(sess, req, as_user)
 
-    # Query the view directly: the columns read here (time_limit/start_time/
-    # elapsed_time) are in no index, so this full-scans regardless, and the
-    # planner prunes the view's unused joins on its own -- job_series_select
-    # would compile to the identical plan here (see the NB above).
-    wait_expr = func.extract(
-        "epoch", col(JobSeriesDB.start_time) - col(JobSeriesDB.submit_time)
+    js = job_series_select(
+        "submit_time",
+        "start_time",
+        "elapsed_time",
+        "time_limit",
+        "allocated_gres_gpu",
+        "harmonized_gpu_type",
+        "cluster_id",
+        "cluster_user",
+        "job_state",
+        "sarc_user_id",
+    ).subquery()
+    jobs = select(
+        js.c.time_limit,
+        js.c.elapsed_time,
+        cast(func.extract("epoch", js.c.start_time - js.c.submit_time), Float).label(
+            "wait"
+        ),
+    ).where(
+        js.c.submit_time >= begin_dt,
+        js.c.submit_time < finish_dt,
+        js.c.time_limit.is_not(None),
+        # start_time spelled out: no STRICT slurm_job_end to imply it here.
+        js.c.start_time.is_not(None),
+    )
+    jobs = _gpu_only(jobs, js.c)
+    jobs = _apply_job_filters(
+        jobs, js.c, cluster_ids, cluster_user, job_states, scope_user_id
+    )
+    # Materialized, so that the bounds and the bins do not each read the jobs.
+    jobs = jobs.cte("heatmap_jobs").prefix_with("MATERIALIZED")
+    bounds = select(  # ty:ignore[no-matching-overload]
+        func.max(jobs.c.time_limit).label("max_l"),
+        func.max(jobs.c.elapsed_time).label("max_e"),
+        func.max(jobs.c.wait).label("max_w"),
+        _log_bin_scale(func.max(jobs.c.time_limit)).label("scale_l"),
+        _log_bin_scale(func.max(jobs.c.elapsed_time)).label("scale_e"),
+        _log_bin_scale(func.max(jobs.c.wait)).label("scale_w"),
+    ).cte("heatmap_bounds")
+    binned = (
+        select(  # ty:ignore[no-matching-overload]
+            _log_bin(jobs.c.time_limit, bounds.c.scale_l).label("bx"),
+            _log_bin(jobs.c.elapsed_time, bounds.c.scale_e).label("by_elapsed"),
+            _log_bin(jobs.c.wait, bounds.c.scale_w).label("by_wait"),
+            bounds.c.max_l,
+            bounds.c.max_e,
+            bounds.c.max_w,
+        )
+        .join_from(jobs, bounds, true())
+        .subquery()
+    )
+    query = select(  # ty:ignore[no-matching-overload]
+        binned.c.bx,
+        binned.c.by_elapsed,
+        binned.c.by_wait,
+        # 1 in the rows of the wait grid, which are not grouped on by_elapsed.
+        func.grouping(binned.c.by_elapsed).label("is_wait"),
+        func.count().label("c"),
+        func.max(binned.c.max_l).label("max_l"),
+        func.max(binned.c.max_e).label("max_e"),
+        func.max(binned.c.max_w).label("max_w"),
+    ).group_by(
+        func.grouping_sets(
+            tuple_(binned.c.bx, binned.c.by_elapsed),
+            tuple_(binned.c.bx, binned.c.by_wait),
+        )
     )
-    # start_time spelled out: no STRICT slurm_job_end to imply it here.
-    #
-    # _gpu_only's predicate, spelled out: this endpoint builds its filters as a
-    # list rather than on a query.
-    base_filters = [
-        col(JobSeriesDB.submit_time) >= begin_dt,
-        col(JobSeriesDB.submit_time) < finish_dt,
-        col(JobSeriesDB.time_limit).is_not(None),
-        col(JobSeriesDB.start_time).is_not(None),
-        col(JobSeriesDB.allocated_gres_gpu) > 0,
-        col(JobSeriesDB.harmonized_gpu_type).is_not(None),
-    ]
-    if cluster_ids:
-        base_filters.append(col(JobSeriesDB.cluster_id).in_(cluster_ids))
-    if cluster_user:
-        base_filters.append(col(JobSeriesDB.cluster_user) == cluster_user)
-    if job_states:
-        base_filters.append(col(JobSeriesDB.job_state).in_(job_states))
-    scope_user_id = _scope_or_view_as(sess, req, as_user)
-    if scope_user_id != "admin":
-        base_filters.append(col(JobSeriesDB.sarc_user_id) == scope_user_id)
 
-    max_l, max_e, max_w = sess.exec(
-        select(
-            func.max(col(JobSeriesDB.time_limit)).label("max_l"),
-            func.max(col(JobSeriesDB.elapsed_time)).label("max_e"),
-            func.max(wait_expr).label("max_w"),
-        ).where(*base_filters)
-    ).one()
+    elapsed_cells: dict[tuple[int, int], int] = {}
+    wait_cells: dict[tuple[int, int], int] = {}
+    max_l = max_e = max_w = None
+    for row in sess.exec(query):
+        max_l, max_e, max_w = row.max_l, row.max_e, row.max_w
+        if row.is_wait:
+            wait_cells[int(row.bx), int(row.by_wait)] = int(row.c)
+        else:
+            elapsed_cells[int(row.bx), int(row.by_elapsed)] = int(row.c)
 
-    if max_l is None:
-        # No matching rows
+    if max_l is None or max_e is None or max_w is None:
+        # No matching rows: then all the maxima are None, otherwise none is.
         return {"elapsed_vs_limit": None, "wait_vs_limit": None, "total_jobs": 0}
 
-    elapsed_hmap = _build_heatmap_payload(
-        sess,
-        base_filters,
-        col(JobSeriesDB.time_limit),
-        col(JobSeriesDB.elapsed_time),
-        float(max_l),
-        float(max_e),
-    )
-    wait_hmap = _build_heatmap_payload(
-        sess,
-        base_filters,
-        col(JobSeriesDB.time_limit),
-        wait_expr,
-        float(max_l),
-        float(max_w),
-    )
+    elapsed_hmap = _heatmap_payload(elapsed_cells, float(max_l), float(max_e))
+    wait_hmap = _heatmap_payload(wait_cells, float(max_l), float(max_w))
 
     return {
         "elapsed_vs_limit": elapsed_hmap,
@@ -1640,3 +1684,131 @@ def metrics_jobs(
         )
 
     return {"total": total, "jobs": jobs}
+
+
+# Panels /metrics/batch can serve, by name: the cheap data endpoints of the page.
+_BATCH_PANELS = {
+    endpoint.__name__.removeprefix("metrics_"): endpoint
+    for endpoint in (
+        metrics_job_counts,
+        metrics_metric_distribution,
+        metrics_metric_comparison,
+        metrics_rgu_usage,
+        metrics_rgu_by_cluster,
+        metrics_jobs,
+    )
+}
+
+# Panels which aggregate every job of the window, and take much longer than the
+# others: in a batch, they would hold back the whole page. The page requests
+# them on their own, alongside the batch.
+_UNBATCHED_PANELS = {
+    endpoint.__name__.removeprefix("metrics_")
+    for endpoint in (
+        metrics_job_times_vs_limit,
+        metrics_metric_trend,
+        metrics_rgu_by_user,
+    )
+}
+
+# Parameters of the panels that are not query parameters, or that only the
+# batch itself may set.
+_BATCH_RESERVED = {"req", "sess", "as_user"}
+
+
+def _read_only_session_dep(sess: Session = Depends(session_dep)) -> Session:
+    sess.connection().execute(text("SET TRANSACTION READ ONLY"))
+    return sess
+
+
+def _panel_kwargs(endpoint, shared: dict, query: str) -> dict:
+    """Keyword arguments of a panel endpoint: its defaults, then the shared
+    filters it takes, then the parameters of its own ``query`` string, validated
+    against its ``Query`` declarations as FastAPI would."""
+    params = inspect.signature(endpoint, eval_str=True).parameters
+    given = parse_qs(query, keep_blank_values=True)
+    unknown = given.keys() - (params.keys() - _BATCH_RESERVED)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown parameter(s) for {endpoint.__name__}: {sorted(unknown)}",
+        )
+    kwargs = {}
+    for name, param in params.items():
+        if name in _BATCH_RESERVED:
+            continue
+        if name in given:
+            values = given[name]
+            value = values if get_origin(param.annotation) is list else values[-1]
+            try:
+                kwargs[name] = TypeAdapter(
+                    Annotated[param.annotation, param.default]
+                ).validate_python(value)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+        elif name in shared:
+            kwargs[name] = shared[name]
+        else:
+            kwargs[name] = param.default.default
+    return kwargs
+
+
+@router.get("/metrics/batch")
+def metrics_batch(
+    req: Requestor = Depends(requestor),
+    as_user: str | None = _AS_USER_QUERY,
+    start: date = Query(default=None),
+    end: date = Query(default=None),
+    clusters: list[str] = Query(default=[]),
+    cluster_user: str | None = Query(default=None),
+    job_states: list[str] = Query(default=[]),
+    focus_start: datetime | None = Query(default=None),
+    focus_end: datetime | None = Query(default=None),
+    panels: list[str] = Query(default=[]),
+    sess: Session = Depends(_read_only_session_dep),
+):
+    """Data of several panels of the page, in one request.
+
+    Each of ``panels`` is the name of a /metrics endpoint (``job_counts``,
+    ``rgu_usage``, ``jobs``...), optionally followed by ``?`` and the query
+    string of its own parameters (``job_counts?period=d&submitted=true``).
+    The filters given here are passed to every panel which takes them, unless
+    its query string sets them itself; ``as_user`` can only be set here.
+    Returns one ``{name: data}`` document, each data as its endpoint returns it.
+
+    The panels run one after the other in a single read-only transaction, so a
+    page load pays for one authentication, one connection checkout and one
+    session setup instead of one per panel. Only the cheap panels are served:
+    ``job_times_vs_limit``, ``metric_trend`` and ``rgu_by_user`` must be
+    requested on their own, so that they do not delay the others.
+    """
+    shared = {
+        "start": start,
+        "end": end,
+        "clusters": clusters,
+        "cluster_user": cluster_user,
+        "job_states": job_states,
+        "focus_start": focus_start,
+        "focus_end": focus_end,
+    }
+    # What every panel would reject, rejected once before running any.
+    _scope_or_view_as(sess, req, as_user)
+    _resolve_cluster_ids(sess, clusters)
+
+    calls = []
+    for spec in panels:
+        name, _, query = spec.partition("?")
+        if name in _UNBATCHED_PANELS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Panel {name!r} is not batched, request /metrics/{name}",
+            )
+        endpoint = _BATCH_PANELS.get(name)
+        if endpoint is None:
+            raise HTTPException(status_code=422, detail=f"Unknown panel {name!r}")
+        calls.append((name, endpoint, _panel_kwargs(endpoint, shared, query)))
+
+    return {
+        name: endpoint(req=req, as_user=as_user, sess=sess, **kwargs)
+        for name, endpoint, kwargs in calls
+    }
@@ -1,5 +1,8 @@
+import asyncio
+import logging
 import operator
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from contextlib import asynccontextmanager, suppress
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from functools import reduce
@@ -8,7 +11,9 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import AfterValidator, BaseModel, Field
 from serieux import deserialize
+from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import Range
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Mapped
 from sqlmodel import Session, and_, col, func, or_, select
 from sqlmodel.sql.expression import SelectOfScalar
@@ -34,6 +39,8 @@ from sarc.models.job import Statistics
 from sarc.models.series import JobSeries
 from sarc.models.support import GpuRgu
 
+logger = logging.getLogger(__name__)
+
 
 def _ensure_datetime_utc(v: datetime) -> datetime:
     """
@@ -58,8 +65,99 @@ def config_dep() -> Config:
     return config
 
 
-def session_dep() -> Generator[Session]:
+# SQLSTATE of a statement canceled by statement_timeout or pg_cancel_backend.
+_QUERY_CANCELED = "57014"
+
+# Seconds between two checks of whether the client of a request is gone.
+_DISCONNECT_POLL_INTERVAL = 0.5
+
+
+def _is_query_canceled(error: DBAPIError) -> bool:
+    # pg8000 errors carry the fields of Postgres' ErrorResponse, by their code.
+    args = error.orig.args if error.orig is not None else ()
+    fields = args[0] if args else None
+    return isinstance(fields, dict) and fields.get("C") == _QUERY_CANCELED
+
+
+def query_session(**settings: object) -> Generator[Session]:
+    """Session for the queries of one request.
+
+    The settings (e.g. a ``statement_timeout``) are LOCAL so they die with the
+    request's transaction instead of riding the pooled connection into the
+    next one. The backend PID is kept in `sess.info` for `cancel_on_disconnect`.
+    A query canceled, by a statement timeout or by `cancel_on_disconnect`,
+    fails the request with 503 instead of 500.
+    """
+    names = {f"name{i}": name for i, name in enumerate(settings)}
+    values = {f"value{i}": str(value) for i, value in enumerate(settings.values())}
+    columns = [
+        *(f"set_config(:name{i}, :value{i}, true)" for i in range(len(settings))),
+        "pg_backend_pid()",
+    ]
     with config.db.session() as sess:
+        # One round trip for all of them.
+        sess.info["backend_pid"] = (
+            sess.connection()
+            .execute(text(f"SELECT {', '.join(columns)}"), {**names, **values})
+            .one()[-1]
+        )
+        try:
+            yield sess
+        except DBAPIError as e:
+            if not _is_query_canceled(e):
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Query canceled: it ran longer than the statement timeout",
+            ) from e
+
+
+def _cancel_backend(pid: int) -> None:
+    # From another connection: the request's own is busy running the query.
+    # Not one of the pool, which the slow requests may all hold: the cancel
+    # would wait for them to finish.
+    with config.db.unpooled_engine.connect() as conn:
+        conn.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": pid})
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request: Request, sess: Session) -> AsyncGenerator[None]:
+    """Cancel the query running on `sess` if the client disconnects.
+
+    The handlers run on the thread pool and block on their queries: without
+    this, a slow query keeps its thread and its connection until it is done,
+    even though nobody will read the response.
+    """
+
+    done = asyncio.Event()
+
+    async def watch():
+        while not await request.is_disconnected():
+            with suppress(TimeoutError):
+                await asyncio.wait_for(done.wait(), _DISCONNECT_POLL_INTERVAL)
+                return
+        logger.info(f"Client of {request.url.path} disconnected, canceling its query")
+        await asyncio.to_thread(_cancel_backend, sess.info["backend_pid"])
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        done.set()
+        # Not canceled but awaited: a cancel already sent must be done before
+        # the connection goes back to the pool, or it could hit the query of
+        # another request.
+        await watcher
+
+
+def _session() -> Generator[Session]:
+    yield from query_session()
+
+
+async def session_dep(
+    request: Request, sess: Session = Depends(_session)
+) -> AsyncGenerator[Session]:
+    async with cancel_on_disconnect(request, sess):
         yield sess
 
 
@@ -3,12 +3,18 @@ from __future__ import annotations
 import contextlib
 import io
 import logging
+import os
+import socket
+import sqlite3
+import threading
 from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
 from datetime import UTC, datetime, time, timedelta
 from pathlib import Path
 from zipfile import ZIP_LZMA, ZipFile
 
 from .config import config
+from .stages import accumulated_stage, using_stage
 from .utils import ensure_utc
 
 logger = logging.getLogger(__name__)
@@ -19,6 +25,288 @@ def no_current(fname: Path) -> bool:
     return fname.suffix != ".current" and fname.name != ".DS_Store"
 
 
+# SQLite file of the CacheIndex, at the cache root
+INDEX_NAME = ".index.sqlite"
+
+_INDEX_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS sizes (
+        subdirectory TEXT NOT NULL,
+        month TEXT NOT NULL,
+        files INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        PRIMARY KEY (subdirectory, month)
+    )""",
+    """CREATE TABLE IF NOT EXISTS writes (
+        path TEXT PRIMARY KEY,
+        host TEXT,
+        pid INTEGER,
+        started TEXT
+    )""",
+    "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+# Connections to the index files, opened once per process and file, with the
+# lock serializing their use between threads.
+_index_connections: dict[
+    tuple[int, Path], tuple[sqlite3.Connection, threading.Lock]
+] = {}
+_index_connections_lock = threading.Lock()
+
+
+def _index_connection(path: Path) -> tuple[sqlite3.Connection, threading.Lock]:
+    # Keyed by pid as well: a connection must not be used after a fork.
+    key = (os.getpid(), path)
+    with _index_connections_lock:
+        cached = _index_connections.get(key)
+        if cached is not None and path.exists():
+            return cached
+        conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        try:
+            with conn:
+                for statement in _INDEX_SCHEMA:
+                    conn.execute(statement)
+        except BaseException:
+            conn.close()
+            raise
+        if cached is not None:
+            # The file was removed: the old connection points to nothing.
+            cached[0].close()
+        _index_connections[key] = conn, threading.Lock()
+        return _index_connections[key]
+
+
+def _forget_index_connection(path: Path) -> None:
+    with _index_connections_lock:
+        cached = _index_connections.pop((os.getpid(), path), None)
+    if cached is not None:
+        with contextlib.suppress(sqlite3.Error):
+            cached[0].close()
+
+
+@dataclass
+class CacheSize:
+    # Cache subdirectory, "" for the files at the root
+    subdirectory: str
+    # "YYYY/MM" of the entries, "" for the files outside the date hierarchy
+    month: str
+    files: int
+    bytes: int
+
+
+@dataclass
+class CacheWrite:
+    """A `.current` file: a cache entry being written, or left behind."""
+
+    # Path relative to the cache root
+    path: str
+    # Host and process writing it, None if it was found by `reconcile`
+    host: str | None
+    pid: int | None
+    started: datetime | None
+
+    def in_progress(self) -> bool:
+        """Whether the process writing the entry is still running."""
+        if self.pid is None or self.host != socket.gethostname():
+            return False
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+
+class CacheIndex:
+    """Running totals of the cache size, and registry of `.current` files.
+
+    They are kept in a SQLite file at the cache root, and updated by
+    `Cache.create_entry`, so that checking the cache does not walk the whole
+    tree. Files written in the cache by other means are only accounted for by
+    `reconcile`, which recomputes everything from disk.
+
+    When an update fails, the index is marked as not reconciled, so that its
+    readers know not to trust it until the next `reconcile`.
+
+    NB: SQLite relies on file locks, which are unreliable on network
+    filesystems (NFS in particular). With the cache on one, processes of
+    several hosts writing at the same time may corrupt the index. It is only
+    made of totals, so `reconcile` rebuilds it (`sarc health cache`), but a
+    cache shared between hosts is best written by a single one.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.path = root / INDEX_NAME
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection in a transaction, committed when the block exits.
+
+        The connection is shared by the indexes of the same file in the
+        process, and the schema only created when it is opened.
+        """
+        conn, lock = _index_connection(self.path)
+        with lock:
+            try:
+                with conn:
+                    yield conn
+            except sqlite3.Error:
+                # The next use reopens it, in case the connection is the problem.
+                _forget_index_connection(self.path)
+                raise
+
+    def _update(self, description: str, *statements: tuple[str, tuple]) -> None:
+        try:
+            with self._connect() as conn:
+                for statement, params in statements:
+                    conn.execute(statement, params)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(
+                f"Cache index: could not {description}, it must be reconciled: "
+                f"{type(e).__name__}: {e}"
+            )
+            with contextlib.suppress(sqlite3.Error, OSError):
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM state WHERE key = 'reconciled'")
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _location(self, path: Path) -> tuple[str, str]:
+        """(subdirectory, month) of a file of the cache."""
+        parts = path.relative_to(self.root).parts
+        subdirectory = parts[0] if len(parts) > 1 else ""
+        # subdirectory/YYYY/MM/DD/HH:MM:SS.mmm
+        month = f"{parts[1]}/{parts[2]}" if len(parts) == 5 else ""
+        return subdirectory, month
+
+    def start_write(self, working_file: Path) -> None:
+        self._update(
+            "register a write",
+            (
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?)",
+                (
+                    self._relative(working_file),
+                    socket.gethostname(),
+                    os.getpid(),
+                    datetime.now(UTC).isoformat(),
+                ),
+            ),
+        )
+
+    def end_write(self, working_file: Path, output_file: Path) -> None:
+        subdirectory, month = self._location(output_file)
+        self._update(
+            "account for a write",
+            ("DELETE FROM writes WHERE path = ?", (self._relative(working_file),)),
+            (
+                "INSERT INTO sizes VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (subdirectory, month) DO UPDATE SET "
+                "files = files + 1, bytes = bytes + excluded.bytes",
+                (subdirectory, month, output_file.stat().st_size),
+            ),
+        )
+
+    def is_reconciled(self) -> bool:
+        """Whether the totals are to be trusted, i.e. were computed from disk once."""
+        if not self.path.exists():
+            return False
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE key = 'reconciled'"
+            ).fetchone()
+        return row is not None
+
+    def total_size(self) -> int:
+        with self._connect() as conn:
+            (total,) = conn.execute(
+                "SELECT coalesce(sum(bytes), 0) FROM sizes"
+            ).fetchone()
+        return total
+
+    def sizes(self) -> list[CacheSize]:
+        with self._connect() as conn:
+            return [
+                CacheSize(*row)
+                for row in conn.execute(
+                    "SELECT subdirectory, month, files, bytes FROM sizes "
+                    "ORDER BY subdirectory, month"
+                )
+            ]
+
+    def writes(self) -> list[CacheWrite]:
+        with self._connect() as conn:
+            return [
+                CacheWrite(
+                    path,
+                    host,
+                    pid,
+                    None if started is None else datetime.fromisoformat(started),
+                )
+                for path, host, pid, started in conn.execute(
+                    "SELECT path, host, pid, started FROM writes ORDER BY path"
+                )
+            ]
+
+    def reconcile(self) -> None:
+        """Recompute the totals and the `.current` files from disk.
+
+        Writes which finish while the tree is walked may be counted twice or
+        not at all, until the next reconciliation.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        sizes: dict[tuple[str, str], CacheSize] = {}
+        current: list[str] = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                if path.parent == self.root and filename.startswith(INDEX_NAME):
+                    continue
+                if path.is_symlink():
+                    continue
+                try:
+                    nbytes = path.stat().st_size
+                except FileNotFoundError:
+                    continue
+                if path.suffix == ".current":
+                    current.append(self._relative(path))
+                location = self._location(path)
+                size = sizes.setdefault(location, CacheSize(*location, 0, 0))
+                size.files += 1
+                size.bytes += nbytes
+
+        with self._connect() as conn:
+            known = {
+                row[0]: row
+                for row in conn.execute("SELECT path, host, pid, started FROM writes")
+            }
+            conn.execute("DELETE FROM sizes")
+            conn.executemany(
+                "INSERT INTO sizes VALUES (?, ?, ?, ?)",
+                [
+                    (size.subdirectory, size.month, size.files, size.bytes)
+                    for size in sizes.values()
+                ],
+            )
+            conn.execute("DELETE FROM writes")
+            conn.executemany(
+                "INSERT INTO writes VALUES (?, ?, ?, ?)",
+                [known.get(path, (path, None, None, None)) for path in current],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO state VALUES ('reconciled', ?)",
+                (datetime.now(UTC).isoformat(),),
+            )
+
+    def reconciled(self) -> CacheIndex:
+        """This index, reconciled first if it never was."""
+        if not self.is_reconciled():
+            self.reconcile()
+        return self
+
+
 class CacheEntry:
     """Describe a single cache entry at a point in time.
 
@@ -32,7 +320,9 @@ class CacheEntry:
 
     def add_value(self, key: str, value: bytes) -> None:
         """Add a key-value pair to the cache entry"""
-        self._zf.writestr(key, value)
+        with using_stage("cache.write") as stage:
+            self._zf.writestr(key, value)
+            stage.add(rows=1, nbytes=len(value))
 
     def keys(self) -> Iterator[str]:
         """Get all key names without loading the values."""
@@ -41,8 +331,12 @@ class CacheEntry:
 
     def items(self) -> Iterator[tuple[str, bytes]]:
         """Get all the key, value pairs in the order they were added."""
-        for zi in self._zf.infolist():
-            yield zi.filename, self._zf.read(zi)
+        with accumulated_stage("cache.read") as stage:
+            for zi in self._zf.infolist():
+                with stage.timed():
+                    value = self._zf.read(zi)
+                stage.add(rows=1, nbytes=len(value))
+                yield zi.filename, value
 
     def get_entry_datetime(self) -> datetime:
         """Get the time when this cache entry was created."""
@@ -116,13 +410,16 @@ class Cache:
         )
         working_file = output_file.with_suffix(".current")
         output_file.parent.mkdir(parents=True, exist_ok=True)
+        index = CacheIndex(cdir.parent)
         zf = ZipFile(working_file, mode="x", compression=ZIP_LZMA)
+        index.start_write(working_file)
         ce = CacheEntry(zf, at_time)
         try:
             yield ce
         finally:
             ce.close()
             working_file.rename(output_file)
+            index.end_write(working_file, output_file)
 
     def save(self, key: str, at_time: datetime, value: bytes) -> None:
         """Save binary data to the cache for a specific key and timestamp.
@@ -1,18 +1,14 @@
 import logging
+import sys
 import time
 from dataclasses import dataclass
 from types import SimpleNamespace
 
-from simple_parsing import ArgumentParser, field, subparsers
+from simple_parsing import ArgumentParser, field
 
-from sarc.logging import getSlackReport, setupLogging
 from sarc.patch import load
 
-from .encrypt import Encrypt
-from .fetch import Fetch
-from .health import Health
-from .parse import Parse
-from .usage import Usage
+from .lazy import Command, LazyCommand, lazy_subparsers, requested_argv
 
 colors = SimpleNamespace(
     grey="\033[38;21m",
@@ -50,13 +46,19 @@ class NiceHandler(logging.StreamHandler):
 
 @dataclass
 class CLI:
-    command: Health | Fetch | Parse | Encrypt | Usage = subparsers(
+    command: Command = lazy_subparsers(
         {
-            "health": Health,
-            "fetch": Fetch,
-            "parse": Parse,
-            "encrypt": Encrypt,
-            "usage": Usage,
+            "health": LazyCommand("sarc.cli.health:Health", "Run health checks"),
+            "fetch": LazyCommand("sarc.cli.fetch:Fetch", "Fetch data into the cache"),
+            "parse": LazyCommand(
+                "sarc.cli.parse:Parse", "Parse cached data into the database"
+            ),
+            "encrypt": LazyCommand("sarc.cli.encrypt:Encrypt", "Encrypt secrets"),
+            "usage": LazyCommand("sarc.cli.usage:Usage", "Resource usage reports"),
+            "daemon": LazyCommand(
+                "sarc.cli.daemon:Daemon",
+                "Run the scrapers periodically in a long-running process",
+            ),
         }
     )
 
@@ -67,8 +69,14 @@ class CLI:
         help="logging levels of information about the process (-v: INFO. -vv: DEBUG)",
         action="count",
     )
+    profile: bool = field(
+        default=False,
+        help="print the time and volume of each pipeline stage to stderr at the end",
+    )
 
     def execute(self) -> int:
+        from sarc.logging import setupLogging
+
         # build command name
         command_names = []
         c: object = self.command
@@ -80,6 +88,24 @@ class CLI:
                 c = None
 
         setupLogging(verbose_level=self.verbose, command_name=".".join(command_names))
+
+        if not self.profile:
+            return self._execute_command()
+
+        from sarc.stages import enable_stage_profile, format_stage_profile
+
+        totals = enable_stage_profile()
+        t0 = time.perf_counter()
+        try:
+            return self._execute_command()
+        finally:
+            print(  # noqa: T201
+                format_stage_profile(totals, time.perf_counter() - t0), file=sys.stderr
+            )
+
+    def _execute_command(self) -> int:
+        from sarc.logging import getSlackReport
+
         report = getSlackReport()
 
         if report is not None:
@@ -95,9 +121,14 @@ def main(argv: list[str] | None = None) -> int:
 
     load(config.patches)
 
-    parser = ArgumentParser()
-    parser.add_arguments(CLI, dest="command")
-    args = parser.parse_args(argv)
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Only the subcommands named in argv are imported
+    with requested_argv(argv):
+        parser = ArgumentParser()
+        parser.add_arguments(CLI, dest="command")
+        args = parser.parse_args(argv)
     command: CLI = args.command
 
     return command.execute()
@@ -0,0 +1,162 @@
+"""Long-running scraping process.
+
+Runs what the systemd timers otherwise launch as separate `sarc` commands:
+fetch then parse the jobs, fetch then parse the Prometheus metrics, and the
+health checks, on the periods of the `daemon` config section.
+
+In a single process, the interpreter, the config, the SSH connections (with
+their OTP), the Prometheus clients and the database connection pool are set up
+once instead of once per command, and the jobs are parsed as soon as they are
+fetched instead of waiting for another timer.
+"""
+
+import logging
+import signal
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+from simple_parsing import field
+
+from sarc.cli.parse import patch_db
+from sarc.config import config
+from sarc.db.cluster import SlurmClusterDB
+from sarc.scraping.jobs import fetch_jobs, parse_jobs
+from sarc.scraping.prometheus import fetch_prometheus, parse_prometheus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Task:
+    name: str
+    # Seconds between the starts of two runs.
+    period: float
+    run: Callable[[], object]
+    # time.monotonic() of the next run. 0 runs it as soon as the daemon starts.
+    next_run: float = 0.0
+
+
+def run_task(task: Task, clock: Callable[[], float] = time.monotonic) -> None:
+    """Run `task` once and schedule its next run. Errors are logged, not raised."""
+    start = clock()
+    logger.info(f"Daemon: running {task.name}")
+    try:
+        task.run()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.exception(f"Daemon: {task.name} failed: {type(e).__name__}: {e}")
+    finally:
+        # If a run takes longer than the period, the next one starts right away
+        # rather than piling up.
+        task.next_run = start + task.period
+        logger.info(f"Daemon: {task.name} done in {clock() - start:.1f}s")
+
+
+def run_schedule(
+    tasks: Sequence[Task],
+    stop: threading.Event,
+    clock: Callable[[], float] = time.monotonic,
+) -> None:
+    """Run the tasks when they are due, until `stop` is set.
+
+    Tasks due at the same time run in the order given, so that a pipeline's
+    steps (e.g. fetch before parse) stay in order.
+    """
+    while not stop.is_set():
+        for task in tasks:
+            if stop.is_set():
+                return
+            if clock() >= task.next_run:
+                run_task(task, clock)
+        stop.wait(max(0.0, min(task.next_run for task in tasks) - clock()))
+
+
+@dataclass
+class Daemon:
+    once: bool = field(action="store_true", help="Run every task once, then exit")
+
+    def execute(self) -> int:
+        tasks = self.tasks()
+        if not tasks:
+            logger.error("No task to run: all the periods of `daemon` are 0")
+            return -1
+
+        # The pooled connections wait for the next cycle, during which the
+        # server may close them.
+        config.db.pool_pre_ping = True
+        with config.db.session() as sess:
+            patch_db(sess)
+            sess.commit()
+
+        if self.once:
+            for task in tasks:
+                run_task(task)
+            return 0
+
+        stop = threading.Event()
+
+        def _stop(signum, _frame):
+            logger.info(f"Daemon: got signal {signum}, stopping after current task")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+        run_schedule(tasks, stop)
+        return 0
+
+    def tasks(self) -> list[Task]:
+        dcfg = config.daemon
+        tasks = []
+        if dcfg.jobs_period > 0:
+            tasks.append(Task("jobs", dcfg.jobs_period * 60, self._jobs))
+        if dcfg.prometheus_period > 0:
+            tasks.append(
+                Task("prometheus", dcfg.prometheus_period * 60, self._prometheus)
+            )
+        if dcfg.health_period > 0 and config.health_monitor is not None:
+            tasks.append(Task("health", dcfg.health_period * 60, self._health))
+        return tasks
+
+    def _cluster_names(self) -> list[str]:
+        return config.daemon.clusters or list(config.clusters)
+
+    def _jobs(self) -> None:
+        cluster_names = self._cluster_names()
+        for name in cluster_names:
+            config.clusters[name].reset_ssh()
+        fetch_jobs(
+            cluster_names,
+            config.clusters,
+            None,
+            config.daemon.auto_interval,
+            config.daemon.max_intervals,
+        )
+        # `sarc parse slurmconfig` runs in another process: reload the node to
+        # GPU mappings it may have written since the last run.
+        SlurmClusterDB.clear_timelines()
+        # Parse what was just fetched, and anything left unparsed before.
+        parse_jobs(config.clusters, None, update_parsed_date=True)
+
+    def _prometheus(self) -> None:
+        with config.db.session() as sess:
+            for name in self._cluster_names():
+                cluster = config.clusters[name]
+                if not cluster.prometheus_url:
+                    continue
+                try:
+                    fetch_prometheus(
+                        sess, cluster, None, config.daemon.prometheus_max_jobs
+                    )
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    sess.rollback()
+                    logger.error(
+                        f"Error while acquiring Prometheus metrics on {name}: "
+                        f"{type(e).__name__}: {e} ; skipping cluster."
+                    )
+        parse_prometheus(None, update_parsed_date=True)
+
+    def _health(self) -> None:
+        from sarc.cli.health.run import HealthRunCommand
+
+        HealthRunCommand(all=True).execute()
@@ -1,32 +1,21 @@
 from dataclasses import dataclass
 
-from simple_parsing import subparsers
-
-from .allocations import FetchAllocations
-from .diskusage import FetchDiskUsage
-from .jobs import FetchJobs
-from .prometheus import FetchPrometheus
-from .slurmconfig import FetchSlurmConfig
-from .users import FetchUsers
+from sarc.cli.lazy import Command, LazyCommand, lazy_subparsers
 
 
 @dataclass
 class Fetch:
-    command: (
-        FetchUsers
-        | FetchDiskUsage
-        | FetchSlurmConfig
-        | FetchAllocations
-        | FetchJobs
-        | FetchPrometheus
-    ) = subparsers(
+    command: Command = lazy_subparsers(
         {
-            "users": FetchUsers,
-            "diskusage": FetchDiskUsage,
-            "slurmconfig": FetchSlurmConfig,
-            "allocations": FetchAllocations,
-            "jobs": FetchJobs,
-            "prometheus": FetchPrometheus,
+            "users": LazyCommand("sarc.cli.fetch.users:FetchUsers"),
+            "diskusage": LazyCommand("sarc.cli.fetch.diskusage:FetchDiskUsage"),
+            "slurmconfig": LazyCommand(
+                "sarc.cli.fetch.slurmconfig:FetchSlurmConfig",
+                "Download slurm.conf file for given cluster at current time.",
+            ),
+            "allocations": LazyCommand("sarc.cli.fetch.allocations:FetchAllocations"),
+            "jobs": LazyCommand("sarc.cli.fetch.jobs:FetchJobs"),
+            "prometheus": LazyCommand("sarc.cli.fetch.prometheus:FetchPrometheus"),
         }
     )
 
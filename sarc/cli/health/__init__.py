@@ -1,15 +1,24 @@
 from dataclasses import dataclass
 
-from simple_parsing import subparsers
-
-from .list import HealthListCommand
-from .run import HealthRunCommand
+from sarc.cli.lazy import Command, LazyCommand, lazy_subparsers
 
 
 @dataclass
 class Health:
-    command: HealthRunCommand | HealthListCommand = subparsers(
-        {"run": HealthRunCommand, "list": HealthListCommand}
+    command: Command = lazy_subparsers(
+        {
+            "run": LazyCommand(
+                "sarc.cli.health.run:HealthRunCommand", "Execute health checks."
+            ),
+            "list": LazyCommand(
+                "sarc.cli.health.list:HealthListCommand",
+                "Show health check states saved in database.",
+            ),
+            "cache": LazyCommand(
+                "sarc.cli.health.cache:HealthCacheCommand",
+                "Recompute the cache size totals and temporary files from disk.",
+            ),
+        }
     )
 
     def execute(self) -> int:
@@ -0,0 +1,39 @@
+# ruff: noqa: T201
+import logging
+from dataclasses import dataclass
+
+from sarc.cache import CacheIndex
+from sarc.config import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HealthCacheCommand:
+    """Recompute the cache size totals and temporary files from disk.
+
+    The cache health checks read them from the cache index, which is kept up
+    to date as entries are written. This is only needed after files were
+    added or removed in the cache by other means.
+    """
+
+    def execute(self) -> int:
+        cache = config.cache
+        if cache is None:
+            logger.error("No cache configured")
+            return -1
+
+        index = CacheIndex(cache)
+        index.reconcile()
+
+        total = 0
+        for size in index.sizes():
+            total += size.bytes
+            print(
+                f"{size.subdirectory or '.':<16} {size.month or '-':<8}"
+                f" {size.files:>8} files {size.bytes:>16} B"
+            )
+        print(f"{'total':<16} {'':<8} {'':>14} {total:>16} B")
+        for write in index.writes():
+            print(f"Temporary file: {write.path}")
+        return 0
@@ -5,15 +5,31 @@ execute either all checks (--all), or only specified checks (--check check1 chec
 State is persistent in MongoDB, and results are logged instead of written to files.
 """
 
+import contextvars
 import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from pathlib import Path
 
 import gifnoc
 import simple_parsing
+from sqlalchemy import Connection, event
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm import SessionTransaction
 from sqlmodel import Session
 
-from sarc.alerts.common import CheckStatus, HealthMonitorConfig
+from sarc.alerts.common import (
+    CheckException,
+    CheckResult,
+    CheckStatus,
+    HealthCheck,
+    HealthMonitorConfig,
+)
+from sarc.alerts.usage_alerts.job_window import job_window_interval, shared_job_window
 from sarc.config import config
 from sarc.db.healthcheck import HealthCheckStateDB
 from sarc.models.healthcheck_state import HealthCheckState
@@ -38,6 +54,17 @@ class HealthRunCommand:
         action="store_true",
         help="Run all health checks. Mutually exclusive with --check",
     )
+    jobs: int = simple_parsing.field(
+        default=4,
+        help="Number of checks run concurrently. Checks run after the checks they depend on",
+    )
+    timeout: float | None = simple_parsing.field(
+        default=None,
+        help=(
+            "Seconds after which a check is reported as ERROR. "
+            "Its database statements are canceled after as long"
+        ),
+    )
 
     def execute(self) -> int:
         if self.config is None:
@@ -68,57 +95,238 @@ class HealthRunCommand:
             check_names = list(hcfg.checks.keys())
             logger.debug(f"Running all {len(check_names)} health checks")
 
-        checks_run = 0
         checks_skipped = 0
-
         with config.db.session() as sess:
+            states = {}
             for name in check_names:
-                # Get check state
                 state = _get_state(name=name, hcfg=hcfg, sess=sess)
                 assert state is not None
-                check = state.check
-
                 # Skip inactive checks
-                if not check.active:
+                if not state.check.active:
                     logger.debug(f"Skipping '{name}': inactive")
                     checks_skipped += 1
                     continue
+                states[name] = state
+            sess.commit()
 
-                # Check dependencies
-                deps_ok = True
-                for dep in check.depends:
-                    dep_state = HealthCheckStateDB.get_state(sess, dep)
-                    if (
-                        dep_state is None
-                        or dep_state.last_result is None
-                        or dep_state.last_result.status != CheckStatus.OK
-                    ):
-                        logger.warning(f"Skipping '{name}': dependency '{dep}' not OK")
-                        deps_ok = False
-                        break
-
-                if not deps_ok:
-                    checks_skipped += 1
-                    continue
+            checks = {name: state.check for name, state in states.items()}
+            t0 = time.perf_counter()
+            # The checks reading the same recent jobs read them from one copy.
+            with shared_job_window(job_window_interval(checks.values())):
+                outcomes = run_checks(
+                    checks,
+                    lambda dep: _last_status(sess, dep),
+                    max_workers=self.jobs,
+                    timeout=self.timeout,
+                )
+            wall_time = time.perf_counter() - t0
 
-                # Execute the check
-                logger.debug(f"Running check: '{name}'")
-                result = check.wrapped_check()
-                checks_run += 1
-                # Log the result
-                message = result.log_result()
-                # Update MongoDB state
-                state.last_result = result
-                state.last_message = message
+            # Write all the results at once
+            for name, outcome in outcomes.items():
+                if outcome.result is None:
+                    continue
+                state = states[name]
+                state.last_result = outcome.result
+                state.last_message = outcome.result.log_result()
                 sess.merge(state)
-                sess.commit()
+            sess.commit()
 
+        checks_run = sum(o.result is not None for o in outcomes.values())
+        checks_skipped += len(outcomes) - checks_run
+        serial_time = sum(o.seconds for o in outcomes.values())
         logger.info(
-            f"Check complete: {checks_run} checks run, {checks_skipped} skipped"
+            f"Check complete: {checks_run} checks run, {checks_skipped} skipped, "
+            f"in {wall_time:.1f}s ({serial_time:.1f}s if run one after another)"
         )
         return 0
 
 
+@dataclass
+class CheckOutcome:
+    # None if the check was skipped because of its dependencies
+    result: CheckResult | None = None
+    # Time spent running the check
+    seconds: float = 0.0
+
+
+def dependency_levels(checks: dict[str, HealthCheck]) -> list[list[str]]:
+    """Group checks in levels: a check only depends on checks of previous levels.
+
+    Like in a serial run, a check only waits for the dependencies that come
+    before it in `checks`. The others are ignored here (see `run_checks`).
+    """
+    level_of: dict[str, int] = {}
+    levels: list[list[str]] = []
+    for name, check in checks.items():
+        level = 1 + max(
+            (level_of[dep] for dep in check.depends if dep in level_of), default=-1
+        )
+        level_of[name] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(name)
+    return levels
+
+
+# Timeout of the check running in the current context, if any.
+_check_timeout: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "check_timeout", default=None
+)
+
+
+@event.listens_for(OrmSession, "after_begin")
+def _bound_check_statements(
+    session: OrmSession,  # noqa: ARG001
+    transaction: SessionTransaction,  # noqa: ARG001
+    connection: Connection,
+) -> None:
+    """Cancel the statements of a check that take longer than its timeout.
+
+    A thread cannot be interrupted, but a check is mostly waiting on the
+    database: this bounds it, and frees its connection.
+    """
+    timeout = _check_timeout.get()
+    if timeout is not None:
+        milliseconds = max(1, int(timeout * 1000))
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {milliseconds}")
+
+
+def _timed_check(
+    check: HealthCheck, timeout: float | None
+) -> tuple[CheckResult, float]:
+    _check_timeout.set(timeout)
+    t0 = time.perf_counter()
+    result = check.wrapped_check()
+    return result, time.perf_counter() - t0
+
+
+class _DaemonRunner:
+    """Run functions in daemon threads, at most `max_workers` at a time.
+
+    Unlike the threads of a ThreadPoolExecutor, which are joined when the
+    interpreter exits, an abandoned run neither keeps the process alive nor
+    holds on to its slot.
+    """
+
+    def __init__(self, max_workers: int):
+        self._slots = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._holding: set[Future] = set()
+
+    def submit[T](self, fn: Callable[[], T]) -> Future[T]:
+        future: Future[T] = Future()
+
+        def run() -> None:
+            self._slots.acquire()
+            with self._lock:
+                if not future.set_running_or_notify_cancel():
+                    # Abandoned before it started
+                    self._slots.release()
+                    return
+                self._holding.add(future)
+            try:
+                result = fn()
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                self._release(future)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def abandon(self, future: Future) -> None:
+        """Stop waiting for `future`: the next run gets its slot."""
+        with self._lock:
+            future.cancel()
+        self._release(future)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            if future in self._holding:
+                self._holding.remove(future)
+                self._slots.release()
+
+
+def run_checks(
+    checks: dict[str, HealthCheck],
+    status_of: Callable[[str], CheckStatus | None],
+    max_workers: int = 4,
+    timeout: float | None = None,
+) -> dict[str, CheckOutcome]:
+    """Run the checks, those of a same dependency level concurrently.
+
+    A check is skipped if one of its dependencies is not OK: its result from
+    this run if it comes before it in `checks`, otherwise its status from
+    `status_of`. So the outcome is the same as running them one after another.
+    A check that does not finish within `timeout` seconds gets an ERROR result.
+    Its database statements are canceled after `timeout` seconds. Otherwise it
+    cannot be interrupted, but it runs in a daemon thread, which does not keep
+    the process from exiting.
+    """
+    outcomes: dict[str, CheckOutcome] = {}
+    position = {name: i for i, name in enumerate(checks)}
+
+    def dep_status(name: str, dep: str) -> CheckStatus | None:
+        if dep in outcomes and position[dep] < position[name]:
+            result = outcomes[dep].result
+            return None if result is None else result.status
+        return status_of(dep)
+
+    runner = _DaemonRunner(max_workers=max_workers)
+    for level in dependency_levels(checks):
+        futures = {}
+        for name in level:
+            check = checks[name]
+            bad_dep = next(
+                (
+                    dep
+                    for dep in check.depends
+                    if dep_status(name, dep) != CheckStatus.OK
+                ),
+                None,
+            )
+            if bad_dep is not None:
+                logger.warning(f"Skipping '{name}': dependency '{bad_dep}' not OK")
+                outcomes[name] = CheckOutcome()
+                continue
+            logger.debug(f"Running check: '{name}'")
+            # The config is in context variables, which threads don't inherit.
+            ctx = contextvars.copy_context()
+            futures[name] = runner.submit(
+                lambda ctx=ctx, check=check: ctx.run(_timed_check, check, timeout)
+            )
+
+        # Every check of the level started at about the same time, so they
+        # all share the same deadline.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name, future in futures.items():
+            remaining = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            try:
+                result, seconds = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                runner.abandon(future)
+                exc = TimeoutError(f"Check did not finish within {timeout}s")
+                result = checks[name].result(
+                    CheckStatus.ERROR, exception=CheckException.from_exception(exc)
+                )
+                seconds = float(timeout or 0.0)
+            outcomes[name] = CheckOutcome(result, seconds)
+
+    # Same order as the checks
+    return {name: outcomes[name] for name in checks}
+
+
+def _last_status(sess: Session, name: str) -> CheckStatus | None:
+    state = HealthCheckStateDB.get_state(sess, name)
+    if state is None or state.last_result is None:
+        return None
+    return state.last_result.status
+
+
 def _get_state(
     name: str, hcfg: HealthMonitorConfig, sess: Session
 ) -> HealthCheckStateDB | None:
@@ -139,5 +347,4 @@ def _get_state(
             db_state = HealthCheckStateDB.get_or_create(
                 sess, HealthCheckState(check=check)
             )
-        sess.commit()
     return db_state
@@ -0,0 +1,99 @@
+"""Lazily imported subcommands.
+
+Most SARC commands are run by timers, and each run pays the import cost of
+the whole command tree. Command dataclasses are therefore referenced by their
+import path, and only the command actually selected on the command line is
+imported. The other ones are replaced by empty placeholders, which is enough
+for argparse to list them in ``--help``.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import importlib
+from collections.abc import Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, make_dataclass
+from functools import cache
+from typing import Protocol
+
+from simple_parsing import subparsers
+
+# Command line being parsed, used to know which subcommands must be imported.
+_requested_argv: contextvars.ContextVar[Sequence[str]] = contextvars.ContextVar(
+    "_requested_argv", default=()
+)
+
+
+class Command(Protocol):
+    def execute(self) -> int: ...
+
+
+@dataclass(frozen=True)
+class LazyCommand:
+    """Reference to a command dataclass, as `module:ClassName`."""
+
+    target: str
+    help: str | None = None
+
+    def load(self) -> type:
+        module_name, attr = self.target.split(":")
+        return getattr(importlib.import_module(module_name), attr)
+
+
+class _NotLoaded:
+    def execute(self) -> int:
+        raise RuntimeError(f"Command {type(self).__name__} was not loaded")
+
+
+@cache
+def _placeholder(name: str, help: str | None) -> type:
+    return make_dataclass(
+        f"Lazy_{name}", [], bases=(_NotLoaded,), namespace={"__doc__": help}
+    )
+
+
+class _LazyCommands(Mapping[str, type]):
+    """Map command names to dataclasses, importing only the requested one."""
+
+    def __init__(self, commands: dict[str, LazyCommand]):
+        self._commands = commands
+
+    def _selected(self) -> str | None:
+        # The first argument matching one of our names selects the command.
+        # Options always come before the subcommand name at a given level, and
+        # the parent commands' names are never ours, so this is unambiguous
+        # in practice.
+        for arg in _requested_argv.get():
+            if arg in self._commands:
+                return arg
+        return None
+
+    def __getitem__(self, name: str) -> type:
+        command = self._commands[name]
+        if name == self._selected():
+            return command.load()
+        return _placeholder(name, command.help)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._commands)
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+
+def lazy_subparsers(commands: dict[str, LazyCommand]):
+    """Same as `simple_parsing.subparsers`, with lazily imported commands."""
+    # subparsers() only reads the mapping, but is annotated with dict. A dict
+    # subclass would not do: dict.items() and .values() bypass __getitem__.
+    return subparsers(_LazyCommands(commands))  # ty:ignore[invalid-argument-type]
+
+
+@contextmanager
+def requested_argv(argv: Sequence[str]) -> Iterator[None]:
+    """Declare the command line being parsed while building the parser."""
+    token = _requested_argv.set(argv)
+    try:
+        yield
+    finally:
+        _requested_argv.reset(token)
@@ -1,18 +1,11 @@
 from dataclasses import dataclass
 
-from simple_parsing import subparsers
 from sqlmodel import Session
 
+from sarc.cli.lazy import Command, LazyCommand, lazy_subparsers
 from sarc.config import config
 from sarc.patch import declare_patch
 
-from .allocations import ParseAllocations
-from .diskusage import ParseDiskUsage
-from .jobs import ParseJobs
-from .prometheus import ParsePrometheus
-from .slurmconfig import ParseSlurmConfig
-from .users import ParseUsers
-
 
 @declare_patch
 def patch_db(sess: Session) -> None:
@@ -21,21 +14,14 @@ def patch_db(sess: Session) -> None:
 
 @dataclass
 class Parse:
-    command: (
-        ParseUsers
-        | ParseDiskUsage
-        | ParseSlurmConfig
-        | ParseAllocations
-        | ParseJobs
-        | ParsePrometheus
-    ) = subparsers(
+    command: Command = lazy_subparsers(
         {
-            "users": ParseUsers,
-            "diskusage": ParseDiskUsage,
-            "slurmconfig": ParseSlurmConfig,
-            "allocations": ParseAllocations,
-            "jobs": ParseJobs,
-            "prometheus": ParsePrometheus,
+            "users": LazyCommand("sarc.cli.parse.users:ParseUsers"),
+            "diskusage": LazyCommand("sarc.cli.parse.diskusage:ParseDiskUsage"),
+            "slurmconfig": LazyCommand("sarc.cli.parse.slurmconfig:ParseSlurmConfig"),
+            "allocations": LazyCommand("sarc.cli.parse.allocations:ParseAllocations"),
+            "jobs": LazyCommand("sarc.cli.parse.jobs:ParseJobs"),
+            "prometheus": LazyCommand("sarc.cli.parse.prometheus:ParsePrometheus"),
         }
     )
 
@@ -93,6 +93,8 @@ def parse_slurmconfig(
             )
         set_parsed_date(sess, "slurmconf", cache_entry.entry_datetime)
         sess.commit()
+        # Mappings and billings loaded before are now stale.
+        SlurmClusterDB.clear_timelines()
     return 0
 
 
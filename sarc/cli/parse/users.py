@@ -6,8 +6,13 @@ from simple_parsing import field
 
 from sarc.cache import Cache
 from sarc.config import config
-from sarc.db.runstate import get_parsed_date, set_parsed_date
-from sarc.scraping.users import parse_ce, update_user
+from sarc.db.runstate import (
+    get_parsed_date,
+    get_user_digests,
+    set_parsed_date,
+    set_user_digests,
+)
+from sarc.scraping.users import changed_users, parse_ce, update_users
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +27,10 @@ class ParseUsers:
     update_parsed_date: bool = field(
         default=True, help="Update the last parsed date in the database"
     )
+    force: bool = field(
+        action="store_true",
+        help="Update all the users, including those that did not change since the last parsed entry",
+    )
 
     def execute(self) -> int:
         cache = Cache(subdirectory="users")
@@ -35,10 +44,15 @@ class ParseUsers:
                 if _since is None:
                     _since = cache.oldest_year()
 
+            digests = get_user_digests(sess)
             for ce in cache.read_from(from_time=_since):
-                for um in parse_ce(ce):
-                    update_user(sess, um)
-                    sess.flush()
+                users = list(parse_ce(ce))
+                changed = list(changed_users(users, ce.get_entry_datetime(), digests))
+                logger.info(
+                    f"{len(changed)} users out of {len(users)} changed in {ce.get_entry_datetime()}."
+                )
+                update_users(sess, users if self.force else changed)
+                set_user_digests(sess, digests)
                 if self.update_parsed_date:
                     logger.info(
                         f"Set parsed_dates for users to {ce.get_entry_datetime()}."
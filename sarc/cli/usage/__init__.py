@@ -1,15 +1,21 @@
 from dataclasses import dataclass
 
-from simple_parsing import subparsers
-
-from .notify import UsageNotifyCommand
-from .refresh_store import UsageRefreshStoreCommand
+from sarc.cli.lazy import Command, LazyCommand, lazy_subparsers
 
 
 @dataclass
 class Usage:
-    command: UsageNotifyCommand | UsageRefreshStoreCommand = subparsers(
-        {"notify": UsageNotifyCommand, "refresh-store": UsageRefreshStoreCommand}
+    command: Command = lazy_subparsers(
+        {
+            "notify": LazyCommand(
+                "sarc.cli.usage.notify:UsageNotifyCommand",
+                "Preview or send resource-usage reports (dry-run by default).",
+            ),
+            "refresh-store": LazyCommand(
+                "sarc.cli.usage.refresh_store:UsageRefreshStoreCommand",
+                "Refresh the UserPeriods store.",
+            ),
+        }
     )
 
     def execute(self) -> int:
@@ -7,7 +7,8 @@ from datetime import UTC, datetime, timedelta
 import gifnoc
 import simple_parsing
 
-from sarc.config import config
+from sarc.config import SlackConfig, config
+from sarc.db.runstate import get_slack_recipients, update_slack_recipients
 from sarc.notifications.csv_export import build_recurring_distilled_csv
 from sarc.notifications.messages import (
     build_admin_digest,
@@ -16,6 +17,7 @@ from sarc.notifications.messages import (
 )
 from sarc.notifications.slack import SendStatus, SlackClient
 from sarc.notifications.usage import (
+    _run_concurrently,
     get_cycle_dates,
     get_recurring_underusers,
     get_underusers_usage,
@@ -63,17 +65,29 @@ def _build_delivery_footer(
 def _deliver(
     rows: list, build_fn: Callable, *, slack: SlackClient, send_to: str | None = None
 ) -> list[_DeliveryResult]:
-    results: list[_DeliveryResult] = []
-    for row in rows:
+    """DM each row's report, a few at a time; SlackClient paces the API calls."""
+
+    def deliver_one(row) -> _DeliveryResult:
         text = build_fn(row)
         slack_res = slack.dm_user(send_to or row.email, text)
         if slack_res.status == SendStatus.OK:
-            results.append(_DeliveryResult(row.email, row.display_name, "dm_sent"))
-        else:
-            results.append(
-                _DeliveryResult(row.email, row.display_name, "failed", slack_res.detail)
-            )
-    return results
+            return _DeliveryResult(row.email, row.display_name, "dm_sent")
+        return _DeliveryResult(row.email, row.display_name, "failed", slack_res.detail)
+
+    return _run_concurrently([lambda row=row: deliver_one(row) for row in rows])
+
+
+def _slack_client(slack_cfg: SlackConfig) -> SlackClient:
+    """SlackClient of `slack_cfg`, with the DM recipients cached by past runs."""
+    with config.db.session() as sess:
+        recipients = get_slack_recipients(sess, slack_cfg.description)
+    return SlackClient(slack_cfg.token, recipients=recipients)
+
+
+def _save_slack_recipients(slack_cfg: SlackConfig, slack: SlackClient) -> None:
+    with config.db.session() as sess:
+        update_slack_recipients(sess, slack_cfg.description, slack.recipients)
+        sess.commit()
 
 
 def _now_utc() -> datetime:
@@ -420,8 +434,8 @@ class UsageNotifyCommand:
             return 0
 
         # === SEND MODE ===
-        slack_underusage_client = SlackClient(ncfg.slack_underusage.token)
-        slack_usage_client = SlackClient(ncfg.slack_usage.token)
+        slack_underusage_client = _slack_client(ncfg.slack_underusage)
+        slack_usage_client = _slack_client(ncfg.slack_usage)
 
         underusage_report_delivery_results: list[_DeliveryResult] = []
         usage_report_delivery_results: list[_DeliveryResult] = []
@@ -461,6 +475,9 @@ class UsageNotifyCommand:
                     _DeliveryResult(row.email, row.display_name, "skipped", reason)
                 )
 
+        _save_slack_recipients(ncfg.slack_underusage, slack_underusage_client)
+        _save_slack_recipients(ncfg.slack_usage, slack_usage_client)
+
         underusage_report_footer = None
         usage_report_footer = None
 
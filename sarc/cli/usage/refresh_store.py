@@ -1,21 +1,25 @@
+import hashlib
+import json
 import logging
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
-from functools import partial
 
 import simple_parsing
+from sqlalchemy import ARRAY, TIMESTAMP, Boolean, Float, Integer, String, bindparam
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlmodel import col, delete, select
+from sqlmodel import Session, col, delete, func, select, update
 
 from sarc.cli.usage.notify import _today_utc
 from sarc.config import config
 from sarc.db.cluster import SlurmClusterDB
+from sarc.db.runstate import get_user_period_digests, set_user_period_digests
 from sarc.db.user_periods import UserPeriods
 from sarc.notifications.usage import (
+    CycleUserClusterStat,
     _restrictive_action_flags,
-    _run_concurrently,
     _week_anchor,
-    classify_cycle,
+    classify_cycles,
+    cycle_job_digests,
 )
 
 logger = logging.getLogger(__name__)
@@ -25,6 +29,11 @@ logger = logging.getLogger(__name__)
 class UsageRefreshStoreCommand:
     """Refresh the UserPeriods store (PowerBI + get_recurring_underusers fast path)."""
 
+    full: bool = simple_parsing.field(
+        action="store_true",
+        help="Reclassify every cycle, including those whose jobs did not change "
+        "since the last refresh.",
+    )
     as_of: str | None = simple_parsing.field(
         default=None,
         alias=["--as-of"],
@@ -60,6 +69,7 @@ class UsageRefreshStoreCommand:
         anchor = _week_anchor(end)
         clusters = ncfg.clusters or None
 
+        recurrence_active_cycles = ncfg.recurrence_active_cycles
         # Position 0 = most recent cycle, matching the ordering used throughout
         # sarc.notifications.usage (RecurringUserRow.pa_flags, cycle_flagged, ...).
         cycle_bounds = [
@@ -70,96 +80,260 @@ class UsageRefreshStoreCommand:
             for i in range(history_cycles)
         ]
 
-        classify_results = _run_concurrently(
+        # A cycle is reclassified only if its jobs or the classification
+        # settings changed since the last refresh. The cycles before the stored
+        # ones are digested too: they are part of the trailing window of the
+        # oldest stored cycles.
+        nb_digested = history_cycles + recurrence_active_cycles - 1
+        settings = json.dumps(
             [
-                partial(
-                    classify_cycle,
-                    c_start,
-                    c_end,
-                    min_waste_ratio=ncfg.min_waste_ratio,
-                    min_waste_rgu_hours=ncfg.min_waste_rgu_hours,
-                    personalized_action_min_waste_rgu_hours=ncfg.personalized_action_min_waste_rgu_hours,
-                    recurrence_active_cycles=ncfg.recurrence_active_cycles,
+                ncfg.min_waste_ratio,
+                ncfg.min_waste_rgu_hours,
+                ncfg.personalized_action_min_waste_rgu_hours,
+                recurrence_active_cycles,
+                ncfg.utilization_ceiling,
+                clusters,
+            ]
+        )
+        digests = {
+            anchor - timedelta(weeks=i * cycle_length_weeks): hashlib.sha256(
+                f"{settings}|{job_digest}".encode()
+            ).hexdigest()
+            for i, job_digest in enumerate(
+                cycle_job_digests(
+                    anchor,
+                    nb_digested,
                     cycle_length_weeks=cycle_length_weeks,
                     clusters=clusters,
-                    utilization_ceiling=ncfg.utilization_ceiling,
                 )
-                for c_start, c_end in cycle_bounds
-            ]
-        )
+            )
+        }
 
-        # elevated is a per-user (cross-cluster) escalation flag, derived from
-        # each user's flagged sequence across positions -- same derivation
-        # RecurringUserRow.restrictive_action_flags applies to pa_flags.
-        flagged_by_user: dict[int, list[bool]] = {}
-        for i, stats in enumerate(classify_results):
-            for s in stats:
-                if s.user_id not in flagged_by_user:
-                    flagged_by_user[s.user_id] = [False] * history_cycles
-                flagged_by_user[s.user_id][i] = s.flagged
-        elevated_by_user = {
-            uid: _restrictive_action_flags(flags)
-            for uid, flags in flagged_by_user.items()
+        with config.db.session() as session:
+            stored_digests = {} if self.full else get_user_period_digests(session)
+        changed = [
+            i
+            for i, end_date in enumerate(digests)
+            if stored_digests.get(end_date) != digests[end_date]
+        ]
+        # A cycle's flags also depend on the recurrence_active_cycles - 1 cycles
+        # before it, through its trailing window.
+        dirty = {
+            position
+            for i in changed
+            for position in range(i - recurrence_active_cycles + 1, i + 1)
+            if 0 <= position < history_cycles
         }
 
+        classify_results: dict[int, list[CycleUserClusterStat]] = {}
+        if dirty:
+            # One statement for the span of dirty cycles, clean ones in between
+            # included.
+            first, last = min(dirty), max(dirty)
+            classify_results = dict(
+                enumerate(
+                    classify_cycles(
+                        cycle_bounds[first][1],
+                        last - first + 1,
+                        min_waste_ratio=ncfg.min_waste_ratio,
+                        min_waste_rgu_hours=ncfg.min_waste_rgu_hours,
+                        personalized_action_min_waste_rgu_hours=ncfg.personalized_action_min_waste_rgu_hours,
+                        recurrence_active_cycles=recurrence_active_cycles,
+                        cycle_length_weeks=cycle_length_weeks,
+                        clusters=clusters,
+                        utilization_ceiling=ncfg.utilization_ceiling,
+                    ),
+                    start=first,
+                )
+            )
+
         oldest_kept_end = cycle_bounds[-1][1]
-        rows_written = 0
         rows_pruned = 0
+        rows_elevated = 0
         with config.db.session() as session:
-            cluster_ids = {
-                c.name: c.id for c in session.exec(select(SlurmClusterDB)).all()
+            # elevated is a per-user (cross-cluster) escalation flag, derived
+            # from each user's flagged sequence across positions -- same
+            # derivation RecurringUserRow.restrictive_action_flags applies to
+            # pa_flags. The flags of the cycles not reclassified are the stored
+            # ones.
+            flagged_by_user: dict[int, list[bool]] = {}
+            stored_elevated: dict[tuple[int, int], bool] = {}
+            position_by_end = {c_end: i for i, (_, c_end) in enumerate(cycle_bounds)}
+            stored_rows = session.exec(
+                select(
+                    col(UserPeriods.user_id),
+                    col(UserPeriods.end_date),
+                    col(UserPeriods.flagged),
+                    col(UserPeriods.elevated),
+                ).where(
+                    col(UserPeriods.end_date).in_(
+                        [
+                            c_end
+                            for i, (_, c_end) in enumerate(cycle_bounds)
+                            if i not in classify_results
+                        ]
+                    )
+                )
+            ).all()
+            for user_id, end_date, flagged, elevated in stored_rows:
+                i = position_by_end[end_date]
+                flagged_by_user.setdefault(user_id, [False] * history_cycles)[i] = (
+                    flagged
+                )
+                stored_elevated[user_id, i] = elevated
+            for i, stats in classify_results.items():
+                for s in stats:
+                    flagged_by_user.setdefault(s.user_id, [False] * history_cycles)[
+                        i
+                    ] = s.flagged
+            elevated_by_user = {
+                uid: _restrictive_action_flags(flags)
+                for uid, flags in flagged_by_user.items()
             }
 
-            for i, (c_start, c_end) in enumerate(cycle_bounds):
-                for s in classify_results[i]:
-                    cluster_id = cluster_ids.get(s.cluster)
-                    if cluster_id is None:
-                        logger.warning(
-                            "Skipping user_id=%s: no clusters row matches "
-                            "cluster=%r (position %d)",
-                            s.user_id,
-                            s.cluster,
-                            i,
+            rows_written = _upsert_user_periods(
+                session,
+                [
+                    {
+                        "user_id": s.user_id,
+                        "cluster": s.cluster,
+                        "start_date": cycle_bounds[i][0],
+                        "end_date": cycle_bounds[i][1],
+                        "sm_occ_mean": s.sm_occ_mean,
+                        "rgu_hours": s.rgu_hours,
+                        "unused_rguh": s.wasted,
+                        "isunderuser": s.isunderuser,
+                        "flagged": s.flagged,
+                        "elevated": elevated_by_user[s.user_id][i],
+                    }
+                    for i, stats in classify_results.items()
+                    for s in stats
+                ],
+            )
+
+            # A reclassified cycle may change the escalation of the cycles
+            # around it.
+            for (user_id, i), elevated in stored_elevated.items():
+                if elevated_by_user[user_id][i] != elevated:
+                    session.exec(
+                        update(UserPeriods)
+                        .where(
+                            col(UserPeriods.user_id) == user_id,
+                            col(UserPeriods.end_date) == cycle_bounds[i][1],
                         )
-                        continue
-                    insert_stmt = pg_insert(UserPeriods).values(
-                        user_id=s.user_id,
-                        cluster_id=cluster_id,
-                        start_date=c_start,
-                        end_date=c_end,
-                        sm_occ_mean=s.sm_occ_mean,
-                        rgu_hours=s.rgu_hours,
-                        unused_rguh=s.wasted,
-                        isunderuser=s.isunderuser,
-                        flagged=s.flagged,
-                        elevated=elevated_by_user[s.user_id][i],
+                        .values(elevated=elevated_by_user[user_id][i])
                     )
-                    upsert_stmt = insert_stmt.on_conflict_do_update(
-                        index_elements=["user_id", "cluster_id", "end_date"],
-                        set_={
-                            "start_date": insert_stmt.excluded.start_date,
-                            "sm_occ_mean": insert_stmt.excluded.sm_occ_mean,
-                            "rgu_hours": insert_stmt.excluded.rgu_hours,
-                            "unused_rguh": insert_stmt.excluded.unused_rguh,
-                            "isunderuser": insert_stmt.excluded.isunderuser,
-                            "flagged": insert_stmt.excluded.flagged,
-                            "elevated": insert_stmt.excluded.elevated,
-                        },
-                    )
-                    session.exec(upsert_stmt)
-                    rows_written += 1
+                    rows_elevated += 1
 
             prune_result = session.exec(
                 delete(UserPeriods).where(col(UserPeriods.end_date) < oldest_kept_end)
             )
             rows_pruned = prune_result.rowcount
+            set_user_period_digests(session, digests)
             session.commit()
 
         logger.info(
-            "Refreshed user_periods store: %d rows upserted, %d rows pruned "
-            "(older than %s)",
+            "Refreshed user_periods store: %d cycles reclassified, %d skipped "
+            "(unchanged), %d rows upserted, %d escalations updated, %d rows "
+            "pruned (older than %s)",
+            len(classify_results),
+            history_cycles - len(classify_results),
             rows_written,
+            rows_elevated,
             rows_pruned,
             oldest_kept_end,
         )
         return 0
+
+
+# Columns of the rows given to _upsert_user_periods, with their SQL types. The
+# cluster is given by name, and resolved to its id in SQL.
+_USER_PERIODS_COLUMNS = {
+    "user_id": Integer(),
+    "cluster": String(),
+    "start_date": TIMESTAMP(timezone=True),
+    "end_date": TIMESTAMP(timezone=True),
+    "sm_occ_mean": Float(),
+    "rgu_hours": Float(),
+    "unused_rguh": Float(),
+    "isunderuser": Boolean(),
+    "flagged": Boolean(),
+    "elevated": Boolean(),
+}
+
+
+def _upsert_user_periods(session: Session, rows: list[dict]) -> int:
+    """Upsert `rows` into user_periods with a single statement. Returns the
+    number of rows written.
+
+    The rows are sent as one array per column and unnested server-side, so the
+    statement has as many parameters as columns whatever the number of rows
+    (pg8000 caps a statement at 65535 parameters). Rows whose cluster has no
+    clusters row are skipped, with a warning.
+    """
+    if not rows:
+        return 0
+    given = (
+        func.unnest(
+            *(
+                bindparam(name, [row[name] for row in rows], type_=ARRAY(type_))
+                for name, type_ in _USER_PERIODS_COLUMNS.items()
+            )
+        )
+        .table_valued(*_USER_PERIODS_COLUMNS)
+        .render_derived(name="given")
+    )
+    insert_stmt = pg_insert(UserPeriods).from_select(
+        [
+            "user_id",
+            "cluster_id",
+            "start_date",
+            "end_date",
+            "sm_occ_mean",
+            "rgu_hours",
+            "unused_rguh",
+            "isunderuser",
+            "flagged",
+            "elevated",
+        ],
+        select(  # ty:ignore[no-matching-overload]
+            given.c.user_id,
+            col(SlurmClusterDB.id),
+            given.c.start_date,
+            given.c.end_date,
+            given.c.sm_occ_mean,
+            given.c.rgu_hours,
+            given.c.unused_rguh,
+            given.c.isunderuser,
+            given.c.flagged,
+            given.c.elevated,
+        ).join(SlurmClusterDB, col(SlurmClusterDB.name) == given.c.cluster),
+    )
+    upsert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["user_id", "cluster_id", "end_date"],
+        set_={
+            "start_date": insert_stmt.excluded.start_date,
+            "sm_occ_mean": insert_stmt.excluded.sm_occ_mean,
+            "rgu_hours": insert_stmt.excluded.rgu_hours,
+            "unused_rguh": insert_stmt.excluded.unused_rguh,
+            "isunderuser": insert_stmt.excluded.isunderuser,
+            "flagged": insert_stmt.excluded.flagged,
+            "elevated": insert_stmt.excluded.elevated,
+        },
+    )
+    rows_written = session.exec(upsert_stmt).rowcount
+    if rows_written < len(rows):
+        known = set(
+            session.exec(
+                select(SlurmClusterDB.name).where(
+                    col(SlurmClusterDB.name).in_({row["cluster"] for row in rows})
+                )
+            )
+        )
+        unknown = sorted({row["cluster"] for row in rows} - known)
+        logger.warning(
+            "Skipped %d rows: no clusters row matches cluster(s) %s",
+            len(rows) - rows_written,
+            ", ".join(map(repr, unknown)),
+        )
+    return rows_written
@@ -4,11 +4,17 @@ and alternative MIG value reference, either "drac" (default) or "mila".
 """
 
 import re
+from collections.abc import Mapping
 from dataclasses import dataclass
 from enum import StrEnum
+from functools import cache
 from typing import Literal
 
-from sarc.db.job import get_rgus
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from sarc.db.job import _rgu_table
 
 
 class GpuError(Exception):
@@ -82,7 +88,7 @@ def get_gpu_type_rgu(
     gpu_type: str, rgu_version: str = "1.0", mig_ref: Literal["mila", "drac"] = "drac"
 ) -> float:
     """Compute and return RGU value for a single given GPU name."""
-    gpu_type_to_rgu = get_rgus(rgu_version=rgu_version)
+    gpu_type_to_rgu = _rgu_table(rgu_version)
 
     gpu = _parse_gpu(gpu_type)
     if gpu.mig_type is None:
@@ -99,6 +105,26 @@ def get_gpu_type_rgu(
         return mig_rgu
 
 
+def get_gpu_types_rgu(
+    gpu_types: ArrayLike,
+    rgu_version: str = "1.0",
+    mig_ref: Literal["mila", "drac"] = "drac",
+) -> np.ndarray:
+    """Compute RGU values for an array of GPU names, e.g. a column of job rows.
+
+    Each distinct name is resolved once. Missing names (None or NaN) give NaN.
+    """
+    codes, uniques = pd.factorize(np.asarray(gpu_types, dtype=object))
+    # The trailing NaN is what the code -1 of missing names picks.
+    rgus = np.array(
+        [get_gpu_type_rgu(gpu_type, rgu_version, mig_ref) for gpu_type in uniques]
+        + [np.nan]
+    )
+    return rgus[codes]
+
+
+# Harmonized names are few, and parsed once per job otherwise.
+@cache
 def _parse_gpu(gpu_type: str) -> Gpu:
     """Parse a GPU harmonized name and return a GPU object."""
     if ":" not in gpu_type:
@@ -138,7 +164,7 @@ def _get_drac_mig_rgu(gpu: Gpu) -> float | None:
     return _DRAC_MIG_RGU_RAW.get(gpu.mig_type, {}).get(gpu.mig_number)
 
 
-def _get_mila_mig_rgu(gpu_type_to_rgu: dict[str, float], gpu: Gpu) -> float:
+def _get_mila_mig_rgu(gpu_type_to_rgu: Mapping[str, float], gpu: Gpu) -> float:
     """Compute RGU value for a MIG, as fraction of main GPU."""
     assert gpu.mig_type is not None
     assert gpu.mig_number is not None
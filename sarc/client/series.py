@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas
 from pandas import DataFrame
 
@@ -77,27 +78,43 @@ def compute_time_frames(
     else:
         end = end.astimezone(UTC)
 
-    data_frames: list[pandas.DataFrame] = []
-
-    total_durations: pandas.Series[float] = (
-        jobs[col_end] - jobs[col_start]
-    ).dt.total_seconds()  # type: ignore[attr-defined]
-    for frame_start in pandas.date_range(start, end, freq=frame_size):
-        frame_end = frame_start + frame_size
-
-        mask = (jobs[col_start] < frame_end) & (jobs[col_end] > frame_start)
-        frame = jobs[mask].copy()
-        total_durations_in_frame = total_durations[mask]
-        frame[col_start] = frame[col_start].clip(frame_start, frame_end)  # ty:ignore[no-matching-overload]
-        frame[col_end] = frame[col_end].clip(frame_start, frame_end)  # ty:ignore[no-matching-overload]
-        frame["duration"] = (frame[col_end] - frame[col_start]).dt.total_seconds()
-
-        # Adjust columns to fit the time frame.
-        for column in columns:
-            frame[column] *= frame["duration"] / total_durations_in_frame
-
-        frame["timestamp"] = frame_start
-
-        data_frames.append(frame)
+    frame_starts = pandas.date_range(start, end, freq=frame_size)
+    if len(frame_starts) == 0:
+        raise ValueError(f"No time frame between {start} and {end}")
+    step = pandas.Timedelta(frame_size)
+
+    # A job overlaps the frames k with frame_starts[k] < end_time and
+    # start_time < frame_starts[k] + step: floor and ceil divisions on the
+    # timedeltas give the first and last of them, exactly. Jobs without a start
+    # or an end time overlap no frame.
+    first = ((jobs[col_start] - frame_starts[0]) // step).clip(lower=0)
+    last = (-((frame_starts[0] - jobs[col_end]) // step) - 1).clip(
+        upper=len(frame_starts) - 1
+    )
+    counts = (last - first + 1).clip(lower=0).fillna(0).to_numpy(dtype=np.int64)
 
-    return pandas.concat(data_frames, axis=0)
+    # One row per job and frame, ordered by frame then by job.
+    rows = np.repeat(np.arange(len(jobs)), counts)
+    frame_index = np.repeat(first.fillna(0).to_numpy(dtype=np.int64), counts) + (
+        np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    )
+    order = np.lexsort((rows, frame_index))
+    rows = rows[order]
+    frame_index = frame_index[order]
+
+    # Positional index while computing, so that columns align row by row.
+    frame = jobs.iloc[rows].reset_index(drop=True)
+    frame_start = pandas.Series(frame_starts[frame_index])
+    frame_end = frame_start + step
+    total_durations = (frame[col_end] - frame[col_start]).dt.total_seconds()
+    frame[col_start] = frame[col_start].clip(frame_start, frame_end)
+    frame[col_end] = frame[col_end].clip(frame_start, frame_end)
+    frame["duration"] = (frame[col_end] - frame[col_start]).dt.total_seconds()
+
+    # Adjust columns to fit the time frame.
+    for column in columns:
+        frame[column] *= frame["duration"] / total_durations
+
+    frame["timestamp"] = frame_start
+    frame.index = jobs.index[rows]
+    return frame
@@ -2,7 +2,7 @@ import os
 import re
 import zoneinfo
 from dataclasses import dataclass, field
-from datetime import date
+from datetime import date, timedelta
 from functools import cached_property
 from pathlib import Path
 from typing import TYPE_CHECKING, cast
@@ -10,9 +10,7 @@ from typing import TYPE_CHECKING, cast
 import gifnoc
 from easy_oauth import OAuthManager
 from hostlist import expand_hostlist
-from paramiko import PKey
 from serieux.features.encrypt import Secret
-from sqlmodel import Session
 
 from .alerts.common import HealthMonitorConfig
 
@@ -22,6 +20,7 @@ if TYPE_CHECKING:
     from fabric import Connection
     from prometheus_api_client.prometheus_connect import PrometheusConnect
     from sqlalchemy import Engine
+    from sqlmodel import Session
 
 
 UTC = zoneinfo.ZoneInfo("UTC")
@@ -30,6 +29,16 @@ UTC = zoneinfo.ZoneInfo("UTC")
 MIG_FLAG = "__MIG_FLAG__"
 DEFAULTS_FLAG = "__DEFAULTS__"
 
+# MIG GPU types, like "1g.5gb"
+_MIG_NAME = re.compile(r"([0-9]+)g\.([0-9]+)gb")
+
+
+def _normalize_gpu_type(gpu_type: str) -> str:
+    gpu_type = gpu_type.lower().replace(" ", "-")
+    if gpu_type.startswith("gpu:"):
+        gpu_type = gpu_type.split(":")[1]
+    return gpu_type
+
 
 class ConfigurationError(Exception):
     pass
@@ -85,15 +94,17 @@ class ClusterConfig:
     gpus_per_nodes: dict[str, dict[str, str]] = field(default_factory=dict)
 
     def __post_init__(self):
-        # Convert node list to node names with `expand_hostlist`
-        self.gpus_per_nodes = {
-            node: {
+        # Convert node list to node names with `expand_hostlist`. The nodes of
+        # a list share their GPU mapping.
+        gpus_per_nodes = {}
+        for node_list, gpu_to_desc in self.gpus_per_nodes.items():
+            gpus = {
                 gpu_type.lower().replace(" ", "-"): gpu_desc
                 for gpu_type, gpu_desc in gpu_to_desc.items()
             }
-            for node_list, gpu_to_desc in self.gpus_per_nodes.items()
-            for node in expand_hostlist(node_list)
-        }
+            for node in expand_hostlist(node_list):
+                gpus_per_nodes[node] = gpus
+        self.gpus_per_nodes = gpus_per_nodes
 
     def harmonize_gpu(self, nodename: str | None, gpu_type: str) -> str | None:
         """
@@ -101,9 +112,53 @@ class ClusterConfig:
 
         Return None if GPU name cannot be inferred.
         """
-        gpu_type = gpu_type.lower().replace(" ", "-")
-        if gpu_type.startswith("gpu:"):
-            gpu_type = gpu_type.split(":")[1]
+        key = (nodename, gpu_type)
+        try:
+            return self._harmonized_gpus[key]
+        except KeyError:
+            pass
+        normalized = _normalize_gpu_type(gpu_type)
+        table = self._gpu_table.get(
+            cast(str, nodename), self._gpu_table.get(DEFAULTS_FLAG, {})
+        )
+        if normalized in table:
+            harmonized_gpu = table[normalized]
+        else:
+            harmonized_gpu = self._resolve_gpu(nodename, normalized)
+        self._harmonized_gpus[key] = harmonized_gpu
+        return harmonized_gpu
+
+    @cached_property
+    def _harmonized_gpus(self) -> dict[tuple[str | None, str], str | None]:
+        """Memo of `harmonize_gpu`, by (nodename, gpu_type) as given."""
+        return {}
+
+    @cached_property
+    def _gpu_table(self) -> dict[str, dict[str, str | None]]:
+        """`gpus_per_nodes` with the aliases and MIG names resolved.
+
+        Each node maps all the GPU types it knows, its own and the defaults,
+        to their harmonized name. GPU types that cannot be resolved are left
+        out, for `_resolve_gpu` to raise when they are looked up.
+        """
+        defaults = self.gpus_per_nodes.get(DEFAULTS_FLAG, {})
+        resolved: dict[int, dict[str, str | None]] = {}
+        table = {}
+        for nodename, gpus in self.gpus_per_nodes.items():
+            if id(gpus) not in resolved:
+                node_table = {}
+                for gpu_type in {**defaults, **gpus}:
+                    try:
+                        node_table[gpu_type] = self._resolve_gpu(nodename, gpu_type)
+                    except ValueError:
+                        pass
+                resolved[id(gpus)] = node_table
+            table[nodename] = resolved[id(gpus)]
+        return table
+
+    def _resolve_gpu(self, nodename: str | None, gpu_type: str) -> str | None:
+        """Harmonized name of `gpu_type` on `nodename`, straight from `gpus_per_nodes`."""
+        gpu_type = _normalize_gpu_type(gpu_type)
 
         # Try to get harmonized GPU from nodename mapping
         harmonized_gpu = self.gpus_per_nodes.get(cast(str, nodename), {}).get(gpu_type)
@@ -114,15 +169,15 @@ class ClusterConfig:
 
         # If harmonized name starts with "$", then we must recursively harmonize again.
         if harmonized_gpu and harmonized_gpu.startswith("$"):
-            harmonized_gpu = self.harmonize_gpu(nodename, harmonized_gpu[1:])
+            harmonized_gpu = self._resolve_gpu(nodename, harmonized_gpu[1:])
 
         # For MIG GPUs, use this method recursively and append MIG name.
         if harmonized_gpu and harmonized_gpu.startswith(MIG_FLAG):
             # We expect a specific MIG name format, like "1g.5gb"
-            if not re.fullmatch(r"^(([0-9]+)g\.([0-9]+)gb)$", gpu_type):
+            if not _MIG_NAME.fullmatch(gpu_type):
                 raise ValueError(f"Unrecognized harmonized GPU type: {gpu_type}")
 
-            harmonized_gpu = self.harmonize_gpu(
+            harmonized_gpu = self._resolve_gpu(
                 nodename, harmonized_gpu[len(MIG_FLAG) :]
             )
             harmonized_gpu = f"{harmonized_gpu} : {gpu_type}"
@@ -135,12 +190,15 @@ class ClusterConfig:
 
         Return None if GPU name cannot be inferred.
         """
-        # Collect harmonized names for given nodes
         # NB: If `nodes` is empty, we harmonize using "",
         # so that harmonization function will check __DEFAULTS__
         # harmonized names if available.
+        if len(nodes) <= 1:
+            return self.harmonize_gpu(nodes[0] if nodes else "", gpu_type)
+
+        # Collect harmonized names for given nodes
         harmonized_gpu_names = {
-            self.harmonize_gpu(nodename, gpu_type) for nodename in (nodes or [""])
+            self.harmonize_gpu(nodename, gpu_type) for nodename in nodes
         }
         # If present, remove None from GPU names
         harmonized_gpu_names.discard(None)
@@ -152,6 +210,7 @@ class ClusterConfig:
     def ssh(self) -> Connection:
         from fabric import Config as FabricConfig
         from fabric import Connection
+        from paramiko import PKey
 
         fconfig = FabricConfig()
         fconfig["run"]["pty"] = False
@@ -179,6 +238,16 @@ class ClusterConfig:
             },
         )
 
+    def reset_ssh(self) -> None:
+        """Forget the SSH connection if it was closed.
+
+        The next use of `ssh` then opens a new one, with a fresh OTP, instead of
+        trying to reconnect with a stale one.
+        """
+        conn = self.__dict__.get("ssh")
+        if conn is not None and not conn.is_connected:
+            del self.__dict__["ssh"]
+
     @cached_property
     def prometheus(self) -> PrometheusConnect:
         from prometheus_api_client.prometheus_connect import PrometheusConnect
@@ -211,9 +280,25 @@ class DbConfig:
     name: str
     user: str | None = None
     port: int | None = None
+    # Check pooled connections before using them. Only long-running processes
+    # (`sarc daemon`, which turns it on) need it: their pooled connections may
+    # be closed by the server between two cycles. Must be set before the
+    # engine is first used.
+    pool_pre_ping: bool = False
 
     @cached_property
     def engine(self) -> Engine:
+        return self._create_engine(pool_pre_ping=self.pool_pre_ping)
+
+    @cached_property
+    def unpooled_engine(self) -> Engine:
+        """Engine opening a connection of its own each time, for the statements
+        which must neither wait for a connection of the pool nor take one."""
+        from sqlalchemy.pool import NullPool
+
+        return self._create_engine(poolclass=NullPool)
+
+    def _create_engine(self, **kwargs) -> Engine:
 
         from sqlmodel import create_engine
 
@@ -243,7 +328,7 @@ class DbConfig:
                     self.host, "pg8000", db=self.name, user=db_user
                 )
 
-            engine = create_engine("postgresql+pg8000://", creator=getconn)
+            engine = create_engine("postgresql+pg8000://", creator=getconn, **kwargs)
 
         else:
             db_user = self.user
@@ -253,12 +338,14 @@ class DbConfig:
             if self.port is not None:
                 hostname = f"{hostname}:{self.port}"
             engine = create_engine(
-                f"postgresql+pg8000://{db_user}@{hostname}/{self.name}"
+                f"postgresql+pg8000://{db_user}@{hostname}/{self.name}", **kwargs
             )
 
         return engine
 
     def session(self) -> Session:
+        from sqlmodel import Session
+
         return Session(self.engine)
 
 
@@ -423,8 +510,12 @@ class LoggingConfig:
     log_level: str
     OTLP_log_endpoint: str | None = None
     OTLP_trace_endpoint: str | None = None
+    OTLP_metric_endpoint: str | None = None
     service_name: str | None = None
     slack: SlackConfig | None = None
+    # Also write spans and metrics to this file, one JSON object per line
+    # ("-" for stdout). Meant for offline use, when there is no collector.
+    telemetry_file: str | None = None
 
 
 @dataclass
@@ -432,6 +523,29 @@ class UserScrapingConfig:
     scrapers: dict[str, JSON]
 
 
+@dataclass
+class DaemonConfig:
+    """Schedule of `sarc daemon`. Periods are in minutes, 0 disables the task."""
+
+    clusters: list[str] = field(default_factory=list)
+    """Clusters to scrape. Empty list = all clusters."""
+
+    jobs_period: int = 60
+    """Fetch the jobs, then parse them right away."""
+    auto_interval: int = 60
+    """Length of the sacct intervals fetched, as `sarc fetch jobs -a`."""
+    max_intervals: int | None = None
+    """Most intervals fetched per cluster and cycle, as `sarc fetch jobs --max_intervals`."""
+
+    prometheus_period: int = 1440
+    """Fetch and parse the Prometheus metrics of the new jobs."""
+    prometheus_max_jobs: int | None = None
+    """Most jobs per cluster and cycle, as `sarc fetch prometheus --max_jobs`."""
+
+    health_period: int = 60
+    """Run all the health checks."""
+
+
 @dataclass
 class ServerConfig:
     """
@@ -441,6 +555,10 @@ class ServerConfig:
     # Authentication manager
     auth: OAuthManager | None = None
 
+    # Longest a query of a /dash request may run before it is canceled (the
+    # request then fails with 503). 0 disables the timeout.
+    statement_timeout: timedelta = timedelta(0)
+
 
 @dataclass
 class Config:
@@ -453,6 +571,7 @@ class Config:
     clusters: dict[str, ClusterConfig] = field(default_factory=dict)
     logging: LoggingConfig | None = None
     notifications: UsageNotifyConfig | None = None
+    daemon: DaemonConfig = field(default_factory=DaemonConfig)
 
     def __post_init__(self):
         for name, cluster in self.clusters.items():
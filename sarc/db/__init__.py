@@ -1,6 +1,3 @@
-from types import SimpleNamespace
-
-from iguane.fom import RAWDATA, fom_ugr
 from sqlmodel import Session, select
 
 from ..models.support import GpuRgu
@@ -143,10 +140,10 @@ def insert_rgu(sess: Session) -> None:
     from sarc.client.rgumetrics import get_gpu_type_rgu
     from sarc.config import config
 
+    from .job import get_rgus
     from .support import GpuRguDB
 
-    args = SimpleNamespace(fom_version="1.0", custom_weights=None, norm=False)
-    rgu_map: dict[str, float] = {key: fom_ugr(key, args=args) for key in RAWDATA.keys()}
+    rgu_map = get_rgus()
 
     mig_rgu_map: dict[str, GpuRgu] = {}
 
@@ -1,5 +1,6 @@
 import bisect
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
 from datetime import date, datetime
 from typing import Self
 
@@ -58,6 +59,45 @@ class NodeGPUMappingDB(SQLModel, table=True):
         return sess.merge(res)
 
 
+@dataclass(frozen=True)
+class Timeline[T: SQLModel]:
+    """Rows of a cluster sorted by `since`, held as parallel arrays to bisect.
+
+    The rows are copies detached from any session, so that they can be kept
+    across commits without being reloaded.
+    """
+
+    since: list[datetime]
+    rows: list[T]
+    # Whether a date before the first row gets the first row rather than None.
+    clamp: bool
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[T], clamp: bool) -> Self:
+        copies = [type(row).model_validate(row.model_dump()) for row in rows]
+        copies.sort(key=lambda row: row.since)  # ty:ignore[unresolved-attribute]
+        return cls(
+            since=[row.since for row in copies],  # ty:ignore[unresolved-attribute]
+            rows=copies,
+            clamp=clamp,
+        )
+
+    def at(self, required_date: datetime | None) -> T | None:
+        if not self.rows:
+            return None
+        if required_date is None:
+            return self.rows[-1]
+        index = bisect.bisect_right(self.since, required_date) - 1
+        if index < 0:
+            return self.rows[0] if self.clamp else None
+        return self.rows[index]
+
+
+# Timelines per cluster ID, loaded once per process.
+_node_to_gpu_timelines: dict[int, Timeline[NodeGPUMappingDB]] = {}
+_gpu_billing_timelines: dict[int, Timeline[GPUBillingDB]] = {}
+
+
 class SlurmClusterDB(SQLModel, table=True):
     """Hold data for a Slurm cluster."""
 
@@ -84,43 +124,41 @@ class SlurmClusterDB(SQLModel, table=True):
         sa_relationship_kwargs={"order_by": NodeGPUMappingDB.since},
     )
 
+    def node_to_gpu_timeline(self) -> Timeline[NodeGPUMappingDB]:
+        assert self.id is not None
+        if (timeline := _node_to_gpu_timelines.get(self.id)) is None:
+            # If the date is before all available mappings, we assume that
+            # the oldest mapping is correct since we can't do better.
+            timeline = Timeline.from_rows(self.node_gpu_mapping, clamp=True)
+            _node_to_gpu_timelines[self.id] = timeline
+        return timeline
+
+    def gpu_billing_timeline(self) -> Timeline[GPUBillingDB]:
+        assert self.id is not None
+        if (timeline := _gpu_billing_timelines.get(self.id)) is None:
+            timeline = Timeline.from_rows(self.gpu_billing, clamp=False)
+            _gpu_billing_timelines[self.id] = timeline
+        return timeline
+
     def get_node_to_gpu(
         self, required_date: datetime | None = None
     ) -> NodeGPUMappingDB | None:
-        if not self.node_gpu_mapping:
-            return None
-
-        if required_date is None:
-            return self.node_gpu_mapping[-1]
-
-        index_mapping = (
-            bisect.bisect_right(
-                [mapping.since for mapping in self.node_gpu_mapping], required_date
-            )
-            - 1
-        )
-        if index_mapping < 0:
-            # If the date is before all available mappings, we assume that
-            # the oldest mapping is correct since we can't do better.
-            return self.node_gpu_mapping[0]
-        else:
-            return self.node_gpu_mapping[index_mapping]
+        return self.node_to_gpu_timeline().at(required_date)
 
     def get_gpu_billing(
         self, required_date: datetime | None = None
     ) -> GPUBillingDB | None:
-        if required_date is None:
-            return self.gpu_billing[-1]
-        index_mapping = (
-            bisect.bisect_right(
-                [mapping.since for mapping in self.gpu_billing], required_date
-            )
-            - 1
-        )
-        if index_mapping < 0:
-            return None
-        else:
-            return self.gpu_billing[index_mapping]
+        return self.gpu_billing_timeline().at(required_date)
+
+    @staticmethod
+    def clear_timelines() -> None:
+        """Forget the node to GPU and GPU billing timelines loaded so far.
+
+        To be called when new mappings or billings are written, so that the next
+        lookups load them.
+        """
+        _node_to_gpu_timelines.clear()
+        _gpu_billing_timelines.clear()
 
     @classmethod
     def id_by_name(cls, sess: Session, cluster_name: str) -> int | None:
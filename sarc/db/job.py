@@ -1,4 +1,6 @@
-from types import SimpleNamespace
+from collections.abc import Mapping
+from functools import cache
+from types import MappingProxyType, SimpleNamespace
 from typing import Self
 
 from iguane.fom import RAWDATA, fom_ugr
@@ -244,12 +246,19 @@ class SlurmJobDB(SQLModel, table=True):
         return sess.merge(res)
 
 
+@cache
+def _rgu_table(rgu_version: str) -> Mapping[str, float]:
+    """Read-only GPU->RGU mapping for given RGU version, computed once."""
+    args = SimpleNamespace(fom_version=rgu_version, custom_weights=None, norm=False)
+    gpus = sorted(RAWDATA.keys())
+    return MappingProxyType({gpu: fom_ugr(gpu, args=args) for gpu in gpus})
+
+
 def get_rgus(rgu_version: str = "1.0") -> dict[str, float]:
     """
     Return GPU->RGU mapping for given RGU version.
 
-    Get mapping from package IGUANE.
+    Get mapping from package IGUANE. It is computed once per version; the
+    returned dict is a copy, which the caller may modify.
     """
-    args = SimpleNamespace(fom_version=rgu_version, custom_weights=None, norm=False)
-    gpus = sorted(RAWDATA.keys())
-    return {gpu: fom_ugr(gpu, args=args) for gpu in gpus}
+    return dict(_rgu_table(rgu_version))
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlmodel import Field, Session, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Field, Session, col, delete, select, tuple_
 
 from sarc.validators import datetime_utc
 
@@ -22,3 +23,147 @@ def get_parsed_date(sess: Session, value_name: str) -> datetime | None:
 def set_parsed_date(sess: Session, value_name: str, value: datetime) -> None:
     """Set the parsed date for a given value name (jobs or users, for example)."""
     sess.merge(ParseDates(name=value_name, date=value))
+
+
+class UserDigest(SQLModel, table=True):
+    """Digest of a user as parsed from the last users cache entry.
+
+    Users are identified by the matching ID of the plugin that parsed them
+    first.
+    """
+
+    __tablename__ = "user_digests"
+    plugin_name: str = Field(primary_key=True)
+    match_id: str = Field(primary_key=True)
+    digest: str
+
+
+def get_user_digests(sess: Session) -> dict[tuple[str, str], str]:
+    """Get the user digests, by (plugin_name, match_id)."""
+    return {
+        (row.plugin_name, row.match_id): row.digest
+        for row in sess.exec(select(UserDigest))
+    }
+
+
+def set_user_digests(sess: Session, digests: dict[tuple[str, str], str]) -> None:
+    """Replace the user digests by `digests`, only writing the differences."""
+    current = get_user_digests(sess)
+    removed = current.keys() - digests.keys()
+    if removed:
+        sess.exec(
+            delete(UserDigest).where(
+                tuple_(col(UserDigest.plugin_name), col(UserDigest.match_id)).in_(
+                    removed
+                )
+            )
+        )
+    changed = [
+        {"plugin_name": name, "match_id": mid, "digest": digest}
+        for (name, mid), digest in digests.items()
+        if current.get((name, mid)) != digest
+    ]
+    if changed:
+        stmt = pg_insert(UserDigest).values(changed)
+        sess.exec(
+            stmt.on_conflict_do_update(
+                index_elements=["plugin_name", "match_id"],
+                set_={"digest": stmt.excluded.digest},
+            )
+        )
+
+
+class UserPeriodDigest(SQLModel, table=True):
+    """Digest of the jobs and settings a `user_periods` cycle was classified
+    from, as of the last `sarc usage refresh-store`.
+
+    Cycles are identified by their end date.
+    """
+
+    __tablename__ = "user_period_digests"
+    end_date: datetime_utc = datetime_utc_field(primary_key=True)
+    digest: str
+
+
+def get_user_period_digests(sess: Session) -> dict[datetime, str]:
+    """Get the user_periods cycle digests, by end date."""
+    return {row.end_date: row.digest for row in sess.exec(select(UserPeriodDigest))}
+
+
+def set_user_period_digests(sess: Session, digests: dict[datetime, str]) -> None:
+    """Replace the cycle digests by `digests`, only writing the differences."""
+    current = get_user_period_digests(sess)
+    removed = current.keys() - digests.keys()
+    if removed:
+        sess.exec(
+            delete(UserPeriodDigest).where(col(UserPeriodDigest.end_date).in_(removed))
+        )
+    changed = [
+        {"end_date": end_date, "digest": digest}
+        for end_date, digest in digests.items()
+        if current.get(end_date) != digest
+    ]
+    if changed:
+        stmt = pg_insert(UserPeriodDigest).values(changed)
+        sess.exec(
+            stmt.on_conflict_do_update(
+                index_elements=["end_date"], set_={"digest": stmt.excluded.digest}
+            )
+        )
+
+
+class SlackRecipient(SQLModel, table=True):
+    """Slack user and DM channel of an email, as of the last DM sent to it.
+
+    Users are identified by email within a Slack workspace, named by the
+    description of its `SlackConfig`.
+    """
+
+    __tablename__ = "slack_recipients"
+    workspace: str = Field(primary_key=True)
+    email: str = Field(primary_key=True)
+    user_id: str
+    channel_id: str
+
+
+def get_slack_recipients(sess: Session, workspace: str) -> dict[str, tuple[str, str]]:
+    """Get the (user_id, channel_id) of the emails of `workspace`."""
+    return {
+        row.email: (row.user_id, row.channel_id)
+        for row in sess.exec(
+            select(SlackRecipient).where(SlackRecipient.workspace == workspace)
+        )
+    }
+
+
+def update_slack_recipients(
+    sess: Session, workspace: str, recipients: dict[str, tuple[str, str]]
+) -> None:
+    """Add or update the `recipients` of `workspace`, only writing the
+    differences.
+
+    Recipients missing from `recipients` are kept, as several clients may
+    share a workspace.
+    """
+    current = get_slack_recipients(sess, workspace)
+    changed = [
+        {
+            "workspace": workspace,
+            "email": email,
+            "user_id": user_id,
+            "channel_id": channel_id,
+        }
+        for email, (user_id, channel_id) in recipients.items()
+        if current.get(email) != (user_id, channel_id)
+    ]
+    if changed:
+        stmt = pg_insert(SlackRecipient).values(changed)
+        sess.exec(
+            stmt.on_conflict_do_update(
+                index_elements=["workspace", "email"],
+                set_={
+                    "user_id": stmt.excluded.user_id,
+                    "channel_id": stmt.excluded.channel_id,
+                },
+            )
+        )
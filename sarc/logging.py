@@ -1,22 +1,18 @@
+import functools
 import logging
 import os
+import sys
 import warnings
-
-from opentelemetry import trace
-from opentelemetry._logs import set_logger_provider
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
-from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
-from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from rapporteur.report import Report
-from rapporteur.slack import SlackReporter
+from typing import IO, TYPE_CHECKING
 
 from sarc.config import LoggingConfig, SlackConfig, config
 
+if TYPE_CHECKING:
+    from rapporteur.report import Report
+
+# NB: OpenTelemetry exporters and rapporteur are imported in the functions
+# using them, so that commands which don't log remotely don't pay for them.
+
 logger = logging.getLogger(__name__)
 
 rapporteur_report: Report | None = None
@@ -25,6 +21,13 @@ rapporteur_report: Report | None = None
 def getOpenTelemetryLoggingHandler(log_conf: LoggingConfig):
     if log_conf.OTLP_log_endpoint is None or log_conf.service_name is None:
         return None
+
+    from opentelemetry._logs import set_logger_provider
+    from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+    from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+    from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+    from opentelemetry.sdk.resources import Resource
+
     logger_provider = LoggerProvider(
         resource=Resource.create(
             {
@@ -41,17 +44,37 @@ def getOpenTelemetryLoggingHandler(log_conf: LoggingConfig):
     return LoggingHandler(level=logging.NOTSET, logger_provider=logger_provider)
 
 
-def setup_opentelemetry_tracing(log_conf: LoggingConfig):
-    if log_conf.OTLP_trace_endpoint is None or log_conf.service_name is None:
-        return
+@functools.cache
+def _telemetry_output(path: str) -> IO[str]:
+    """Stream the spans and metrics are written to, shared by their exporters."""
+    if path == "-":
+        return sys.stdout
+    return open(path, "a", encoding="utf-8")
+
+
+def _telemetry_resource(log_conf: LoggingConfig):
+    from opentelemetry.sdk.resources import Resource
 
-    resource = Resource.create(
+    return Resource.create(
         {
-            "service.name": log_conf.service_name,
+            "service.name": log_conf.service_name or "sarc",
             "service.instance.id": os.uname().nodename,
         }
     )
 
+
+def setup_opentelemetry_tracing(log_conf: LoggingConfig):
+    export_otlp = (
+        log_conf.OTLP_trace_endpoint is not None and log_conf.service_name is not None
+    )
+    if not export_otlp and log_conf.telemetry_file is None:
+        return
+
+    from opentelemetry import trace
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
     SQLAlchemyInstrumentor().instrument()
     # This filters out the warning that otherwise spams the logs
     warnings.filterwarnings(
@@ -60,17 +83,74 @@ def setup_opentelemetry_tracing(log_conf: LoggingConfig):
         message=r".*DB-API extension cursor\.connection used.*",
     )
 
-    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider = TracerProvider(resource=_telemetry_resource(log_conf))
     trace.set_tracer_provider(tracer_provider)
 
-    trace_exporter = OTLPSpanExporter(endpoint=log_conf.OTLP_trace_endpoint)
+    if export_otlp:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        trace_exporter = OTLPSpanExporter(endpoint=log_conf.OTLP_trace_endpoint)
+        tracer_provider.add_span_processor(BatchSpanProcessor(trace_exporter))
 
-    span_processor = BatchSpanProcessor(trace_exporter)
-    tracer_provider.add_span_processor(span_processor)
+    if log_conf.telemetry_file is not None:
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        file_exporter = ConsoleSpanExporter(
+            out=_telemetry_output(log_conf.telemetry_file),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+        tracer_provider.add_span_processor(BatchSpanProcessor(file_exporter))
+
+
+def setup_opentelemetry_metrics(log_conf: LoggingConfig):
+    """Export the metrics of `sarc.stages` (and any other meter) if configured."""
+    export_otlp = (
+        log_conf.OTLP_metric_endpoint is not None and log_conf.service_name is not None
+    )
+    if not export_otlp and log_conf.telemetry_file is None:
+        return
+
+    from opentelemetry import metrics
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    readers = []
+    if export_otlp:
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import (
+            OTLPMetricExporter,
+        )
+
+        readers.append(
+            PeriodicExportingMetricReader(
+                OTLPMetricExporter(endpoint=log_conf.OTLP_metric_endpoint)
+            )
+        )
+
+    if log_conf.telemetry_file is not None:
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+
+        readers.append(
+            PeriodicExportingMetricReader(
+                ConsoleMetricExporter(
+                    out=_telemetry_output(log_conf.telemetry_file),
+                    formatter=lambda data: data.to_json(indent=None) + "\n",
+                )
+            )
+        )
+
+    # The provider is shut down at exit, which exports what is left.
+    metrics.set_meter_provider(
+        MeterProvider(resource=_telemetry_resource(log_conf), metric_readers=readers)
+    )
 
 
 def setupSlackReport(slack_config: SlackConfig, command_name: str | None = None):
     global rapporteur_report  # noqa: PLW0603
+    from rapporteur.report import Report
+    from rapporteur.slack import SlackReporter
+
     slack_reporter = SlackReporter(
         token=slack_config.token, channel=slack_config.channel
     )
@@ -136,6 +216,7 @@ def setupLogging(verbose_level: int = 0, command_name: str | None = None):
         root_logger.setLevel(log_level)
 
         setup_opentelemetry_tracing(config.logging)
+        setup_opentelemetry_metrics(config.logging)
 
         logger.debug("setupLogging done")
 
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import logging
 import ssl
+import threading
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any
 
 import certifi
 from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
 from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
 
 logger = logging.getLogger(__name__)
@@ -22,6 +26,23 @@ substitutes it for a real Slack mention once it has resolved a user_id."""
 # and cause CERTIFICATE_VERIFY_FAILED.
 _SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
 
+# Client-side limits per API method, as (calls per minute, burst), so that
+# concurrent senders stay under Slack's rate limit tiers instead of relying on
+# 429 retries: users.lookupByEmail is Tier 4 (100+/min), conversations.open
+# Tier 3 (50+/min), and chat.postMessage is allowed about one message per
+# second.
+_RATE_LIMITS = {
+    "users_lookupByEmail": (100, 10),
+    "conversations_open": (50, 5),
+    "chat_postMessage": (60, 5),
+}
+
+# Errors of a DM to a cached recipient which mean that the cached user or
+# channel is stale, so that they are worth looking up again.
+_STALE_RECIPIENT_ERRORS = frozenset(
+    {"channel_not_found", "user_not_found", "is_archived", "cannot_dm_bot"}
+)
+
 
 class SendStatus(Enum):
     OK = "ok"
@@ -36,16 +57,75 @@ class SendResult:
     ts: str | None = None
 
 
+class TokenBucket:
+    """Thread-safe rate limiter: `rate` calls per second on average, with
+    bursts of up to `burst` calls."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], object] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait until a call is allowed."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # Take the token now, even if it is only available later, so that
+            # waiting callers are served in turn.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+
+
 class SlackClient:
-    """Thin wrapper around slack_sdk.WebClient for channel posts and DMs."""
+    """Thin wrapper around slack_sdk.WebClient for channel posts and DMs.
+
+    DM recipients are cached by email as (user_id, channel_id), so that each
+    email is looked up and its DM channel opened only once. `recipients` can be
+    preloaded with the cache of a previous run, and holds the updated cache
+    afterwards. The client can be shared by several threads.
+    """
 
-    def __init__(self, token: str) -> None:
-        self._client: Any = WebClient(token=token, ssl=_SSL_CONTEXT)
+    def __init__(
+        self,
+        token: str,
+        *,
+        recipients: dict[str, tuple[str, str]] | None = None,
+        base_url: str = WebClient.BASE_URL,
+    ) -> None:
+        self._client: Any = WebClient(token=token, ssl=_SSL_CONTEXT, base_url=base_url)
         # Auto-retry HTTP 429s (sleeps for the Retry-After duration); applies to
         # every API call made through this client.
         self._client.retry_handlers.append(
             RateLimitErrorRetryHandler(max_retry_count=3)
         )
+        self.recipients: dict[str, tuple[str, str]] = dict(recipients or {})
+        self._buckets = {
+            method: TokenBucket(per_minute / 60, burst)
+            for method, (per_minute, burst) in _RATE_LIMITS.items()
+        }
+
+    def _call(self, method: str, **kwargs) -> Any:
+        """Call WebClient.`method`, within its rate limit if it has one."""
+        if method in self._buckets:
+            self._buckets[method].acquire()
+        return getattr(self._client, method)(**kwargs)
 
     @staticmethod
     def _preformatted_blocks(text: str) -> list[dict]:
@@ -84,7 +164,7 @@ class SlackClient:
             kwargs = self._message_kwargs(channel, text, preformatted=preformatted)
             if thread_ts is not None:
                 kwargs["thread_ts"] = thread_ts
-            resp = self._client.chat_postMessage(**kwargs)
+            resp = self._call("chat_postMessage", **kwargs)
             return SendResult(SendStatus.OK, ts=resp["ts"])
         except Exception as exc:
             logger.error("Slack channel post failed: %s", exc)
@@ -118,12 +198,10 @@ class SlackClient:
             logger.error("Slack file upload failed: %s", exc)
             return SendResult(SendStatus.FAILED, str(exc))
 
-    def dm_user(
-        self, email: str, text: str, *, preformatted: bool = False
-    ) -> SendResult:
-        """Send a DM to a user identified by their Slack-registered email."""
+    def _lookup_recipient(self, email: str) -> tuple[str, str] | SendResult:
+        """Return (user_id, channel_id) of `email`, or why there is none."""
         try:
-            lookup = self._client.users_lookupByEmail(email=email)
+            lookup = self._call("users_lookupByEmail", email=email)
         except Exception as exc:
             err = str(exc)
             # Read the response error from SlackApiError.response.data["error"]
@@ -139,21 +217,56 @@ class SlackClient:
             return SendResult(send_status or SendStatus.FAILED, err)
 
         user_id = lookup["user"]["id"]
+        try:
+            conv = self._call("conversations_open", users=[user_id])
+        except Exception as exc:
+            logger.error("Slack DM failed for %s (%s): %s", email, user_id, exc)
+            return SendResult(SendStatus.FAILED, str(exc))
+        recipient = (user_id, conv["channel"]["id"])
+        self.recipients[email] = recipient
+        return recipient
 
-        if MENTION_TOKEN in text:
-            text = text.replace(MENTION_TOKEN, f"<@{user_id}>")
-        else:
+    def dm_user(
+        self, email: str, text: str, *, preformatted: bool = False
+    ) -> SendResult:
+        """Send a DM to a user identified by their Slack-registered email."""
+        if MENTION_TOKEN not in text:
             logger.warning(
                 "Mention token %r not found in DM text for %s", MENTION_TOKEN, email
             )
+        cached = self.recipients.get(email)
+        if cached is not None:
+            user_id, channel_id = cached
+            try:
+                return self._post_dm(channel_id, user_id, text, preformatted)
+            except Exception as exc:
+                stale = (
+                    isinstance(exc, SlackApiError)
+                    and exc.response.get("error") in _STALE_RECIPIENT_ERRORS
+                )
+                if not stale:
+                    logger.error("Slack DM failed for %s (%s): %s", email, user_id, exc)
+                    return SendResult(SendStatus.FAILED, str(exc))
+                # The cached user or channel is gone: look them up again.
+                logger.info("Slack DM to cached channel of %s failed: %s", email, exc)
+                self.recipients.pop(email, None)
 
+        recipient = self._lookup_recipient(email)
+        if isinstance(recipient, SendResult):
+            return recipient
+        user_id, channel_id = recipient
         try:
-            conv = self._client.conversations_open(users=[user_id])
-            channel_id = conv["channel"]["id"]
-            self._client.chat_postMessage(
-                **self._message_kwargs(channel_id, text, preformatted=preformatted)
-            )
-            return SendResult(SendStatus.OK)
+            return self._post_dm(channel_id, user_id, text, preformatted)
         except Exception as exc:
             logger.error("Slack DM failed for %s (%s): %s", email, user_id, exc)
             return SendResult(SendStatus.FAILED, str(exc))
+
+    def _post_dm(
+        self, channel_id: str, user_id: str, text: str, preformatted: bool
+    ) -> SendResult:
+        text = text.replace(MENTION_TOKEN, f"<@{user_id}>")
+        self._call(
+            "chat_postMessage",
+            **self._message_kwargs(channel_id, text, preformatted=preformatted),
+        )
+        return SendResult(SendStatus.OK)
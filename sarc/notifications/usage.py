@@ -3,9 +3,10 @@ from collections.abc import Callable, Sequence
 from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field, replace
 from datetime import date, datetime, timedelta
-from functools import cached_property, partial
+from functools import cached_property
 from typing import TypeVar
 
+from sqlalchemy import ARRAY, Float, literal, literal_column, or_
 from sqlmodel import col, func, select
 
 from sarc.api.metrics import _is_real
@@ -251,13 +252,21 @@ def _select_user_jobs(
     end: datetime,
     clusters: list[str] | None = None,
     utilization_ceiling: float = 1.0,
+    max_jobs_per_user: int | None = None,
 ):
     """Return one row per job (no aggregation) for *user_ids* (all users when
     None): job_db_id, sarc_user_id, cluster_name, submit_time, rgu_hours,
     rgu_used, allocated_gpu_cost, allocated_gpu_waste. Used to fetch top-job
-    detail rows for users already identified via `_select_jobs_usage`."""
+    detail rows for users already identified via `_select_jobs_usage`.
+
+    With *max_jobs_per_user*, only the jobs which can make it into a user's
+    top_jobs or bottom_jobs come back: those ranked in the first
+    2 * max_jobs_per_user by GPU utilization or by wasted RGU-hours. Whichever
+    list is picked first takes at most max_jobs_per_user of the other's
+    candidates, so the other still finds its max_jobs_per_user best among the
+    rest. Rows are ordered by job_db_id."""
     rgu_h_expr, true_used_expr, _ = _rgu_exprs(utilization_ceiling)
-    stmt = select(  # ty:ignore[no-matching-overload]
+    columns = (
         col(JobSeriesDB.job_db_id),
         col(JobSeriesDB.sarc_user_id),
         col(JobSeriesDB.cluster_name),
@@ -267,9 +276,56 @@ def _select_user_jobs(
         col(JobSeriesDB.allocated_gpu_cost),
         col(JobSeriesDB.allocated_gpu_waste),
     )
+    # Names of the columns, to select them again from the ranked subquery.
+    names = [
+        "job_db_id",
+        "sarc_user_id",
+        "cluster_name",
+        "submit_time",
+        "rgu_hours",
+        "rgu_used",
+        "allocated_gpu_cost",
+        "allocated_gpu_waste",
+    ]
+    stmt = select(*columns)  # ty:ignore[no-matching-overload]
     if user_ids is not None:
         stmt = stmt.where(col(JobSeriesDB.sarc_user_id).in_(user_ids))
-    return _with_rgu_window(stmt, start, end, clusters=clusters)
+    stmt = _with_rgu_window(stmt, start, end, clusters=clusters)
+    if max_jobs_per_user is None:
+        return stmt
+
+    # Same value as `_job_occupancy`, with zero-cost jobs fully used.
+    occupancy = func.coalesce(
+        func.least(
+            1.0,
+            1.0
+            - col(JobSeriesDB.allocated_gpu_waste)
+            / func.nullif(col(JobSeriesDB.allocated_gpu_cost), 0.0),
+        ),
+        1.0,
+    )
+    ranked = stmt.add_columns(
+        func.row_number()
+        .over(
+            partition_by=col(JobSeriesDB.sarc_user_id),
+            order_by=(occupancy.desc(), col(JobSeriesDB.job_db_id)),
+        )
+        .label("occupancy_rank"),
+        func.row_number()
+        .over(
+            partition_by=col(JobSeriesDB.sarc_user_id),
+            order_by=((rgu_h_expr - true_used_expr).desc(), col(JobSeriesDB.job_db_id)),
+        )
+        .label("waste_rank"),
+    ).subquery()
+    max_rank = 2 * max_jobs_per_user
+    return (
+        select(*(ranked.c[name] for name in names))
+        .where(
+            or_(ranked.c.occupancy_rank <= max_rank, ranked.c.waste_rank <= max_rank)
+        )
+        .order_by(ranked.c.job_db_id)
+    )
 
 
 def _select_jobs_usage(
@@ -354,6 +410,7 @@ def _get_users_usage(
     *,
     usage_filter: Callable,
     fetch_jobs_per_user: bool = True,
+    max_jobs_per_user: int | None = None,
     clusters: list[str] | None = None,
     utilization_ceiling: float = 1.0,
     user_emails: list[str] | None = None,
@@ -415,6 +472,7 @@ def _get_users_usage(
                     end,
                     clusters=clusters,
                     utilization_ceiling=utilization_ceiling,
+                    max_jobs_per_user=max_jobs_per_user,
                 )
             ).all()
 
@@ -451,6 +509,18 @@ def _meets_underuser_threshold(
     return row.waste_ratio >= min_waste_ratio and row.wasted >= min_waste_rgu_hours
 
 
+def _is_underuser(
+    rgu_hours: float,
+    wasted: float,
+    *,
+    min_waste_ratio: float,
+    min_waste_rgu_hours: float,
+) -> bool:
+    """`_meets_underuser_threshold` on cross-cluster totals, without a UsageRow."""
+    waste_ratio = wasted / rgu_hours if rgu_hours > 0 else 0.0
+    return waste_ratio >= min_waste_ratio and wasted >= min_waste_rgu_hours
+
+
 def get_underusers_usage(
     start: datetime,
     end: datetime,
@@ -477,6 +547,7 @@ def get_underusers_usage(
         end,
         usage_filter=filter_underusers,
         fetch_jobs_per_user=max_jobs_per_user > 0,
+        max_jobs_per_user=max_jobs_per_user,
         clusters=clusters,
         utilization_ceiling=utilization_ceiling,
         user_emails=user_emails,
@@ -522,6 +593,7 @@ def get_users_usage(
         end,
         usage_filter=filter_users,
         fetch_jobs_per_user=max_jobs_per_user > 0,
+        max_jobs_per_user=max_jobs_per_user,
         clusters=clusters,
         user_emails=user_emails,
     )
@@ -616,74 +688,225 @@ def classify_cycle(
     utilization_ceiling: float = 1.0,
 ) -> list[CycleUserClusterStat]:
     """Classify every (user, cluster) active in the single cycle [c_start,
-    c_end) -- run inside `get_recurring_underusers`'s capped thread pool, one
-    call per displayed position. Module-level (not a nested closure) so it's
-    directly monkeypatch-able from tests.
-
-    `isunderuser` reuses `_get_users_usage` with an always-true filter (rather
-    than `get_underusers_usage`) so every active user is returned, not just
-    those meeting the threshold -- the store this feeds must hold every user
-    unconditionally. `flagged` additionally requires the user's cross-cluster
-    wasted RGU-h over the trailing `recurrence_active_cycles`-cycle window
-    ending at `c_end` to meet `personalized_action_min_waste_rgu_hours`; that
-    window's aggregate is independent of `[c_start, c_end)` and queried
-    separately, cross-cluster only (`by_cluster=False`), same as the per-user
-    values `get_recurring_underusers` computed before this extraction.
-    """
-    usage_rows = _get_users_usage(
-        c_start,
+    c_end), which must be `cycle_length_weeks` wide. See `classify_cycles`,
+    which classifies many consecutive cycles at once."""
+    assert c_end - c_start == timedelta(weeks=cycle_length_weeks), (
+        f"{c_start=} {c_end=} {cycle_length_weeks=}"
+    )
+    return classify_cycles(
         c_end,
-        usage_filter=lambda _row: True,
-        fetch_jobs_per_user=False,
+        1,
+        min_waste_ratio=min_waste_ratio,
+        min_waste_rgu_hours=min_waste_rgu_hours,
+        personalized_action_min_waste_rgu_hours=personalized_action_min_waste_rgu_hours,
+        recurrence_active_cycles=recurrence_active_cycles,
+        cycle_length_weeks=cycle_length_weeks,
         clusters=clusters,
         utilization_ceiling=utilization_ceiling,
+    )[0]
+
+
+def _cycle_index(anchor: datetime, nb_cycles: int, cycle_length: timedelta):
+    """SQL expression: position of the cycle a job's end_time falls in, among
+    the `nb_cycles` consecutive cycles ending at `anchor` (0 = most recent).
+
+    Only meaningful for the jobs `_with_rgu_window` keeps between the start of
+    the oldest cycle and `anchor`.
+    """
+    # Ascending, as width_bucket expects: the oldest cycle first.
+    starts = [
+        (anchor - (i + 1) * cycle_length).timestamp()
+        for i in reversed(range(nb_cycles))
+    ]
+    # width_bucket numbers the oldest cycle 1 and the most recent nb_cycles.
+    return nb_cycles - func.width_bucket(
+        func.extract("epoch", col(JobSeriesDB.end_time)), literal(starts, ARRAY(Float))
     )
-    isunderuser_by_user = {
-        row.user_id: _meets_underuser_threshold(
-            row,
-            min_waste_ratio=min_waste_ratio,
-            min_waste_rgu_hours=min_waste_rgu_hours,
+
+
+def _select_cycles_usage(
+    anchor: datetime,
+    nb_cycles: int,
+    *,
+    recurrence_active_cycles: int,
+    cycle_length_weeks: int,
+    clusters: list[str] | None,
+    utilization_ceiling: float,
+):
+    """Per-(cycle, user, cluster) RGU-usage aggregate of the `nb_cycles`
+    consecutive cycles ending at `anchor`, in one scan of job_series_view.
+
+    A job belongs to the cycle its end_time falls in, as in `_with_rgu_window`:
+    `width_bucket` over the cycle starts gives its position (0 = most recent).
+    The `recurrence_active_cycles - 1` cycles before the oldest one are scanned
+    too, so that the trailing window of every position is complete; only the
+    rows of the `nb_cycles` positions are returned.
+
+    Window functions over the (cycle, user, cluster) rows add:
+    - user_rgu_hours / user_wasted: the user's cross-cluster totals in the cycle;
+    - trailing_wasted: the user's cross-cluster wasted RGU-h over the
+      `recurrence_active_cycles` cycles ending at that cycle, i.e. positions
+      [cycle_index, cycle_index + recurrence_active_cycles). RANGE (not ROWS) framing counts
+      every cluster row of these cycles, and none of the cycles with no job.
+    """
+    rgu_h_expr, true_used_expr, credited_used_expr = _rgu_exprs(utilization_ceiling)
+    cycle_length = timedelta(weeks=cycle_length_weeks)
+    nb_scanned = nb_cycles + recurrence_active_cycles - 1
+
+    per_cluster = _with_rgu_window(
+        select(  # ty:ignore[no-matching-overload]
+            _cycle_index(anchor, nb_scanned, cycle_length).label("cycle_index"),
+            col(JobSeriesDB.sarc_user_id),
+            col(JobSeriesDB.cluster_name),
+            func.sum(rgu_h_expr).label("sum_rgu_hours"),
+            func.sum(true_used_expr).label("sum_rgu_true_used"),
+            func.sum(credited_used_expr).label("sum_rgu_used"),
+        ),
+        anchor - nb_scanned * cycle_length,
+        anchor,
+        clusters=clusters,
+    ).group_by(
+        literal_column("cycle_index"),
+        JobSeriesDB.sarc_user_id,
+        JobSeriesDB.cluster_name,
+    )
+    pc = per_cluster.subquery("per_cluster")
+    wasted = pc.c.sum_rgu_hours - pc.c.sum_rgu_used
+    classified = select(
+        pc,
+        func.sum(pc.c.sum_rgu_hours)
+        .over(partition_by=[pc.c.cycle_index, pc.c.sarc_user_id])
+        .label("user_rgu_hours"),
+        func.sum(wasted)
+        .over(partition_by=[pc.c.cycle_index, pc.c.sarc_user_id])
+        .label("user_wasted"),
+        func.sum(wasted)
+        .over(
+            partition_by=pc.c.sarc_user_id,
+            order_by=pc.c.cycle_index,
+            range_=(0, recurrence_active_cycles - 1),
         )
-        for row in usage_rows
-    }
+        .label("trailing_wasted"),
+    ).subquery("classified")
+    return (
+        # The columns spelled out: with the subquery alone, exec() would only
+        # return the first column of each row.
+        select(*classified.c)
+        .where(classified.c.cycle_index < nb_cycles)
+        .order_by(
+            classified.c.cycle_index,
+            classified.c.sarc_user_id,
+            (classified.c.sum_rgu_hours - classified.c.sum_rgu_used).desc(),
+        )
+    )
 
-    pa_start = c_end - timedelta(weeks=recurrence_active_cycles * cycle_length_weeks)
+
+def classify_cycles(
+    anchor: datetime,
+    nb_cycles: int,
+    *,
+    min_waste_ratio: float,
+    min_waste_rgu_hours: float,
+    personalized_action_min_waste_rgu_hours: float,
+    recurrence_active_cycles: int,
+    cycle_length_weeks: int,
+    clusters: list[str] | None = None,
+    utilization_ceiling: float = 1.0,
+) -> list[list[CycleUserClusterStat]]:
+    """Classify every (user, cluster) active in each of the `nb_cycles`
+    consecutive cycles ending at `anchor`. Index i of the result is the cycle
+    [anchor - (i + 1) * cycle_length_weeks, anchor - i * cycle_length_weeks),
+    so 0 is the most recent one.
+
+    Every active user is returned, not just those meeting the threshold -- the
+    store this feeds must hold every user unconditionally. `isunderuser` is the
+    underuser threshold on the user's cross-cluster usage in the cycle, and
+    `flagged` additionally requires the user's cross-cluster wasted RGU-h over
+    the trailing `recurrence_active_cycles`-cycle window ending at the cycle to
+    meet `personalized_action_min_waste_rgu_hours`. All cycles and their
+    trailing windows come from a single statement (`_select_cycles_usage`).
+    """
+    stmt = _select_cycles_usage(
+        anchor,
+        nb_cycles,
+        recurrence_active_cycles=recurrence_active_cycles,
+        cycle_length_weeks=cycle_length_weeks,
+        clusters=clusters,
+        utilization_ceiling=utilization_ceiling,
+    )
     with config.db.session() as session:
-        pa_stmt = _select_jobs_usage(
-            pa_start,
-            c_end,
-            by_cluster=False,
-            clusters=clusters,
-            utilization_ceiling=utilization_ceiling,
-        )
-        pa_rows = session.exec(pa_stmt).all()
-    pa_wasted_by_user = {row.sarc_user_id: _split_waste(row)[2] for row in pa_rows}
-
-    stats: list[CycleUserClusterStat] = []
-    for row in usage_rows:
-        is_underuser = isunderuser_by_user[row.user_id]
-        flagged = (
-            is_underuser
-            and pa_wasted_by_user.get(row.user_id, 0.0)
-            >= personalized_action_min_waste_rgu_hours
+        rows = session.exec(stmt).all()
+
+    stats: list[list[CycleUserClusterStat]] = [[] for _ in range(nb_cycles)]
+    for row in rows:
+        rgu_h, rgu_h_true_used, rgu_h_wasted = _split_waste(row)
+        is_underuser = _is_underuser(
+            float(row.user_rgu_hours),
+            float(row.user_wasted),
+            min_waste_ratio=min_waste_ratio,
+            min_waste_rgu_hours=min_waste_rgu_hours,
         )
-        stats.extend(
+        stats[row.cycle_index].append(
             CycleUserClusterStat(
-                user_id=row.user_id,
-                cluster=cb.cluster,
-                rgu_hours=cb.rgu_hours,
-                wasted=cb.wasted,
-                sm_occ_mean=(
-                    cb.rgu_hours_used / cb.rgu_hours if cb.rgu_hours > 0 else 1.0
-                ),
+                user_id=row.sarc_user_id,
+                cluster=row.cluster_name or "unknown",
+                rgu_hours=rgu_h,
+                wasted=rgu_h_wasted,
+                sm_occ_mean=rgu_h_true_used / rgu_h if rgu_h > 0 else 1.0,
                 isunderuser=is_underuser,
-                flagged=flagged,
+                flagged=is_underuser
+                and float(row.trailing_wasted)
+                >= personalized_action_min_waste_rgu_hours,
             )
-            for cb in row.by_cluster
         )
     return stats
 
 
+def cycle_job_digests(
+    anchor: datetime,
+    nb_cycles: int,
+    *,
+    cycle_length_weeks: int,
+    clusters: list[str] | None = None,
+) -> list[str]:
+    """Digest of the jobs of each of the `nb_cycles` consecutive cycles ending
+    at `anchor` (index 0 = most recent), "" for a cycle with no job.
+
+    Covers every column `classify_cycles` reads from a job, so that a cycle
+    whose digest did not change classifies the same way. It is made of the
+    count, the highest ID and the sum of a hash of the jobs: cheap aggregates,
+    which do not depend on the order in which the jobs are read.
+    """
+    cycle_index = _cycle_index(anchor, nb_cycles, timedelta(weeks=cycle_length_weeks))
+    job = func.concat_ws(
+        ":",
+        col(JobSeriesDB.job_db_id),
+        col(JobSeriesDB.sarc_user_id),
+        col(JobSeriesDB.cluster_name),
+        col(JobSeriesDB.allocated_gpu_cost),
+        col(JobSeriesDB.allocated_gpu_waste),
+    )
+    stmt = _with_rgu_window(
+        select(
+            cycle_index.label("cycle_index"),
+            func.count().label("nb_jobs"),
+            func.max(col(JobSeriesDB.job_db_id)).label("max_job_db_id"),
+            # Of int4: a bigint, which does not overflow.
+            func.sum(func.hashtext(job)).label("hash_sum"),
+        ),
+        anchor - timedelta(weeks=nb_cycles * cycle_length_weeks),
+        anchor,
+        clusters=clusters,
+    ).group_by(literal_column("cycle_index"))
+    digests = [""] * nb_cycles
+    with config.db.session() as session:
+        for row in session.exec(stmt):
+            digests[row.cycle_index] = (
+                f"{row.nb_jobs}:{row.max_job_db_id}:{row.hash_sum}"
+            )
+    return digests
+
+
 def _active_positions(
     anchor: datetime,
     end: datetime,
@@ -754,34 +977,27 @@ def _live_cycle_data(
     clusters: list[str] | None,
     utilization_ceiling: float,
 ) -> tuple[list[set[int] | None], dict[int, list[bool]]]:
-    """Per-cycle membership + personalized-action flags via classify_cycle, one
-    call per displayed position. Positions whose end is in the future relative
+    """Per-cycle membership + personalized-action flags via classify_cycles, all
+    displayed positions at once. Positions whose end is in the future relative
     to `end` are skipped (cycle_flagged stays None, no user_pa_flags entries
-    created for them). Each position's classification is independent of every
-    other, so they run on a small capped thread pool instead of one after
-    another."""
+    created for them)."""
     cycle_flagged: list[set[int] | None] = [None] * recurrence_display_cycles
     active_positions = _active_positions(
         anchor, end, cycle_length_weeks, recurrence_display_cycles
     )
 
-    classify_results = _run_concurrently(
-        [
-            partial(
-                classify_cycle,
-                anchor - timedelta(weeks=(i + 1) * cycle_length_weeks),
-                anchor - timedelta(weeks=i * cycle_length_weeks),
-                min_waste_ratio=min_waste_ratio,
-                min_waste_rgu_hours=min_waste_rgu_hours,
-                personalized_action_min_waste_rgu_hours=personalized_action_min_waste_rgu_hours,
-                recurrence_active_cycles=recurrence_active_cycles,
-                cycle_length_weeks=cycle_length_weeks,
-                clusters=clusters,
-                utilization_ceiling=utilization_ceiling,
-            )
-            for i in active_positions
-        ]
+    cycles_stats = classify_cycles(
+        anchor,
+        recurrence_display_cycles,
+        min_waste_ratio=min_waste_ratio,
+        min_waste_rgu_hours=min_waste_rgu_hours,
+        personalized_action_min_waste_rgu_hours=personalized_action_min_waste_rgu_hours,
+        recurrence_active_cycles=recurrence_active_cycles,
+        cycle_length_weeks=cycle_length_weeks,
+        clusters=clusters,
+        utilization_ceiling=utilization_ceiling,
     )
+    classify_results = [cycles_stats[i] for i in active_positions]
 
     user_pa_flags: dict[int, list[bool]] = {}
     for i, stats in zip(active_positions, classify_results):
@@ -23,13 +23,17 @@ for such jobs, since RGU is the same:
 """
 
 import logging
-from collections import Counter
+from collections import Counter, defaultdict
 from collections.abc import Sequence
+from dataclasses import dataclass
 
+import sqlalchemy
 import sqlmodel
-from sqlmodel import Session
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Session, col, func
 
 from sarc.config import config
+from sarc.db.cluster import SlurmClusterDB
 from sarc.db.job import SlurmJobDB
 from sarc.db.support import GpuRguDB
 
@@ -37,14 +41,27 @@ logger = logging.getLogger(__name__)
 
 
 class HarmonizedNameNotInRguError(Exception):
-    def __init__(self, job: SlurmJobDB, name: str):
-        super().__init__(
-            f"{job.cluster.name}/{job.job_id}:{job.allocated_gpu_type}: "
-            f"Harmonized name not in GpuRguDB: {name}"
+    def __init__(self, job: str, name: str):
+        super().__init__(f"{job}: Harmonized name not in GpuRguDB: {name}")
+
+
+@dataclass
+class GpuJobs:
+    """GPU jobs with no harmonized name, on the same cluster, nodes and GPU type."""
+
+    cluster_id: int
+    cluster_name: str
+    nodes: list[str]
+    gpu_type: str
+    job_ids: list[int]
+
+    def describe(self) -> str:
+        return ", ".join(
+            f"{self.cluster_name}/{job_id}:{self.gpu_type}" for job_id in self.job_ids
         )
 
 
-def fix_gpu_types(sess: Session):
+def fix_gpu_types(sess: Session) -> int:
     """
     Check jobs to harmonize GPU names.
 
@@ -53,46 +70,49 @@ def fix_gpu_types(sess: Session):
 
     Won't modify job if GPU name cannot be harmonized. This may still happen,
     for e.g. if a job requested a GPU that doesn't exist on cluster.
+
+    Jobs are harmonized per distinct (cluster, nodes, GPU type), then updated
+    with one query per cluster. Returns the number of jobs updated.
     """
 
-    no_matching: list[SlurmJobDB] = []
-    many_matchings: list[tuple[SlurmJobDB, list[str]]] = []
+    no_matching: list[GpuJobs] = []
+    many_matchings: list[tuple[GpuJobs, list[str]]] = []
     nb_no_cluster = Counter()
+    # Harmonized names per cluster ID, by (nodes, GPU type)
+    fixes: dict[int, list[tuple[list[str], str, str]]] = defaultdict(list)
 
     # Get cluster configurations
     cluster_configs = config.clusters
     # Get GPU->RGU mapping from GpuRguDB
     gpu_to_rgu = _get_gpu_to_rgu(sess)
     # Find GPU jobs with missing harmonized names
-    jobs = get_gpu_jobs_without_harmonized_gpu_types(sess)
-    if jobs:
-        logger.warning(f"Found {len(jobs)} jobs with no harmonized names")
+    groups = get_gpu_job_groups_without_harmonized_gpu_types(sess)
+    nb_jobs = sum(len(group.job_ids) for group in groups)
+    if groups:
+        logger.warning(f"Found {nb_jobs} jobs with no harmonized names")
 
     # Fix
-    for job in jobs:
-        cluster_name = job.cluster.name
-        cluster_cfg = cluster_configs.get(cluster_name)
+    for group in groups:
+        cluster_cfg = cluster_configs.get(group.cluster_name)
         if cluster_cfg is None:
-            nb_no_cluster[cluster_name] += 1
+            nb_no_cluster[group.cluster_name] += len(group.job_ids)
             continue
 
-        gpu_type = job.allocated_gpu_type
-        assert gpu_type is not None
         harmonized_names: set[str] = set()
-        for nodename in job.nodes or [""]:
-            h_name = cluster_cfg.harmonize_gpu(nodename, gpu_type)
+        for nodename in group.nodes or [""]:
+            h_name = cluster_cfg.harmonize_gpu(nodename, group.gpu_type)
             if h_name is not None:
                 harmonized_names.add(h_name)
 
         harmonized_name: str | None = None
         if len(harmonized_names) == 0:
             # No harmonized name found for this GPU. We'll log.
-            no_matching.append(job)
+            no_matching.append(group)
         elif len(harmonized_names) == 1:
             # Harmonized name found. Ok.
             harmonized_name = harmonized_names.pop()
             if harmonized_name not in gpu_to_rgu:
-                raise HarmonizedNameNotInRguError(job, harmonized_name)
+                raise HarmonizedNameNotInRguError(group.describe(), harmonized_name)
         else:
             # Multiple harmonized names found.
             # This can happen a few time. Example: mila 6343581 gpu:a100l:4 nodes=['cn-g007', 'cn-i001']
@@ -100,7 +120,7 @@ def fix_gpu_types(sess: Session):
             h_rgu_values: set[tuple[float, float]] = set()
             for h_name in harmonized_names:
                 if h_name not in gpu_to_rgu:
-                    raise HarmonizedNameNotInRguError(job, h_name)
+                    raise HarmonizedNameNotInRguError(group.describe(), h_name)
                 h_rgu_values.add(gpu_to_rgu[h_name])
 
             if len(h_rgu_values) == 1:
@@ -120,36 +140,104 @@ def fix_gpu_types(sess: Session):
                     gpu_to_rgu[harmonized_name] = h_rgu_tuple
             else:
                 # Different RGU values for different harmonized names. We'll log.
-                many_matchings.append((job, sorted(harmonized_names)))
+                many_matchings.append((group, sorted(harmonized_names)))
 
         if harmonized_name is not None:
-            job.harmonized_gpu_type = harmonized_name
+            fixes[group.cluster_id].append(
+                (group.nodes, group.gpu_type, harmonized_name)
+            )
 
+    nb_updated = sum(
+        _update_harmonized_gpu_types(sess, cluster_id, cluster_fixes)
+        for cluster_id, cluster_fixes in fixes.items()
+    )
     sess.commit()
+    if nb_updated:
+        logger.info(f"Harmonized GPU names of {nb_updated} jobs")
 
     if nb_no_cluster:
         logger.warning(f"GPU jobs with unknown clusters: {nb_no_cluster}")
     if no_matching:
         logger.warning(
-            f"GPU jobs that cannot be harmonized: {len(no_matching)}: "
-            f"{
-                ', '.join(
-                    f'{job.cluster.name}/{job.job_id}:{job.allocated_gpu_type}'
-                    for job in no_matching
-                )
-            }"
+            f"GPU jobs that cannot be harmonized: "
+            f"{sum(len(group.job_ids) for group in no_matching)}: "
+            f"{', '.join(group.describe() for group in no_matching)}"
         )
     if many_matchings:
         logger.warning(
-            f"GPU jobs with many harmonized names with different RGU values: {len(many_matchings)}: "
+            f"GPU jobs with many harmonized names with different RGU values: "
+            f"{sum(len(group.job_ids) for group, _ in many_matchings)}: "
             f"{
                 ', '.join(
-                    f'{job.cluster.name}/{job.job_id}:{job.allocated_gpu_type} => '
+                    f'{group.cluster_name}/{job_id}:{group.gpu_type} => '
                     + (' | '.join(h_names))
-                    for job, h_names in many_matchings
+                    for group, h_names in many_matchings
+                    for job_id in group.job_ids
                 )
             }"
         )
+    return nb_updated
+
+
+def _update_harmonized_gpu_types(
+    sess: Session, cluster_id: int, fixes: list[tuple[list[str], str, str]]
+) -> int:
+    """Set the harmonized GPU type of the cluster's jobs, with one UPDATE ... FROM (VALUES ...)."""
+    fixed = sqlalchemy.values(
+        sqlalchemy.column("nodes", JSONB),
+        sqlalchemy.column("gpu_type", sqlalchemy.String),
+        sqlalchemy.column("harmonized", sqlalchemy.String),
+        name="fixed",
+    ).data(fixes)
+    result = sess.exec(
+        sqlmodel.update(SlurmJobDB)
+        .where(
+            col(SlurmJobDB.cluster_id) == cluster_id,
+            col(SlurmJobDB.nodes) == fixed.c.nodes,
+            col(SlurmJobDB.allocated_gpu_type) == fixed.c.gpu_type,
+            col(SlurmJobDB.harmonized_gpu_type).is_(None),
+        )
+        .values(harmonized_gpu_type=fixed.c.harmonized)
+        # The session is committed right after, which expires the jobs anyway.
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def get_gpu_job_groups_without_harmonized_gpu_types(sess: Session) -> list[GpuJobs]:
+    """GPU jobs with no harmonized name, grouped by cluster, nodes and GPU type."""
+    query = (
+        sqlmodel.select(  # ty:ignore[no-matching-overload]
+            SlurmJobDB.cluster_id,
+            SlurmClusterDB.name,
+            SlurmJobDB.nodes,
+            SlurmJobDB.allocated_gpu_type,
+            func.array_agg(SlurmJobDB.job_id),
+        )
+        .join(SlurmClusterDB, col(SlurmClusterDB.id) == col(SlurmJobDB.cluster_id))
+        .where(
+            # We don't want CPU jobs
+            col(SlurmJobDB.allocated_gpu_type).is_not(None),
+            # We look for GPU names not harmonized
+            col(SlurmJobDB.harmonized_gpu_type).is_(None),
+        )
+        .group_by(
+            SlurmJobDB.cluster_id,
+            SlurmClusterDB.name,
+            SlurmJobDB.nodes,
+            SlurmJobDB.allocated_gpu_type,
+        )
+    )
+    return [
+        GpuJobs(
+            cluster_id=cluster_id,
+            cluster_name=cluster_name,
+            nodes=nodes,
+            gpu_type=gpu_type,
+            job_ids=sorted(job_ids),
+        )
+        for cluster_id, cluster_name, nodes, gpu_type, job_ids in sess.exec(query)
+    ]
 
 
 def get_gpu_jobs_without_harmonized_gpu_types(sess: Session) -> Sequence[SlurmJobDB]:
@@ -21,6 +21,7 @@ from sarc.scraping.jobs_utils import (
     set_auto_end_time,
     update_allocated_gpu_type_from_nodes,
 )
+from sarc.stages import accumulated_stage
 from sarc.traces import using_trace
 
 logger = logging.getLogger(__name__)
@@ -221,46 +222,63 @@ def parse_cache_entry(
 
         nb_skipped = 0
         nb_total = 0
-        for entry in parse_raw(value, cluster_name, scraped_start, scraped_end):
-            if entry is None:
-                continue
-
-            nb_total += 1
-
-            entry_cluster_name = entry.pop("cluster_name")
-            entry_cluster = clusters_cache.get(entry_cluster_name)
-            if entry_cluster is None:
-                raise ValueError(
-                    "Unknown cluster name % for job id %s",
-                    entry_cluster_name,
-                    entry["job_id"],
-                )
-            entry["cluster_id"] = entry_cluster.id
-            entry["sarc_user_id"] = get_user_id_for_cluster_user(
-                sess, entry["cluster_id"], entry["cluster_user"], entry["submit_time"]
-            )
-            if entry["sarc_user_id"] is None:
-                logger.debug(
-                    "Skipping job %s on cluster %s because we can't find a user %s for it",
-                    entry["job_id"],
-                    entry_cluster_name,
-                    entry["cluster_user"],
-                )
-                nb_skipped += 1
-                continue
-            job = SlurmJobDB.model_validate(entry)
-            update_allocated_gpu_type_from_nodes(
-                clusters_cfg[entry_cluster_name], job, entry_cluster
-            )
-            job_dict = job.model_dump(exclude={"id"})
-            jobs_to_upsert.append(job_dict)
-            if len(jobs_to_upsert) >= batch_size:
+        with (
+            accumulated_stage("jobs.users", cluster=cluster_name) as users_stage,
+            accumulated_stage("jobs.validate", cluster=cluster_name) as validate_stage,
+            accumulated_stage("jobs.upsert", cluster=cluster_name) as upsert_stage,
+        ):
+            for entry in parse_raw(value, cluster_name, scraped_start, scraped_end):
+                if entry is None:
+                    continue
+
+                nb_total += 1
+
+                entry_cluster_name = entry.pop("cluster_name")
+                entry_cluster = clusters_cache.get(entry_cluster_name)
+                if entry_cluster is None:
+                    raise ValueError(
+                        "Unknown cluster name % for job id %s",
+                        entry_cluster_name,
+                        entry["job_id"],
+                    )
+                entry["cluster_id"] = entry_cluster.id
+                with users_stage.timed():
+                    entry["sarc_user_id"] = get_user_id_for_cluster_user(
+                        sess,
+                        entry["cluster_id"],
+                        entry["cluster_user"],
+                        entry["submit_time"],
+                    )
+                users_stage.add(rows=1)
+                if entry["sarc_user_id"] is None:
+                    logger.debug(
+                        "Skipping job %s on cluster %s because we can't find a user %s for it",
+                        entry["job_id"],
+                        entry_cluster_name,
+                        entry["cluster_user"],
+                    )
+                    nb_skipped += 1
+                    continue
+                with validate_stage.timed():
+                    job = SlurmJobDB.model_validate(entry)
+                    update_allocated_gpu_type_from_nodes(
+                        clusters_cfg[entry_cluster_name], job, entry_cluster
+                    )
+                    job_dict = job.model_dump(exclude={"id"})
+                validate_stage.add(rows=1)
+                jobs_to_upsert.append(job_dict)
+                if len(jobs_to_upsert) >= batch_size:
+                    with upsert_stage.timed():
+                        bulk_upsert_jobs(sess, jobs_to_upsert)
+                    upsert_stage.add(rows=len(jobs_to_upsert))
+                    jobs_to_upsert = []
+
+            with upsert_stage.timed():
                 bulk_upsert_jobs(sess, jobs_to_upsert)
-                jobs_to_upsert = []
+            upsert_stage.add(rows=len(jobs_to_upsert))
+            jobs_to_upsert = []
 
         if nb_skipped > 0:
             logger.warning(
                 f"skipped {nb_skipped}/{nb_total} ({int(100 * nb_skipped / nb_total)}%) jobs on {cluster_name} because we can't find a user for it"
             )
-        bulk_upsert_jobs(sess, jobs_to_upsert)
-        jobs_to_upsert = []
@@ -13,6 +13,7 @@ from sarc.config import UTC, ClusterConfig, config
 from sarc.db.cluster import SlurmClusterDB
 from sarc.db.job import SlurmJobDB
 from sarc.errors import ClusterNotFound
+from sarc.stages import using_stage
 from sarc.traces import trace_decorator
 from sarc.utils import ensure_utc
 from sarc.validators import UTCOFFSET
@@ -133,23 +134,29 @@ def fetch_raw(cluster: ClusterConfig, start: datetime, end: datetime) -> bytes:
     accounts_option = f"-A {accounts} " if accounts else ""
     cmd = f"{cluster.sacct_bin} {accounts_option}-X -S {start_str} -E {end_str} --allusers --json --duplicates"
     logger.debug(f"{cluster.name} $ {cmd}")
-    if cluster.host == "localhost":
-        results: subprocess.CompletedProcess[str] | Result = subprocess.run(
-            cmd,
-            shell=True,
-            text=True,
-            capture_output=True,
-            check=False,
-            env={"TZ": "UTC"} if not cluster.ignore_tz_utc else {},
-        )
-    else:
-        ssh = cluster.ssh
-        ssh.config.run.env = {"TZ": "UTC"} if not cluster.ignore_tz_utc else {}
-        results = ssh.run(cmd, hide=True)
-        logger.debug(results.stdout)
+    # Set from the key of the cluster when the config is loaded.
+    assert cluster.name is not None
+    with using_stage("jobs.sacct", cluster=cluster.name) as stage:
+        if cluster.host == "localhost":
+            results: subprocess.CompletedProcess[str] | Result = subprocess.run(
+                cmd,
+                shell=True,
+                text=True,
+                capture_output=True,
+                check=False,
+                env={"TZ": "UTC"} if not cluster.ignore_tz_utc else {},
+            )
+        else:
+            ssh = cluster.ssh
+            ssh.config.run.env = {"TZ": "UTC"} if not cluster.ignore_tz_utc else {}
+            results = ssh.run(cmd, hide=True)
+            logger.debug(results.stdout)
+
+        # return stdout as bytes
+        raw = results.stdout.encode("utf-8")
+        stage.add(nbytes=len(raw))
 
-    # return stdout as bytes
-    return results.stdout.encode("utf-8")
+    return raw
 
 
 @trace_decorator()
@@ -303,11 +310,13 @@ def parse_raw(
     ensure_utc(scraped_start)
     ensure_utc(scraped_end)
 
-    # filter out the eventual welcome message
-    raw_data_str = raw_data.decode("utf-8")
-    json_str = raw_data_str[raw_data_str.find("{") :]
+    with using_stage("jobs.decode", cluster=cluster_name) as stage:
+        # filter out the eventual welcome message
+        raw_data_str = raw_data.decode("utf-8")
+        json_str = raw_data_str[raw_data_str.find("{") :]
 
-    data = json.loads(json_str)
+        data = json.loads(json_str)
+        stage.add(rows=len(data["jobs"]), nbytes=len(raw_data))
 
     version: dict = (
         data.get("meta", {}).get("Slurm", None) or data.get("meta", {}).get("slurm", {})
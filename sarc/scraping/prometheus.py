@@ -14,6 +14,7 @@ from sarc.db.job import JobStatisticDB, JobStatisticsFetchDateDB, SlurmJobDB
 from sarc.db.runstate import get_parsed_date, set_parsed_date
 from sarc.models.job import SlurmState
 from sarc.scraping import series
+from sarc.stages import Stage, accumulated_stage
 from sarc.traces import trace_decorator
 
 logger = logging.getLogger(__name__)
@@ -135,17 +136,26 @@ def parse_prometheus_ce(sess: Session, ce: CacheEntry) -> bool:
     logger.info(
         f"Parsing prometheus data from cache entry: {ce.get_entry_datetime().isoformat(timespec='milliseconds')}"
     )
-    for batch in batched(ce.items(), PARSE_BATCH_SIZE):
-        batch_error, batch_nb_jobs = _parse_prometheus_batch(sess, batch)
-        error = error or batch_error
-        nb_jobs += batch_nb_jobs
+    with (
+        accumulated_stage("prometheus.decode") as decode_stage,
+        accumulated_stage("prometheus.statistics") as statistics_stage,
+    ):
+        for batch in batched(ce.items(), PARSE_BATCH_SIZE):
+            batch_error, batch_nb_jobs = _parse_prometheus_batch(
+                sess, batch, decode_stage, statistics_stage
+            )
+            error = error or batch_error
+            nb_jobs += batch_nb_jobs
 
     logger.info(f"Saved Prometheus metrics for {nb_jobs} jobs.")
     return error
 
 
 def _parse_prometheus_batch(
-    sess: Session, batch: tuple[tuple[str, bytes], ...]
+    sess: Session,
+    batch: tuple[tuple[str, bytes], ...],
+    decode_stage: Stage,
+    statistics_stage: Stage,
 ) -> tuple[bool, int]:
     error = False
     nb_jobs = 0
@@ -163,7 +173,9 @@ def _parse_prometheus_batch(
             continue
         job_id = int(job_id_str)
         submit_time = datetime.fromisoformat(submit_time_str).astimezone(UTC)
-        data = json.loads(value.decode("utf-8"))
+        with decode_stage.timed():
+            data = json.loads(value.decode("utf-8"))
+        decode_stage.add(rows=1, nbytes=len(value))
         if data == []:
             logger.warning(
                 f"Empty data found for job {job_id} on cluster {cluster_name} (submit_time {submit_time}), skipping cache entry"
@@ -228,7 +240,9 @@ def _parse_prometheus_batch(
                 entry.harmonized_gpu_type = cluster.harmonize_gpu_from_nodes(
                     entry.nodes, gpu_type
                 )
-        statistics = series.compute_job_statistics(entry, data)
+        with statistics_stage.timed():
+            statistics = series.compute_job_statistics(entry, data)
+        statistics_stage.add(rows=1)
         if len(statistics) != 0:
             for k, v in statistics.items():
                 if (existing := entry.statistics.get(k)) is not None:
@@ -8,6 +8,7 @@ import numpy as np
 from sarc.config import config
 from sarc.db.job import JobStatisticDB, SlurmJobDB
 from sarc.scraping.dcgm import DCGM_FP64_BLANK
+from sarc.stages import using_stage
 from sarc.traces import trace_decorator
 
 logger = logging.getLogger(__name__)
@@ -83,7 +84,11 @@ def get_job_time_series_batched(
     logger.debug(f"batched prometheus query: {combined_query}")
 
     cluster_name = jobs[0].cluster.name
-    raw_results = config.clusters[cluster_name].prometheus.custom_query(combined_query)
+    with using_stage("prometheus.query", cluster=cluster_name) as stage:
+        raw_results = config.clusters[cluster_name].prometheus.custom_query(
+            combined_query
+        )
+        stage.add(rows=len(raw_results))
 
     # Map returned series back to jobs & filter values to exact job time windows
     for series_data in raw_results:
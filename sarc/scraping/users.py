@@ -1,18 +1,33 @@
+import hashlib
+import json
 import logging
 import os
 from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
 from datetime import UTC, datetime
 from importlib.metadata import entry_points
 from typing import Any, Callable, Protocol, Type, overload
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import BaseModel, Field, TypeAdapter, field_serializer
 from serieux import IncludeFile, Serieux, WorkingDirectory
 from serieux.features.encrypt import EncryptionKey
-from sqlmodel import Session, and_, or_, select
+from sqlalchemy.dialects.postgresql import Range
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, col, select, tuple_
 
 from sarc.cache import Cache, CacheEntry
 from sarc.config import config_path
-from sarc.db.users import MatchingID, MemberType, UserDB, merge_users
+from sarc.db.users import (
+    CredentialsDB,
+    MatchingID,
+    MemberType,
+    MemberTypeDB,
+    SupervisorsDB,
+    SupervisorsHelper,
+    UserDB,
+    ValidDB,
+    merge_users,
+)
 from sarc.db.users import ValidField as ValidFieldDB
 from sarc.patch import declare_patch
 from sarc.traces import trace_decorator, using_trace
@@ -252,6 +267,50 @@ def parse_ce(ce: CacheEntry) -> Iterable[UserMatch]:
             break
 
 
+def user_digest(user: UserMatch, entry_time: datetime) -> str:
+    """Digest of the content of `user`, as parsed from the entry of `entry_time`.
+
+    Some scrapers date values with the time of the entry (e.g. credentials
+    valid from now on). Those bounds are left out, so that a user that did not
+    change between two entries has the same digest in both.
+    """
+    entry = TypeAdapter(datetime).dump_python(entry_time.astimezone(UTC), mode="json")
+
+    def _normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: _normalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [_normalize(v) for v in value]
+        return "<entry>" if value == entry else value
+
+    content = json.dumps(_normalize(user.model_dump(mode="json")), sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@trace_decorator()
+def changed_users(
+    users: Iterable[UserMatch],
+    entry_time: datetime,
+    digests: dict[tuple[str, str], str],
+) -> Iterable[UserMatch]:
+    """Filter `users` on those added or modified since `digests` were taken.
+
+    `digests` (by matching ID) is updated with the digests of `users`. The users
+    not in `users` anymore are removed from it, so that they are considered new
+    if they come back.
+    """
+    seen = set()
+    for user in users:
+        key = (user.matching_id.name, user.matching_id.mid)
+        seen.add(key)
+        digest = user_digest(user, entry_time)
+        if digests.get(key) != digest:
+            digests[key] = digest
+            yield user
+    for key in digests.keys() - seen:
+        del digests[key]
+
+
 @trace_decorator()
 def lookup_match_id(sess: Session, match_id: MatchID) -> Sequence[UserDB]:
     return sess.exec(
@@ -263,69 +322,275 @@ def lookup_match_id(sess: Session, match_id: MatchID) -> Sequence[UserDB]:
     ).all()
 
 
+def _all_matches(user: UserMatch) -> set[MatchID]:
+    return user.known_matches.union((user.matching_id,))
+
+
 @trace_decorator()
 def update_user(sess: Session, user: UserMatch) -> None:
-    matches = user.known_matches.union((user.matching_id,))
-    clauses = [
-        and_(
-            MatchingID.plugin_name == match_id.name, MatchingID.match_id == match_id.mid
+    update_users(sess, [user])
+
+
+@trace_decorator()
+def update_users(sess: Session, users: Iterable[UserMatch]) -> None:
+    """Reconcile the database with a batch of users.
+
+    This has the same result as updating the users one at a time, but the
+    current state of all the users is loaded in a few queries and compared in
+    memory. Values which are already in the database are not written again and
+    the values of new users (or new fields) are inserted together. Only the
+    fields with values that change the existing validity periods go through
+    `ValidField.insert`, one value at a time.
+
+    The supervisors may be anywhere in the batch, or already in the database.
+    """
+    users = list(users)
+    if not users:
+        return
+
+    with using_trace("update", "resolve"):
+        ids = _lookup_user_ids(
+            sess,
+            {mid for user in users for mid in _all_matches(user)}
+            | {
+                mid
+                for user in users
+                for tag in user.supervisors.values
+                for mid in tag.value
+            },
         )
-        for match_id in matches
-    ]
-    results = sess.exec(
-        select(MatchingID.user_id).where(or_(*clauses)).distinct()
-    ).all()
-    if len(results) == 0:
-        insert_new(sess, user)
-    else:
-        db_user = sess.get(UserDB, results[0])
-        assert db_user is not None
-        for user_id in results[1:]:
-            db_extra = sess.get(UserDB, user_id)
-            assert db_extra is not None
-            merge_users(sess, db_user, db_extra)
+        db_users = _resolve_users(sess, users, ids)
+
+    with using_trace("update", "users"):
+        existing = {db_user.id for _, db_user in db_users if db_user.id is not None}
+        for user, db_user in db_users:
+            if db_user.id is None:
+                sess.add(db_user)
+            else:
+                if user.display_name is not None:
+                    db_user.display_name = user.display_name
+                if user.email is not None:
+                    db_user.email = user.email
+            _update_matching_ids(user, db_user)
         sess.flush()
 
-        if user.display_name is not None:
-            db_user.display_name = user.display_name
-        if user.email is not None:
-            db_user.email = user.email
-        for mid in user.known_matches.union((user.matching_id,)):
-            if mid.name not in db_user.matching_ids:
-                db_user.matching_ids[mid.name] = mid.mid
-            elif db_user.matching_ids[mid.name] != mid.mid:
-                logger.error(
-                    "User %s has matching id (%s:%s) but update has (%s:%s), using update",
-                    db_user.id,
-                    mid.name,
-                    db_user.matching_ids[mid.name],
-                    mid.name,
-                    mid.mid,
-                )
-                db_user.matching_ids[mid.name] = mid.mid
-        with using_trace("update", "user_db"):
-            update_user_db(sess, user, db_user)
+        # Supervisors are looked up with the matching IDs as they are now.
+        touched = {db_user.id for _, db_user in db_users}
+        ids = {mid: uid for mid, uid in ids.items() if uid not in touched}
+        for _, db_user in db_users:
+            assert db_user.id is not None
+            for name, mid in db_user.matching_ids.items():
+                ids[MatchID(name=name, mid=mid)] = db_user.id
+
+    with using_trace("update", "valid_fields"):
+        states = _load_states(sess, existing)
+        for user, db_user in db_users:
+            assert db_user.id is not None
+            if db_user.id not in existing:
+                state = _UserState()
+            else:
+                # A user is only diffed against its loaded state once: if the
+                # batch has it twice, that state is stale the second time.
+                state = states.pop(db_user.id, None)
+            _update_valid_fields(sess, user, db_user, state, ids)
+        sess.flush()
+
+
+def _lookup_user_ids(sess: Session, matches: set[MatchID]) -> dict[MatchID, int]:
+    """Users of the matching IDs in the database (each belongs to at most one)."""
+    if not matches:
+        return {}
+    rows = sess.exec(
+        select(MatchingID.plugin_name, MatchingID.match_id, MatchingID.user_id).where(
+            tuple_(col(MatchingID.plugin_name), col(MatchingID.match_id)).in_(
+                [(mid.name, mid.mid) for mid in matches]
+            )
+        )
+    ).all()
+    return {
+        MatchID(name=name, mid=mid): user_id
+        for name, mid, user_id in rows
+        if user_id is not None
+    }
+
+
+def _resolve_users(
+    sess: Session, users: list[UserMatch], ids: dict[MatchID, int]
+) -> list[tuple[UserMatch, UserDB]]:
+    """Pair each user with its database user, new (without an id) if not found.
+
+    Users with matching IDs from several database users have them merged into
+    the first one. Users that are new and miss a display name or an email are
+    left out.
+    """
+    user_ids: list[int | None] = []
+    for user in users:
+        uids = sorted({ids[mid] for mid in _all_matches(user) if mid in ids})
+        if len(uids) > 1:
+            db_user = sess.get(UserDB, uids[0])
+            assert db_user is not None
+            for user_id in uids[1:]:
+                db_extra = sess.get(UserDB, user_id)
+                assert db_extra is not None
+                merge_users(sess, db_user, db_extra)
+            sess.flush()
+            for mid, uid in ids.items():
+                if uid in uids:
+                    ids[mid] = uids[0]
+        user_ids.append(uids[0] if uids else None)
+
+    loaded = {
+        db_user.id: db_user
+        for db_user in sess.exec(
+            select(UserDB)
+            .where(col(UserDB.id).in_({uid for uid in user_ids if uid is not None}))
+            .options(selectinload(UserDB._match_ids))  # ty:ignore[invalid-argument-type]
+        ).all()
+    }
+    db_users: list[tuple[UserMatch, UserDB]] = []
+    for user, user_id in zip(users, user_ids, strict=True):
+        if user_id is not None:
+            db_users.append((user, loaded[user_id]))
+        elif user.display_name is None or user.email is None:
+            logger.error(
+                "Attempting to add a new user with missing attributes: %s", user
+            )
+        else:
+            db_users.append(
+                (user, UserDB(display_name=user.display_name, email=user.email))
+            )
+    return db_users
+
+
+def _update_matching_ids(user: UserMatch, db_user: UserDB) -> None:
+    for mid in _all_matches(user):
+        if mid.name not in db_user.matching_ids:
+            db_user.matching_ids[mid.name] = mid.mid
+        elif db_user.matching_ids[mid.name] != mid.mid:
+            logger.error(
+                "User %s has matching id (%s:%s) but update has (%s:%s), using update",
+                db_user.id,
+                mid.name,
+                db_user.matching_ids[mid.name],
+                mid.name,
+                mid.mid,
+            )
+            db_user.matching_ids[mid.name] = mid.mid
+
+
+@dataclass
+class _UserState:
+    """Rows of the validity fields of a user, as loaded by `update_users`."""
+
+    credentials: dict[str, list[CredentialsDB]] = field(default_factory=dict)
+    member_type: list[MemberTypeDB] = field(default_factory=list)
+    supervisors: list[SupervisorsDB] = field(default_factory=list)
+
+
+def _load_states(sess: Session, user_ids: set[int]) -> dict[int, _UserState]:
+    states = {user_id: _UserState() for user_id in user_ids}
+    if not user_ids:
+        return states
+    for cred in sess.exec(
+        select(CredentialsDB).where(col(CredentialsDB.user_id).in_(user_ids))
+    ):
+        states[cred.user_id].credentials.setdefault(cred.domain, []).append(cred)
+    for member_type in sess.exec(
+        select(MemberTypeDB).where(col(MemberTypeDB.user_id).in_(user_ids))
+    ):
+        states[member_type.user_id].member_type.append(member_type)
+    for supervisors in sess.exec(
+        select(SupervisorsDB)
+        .where(col(SupervisorsDB.user_id).in_(user_ids))
+        .options(selectinload(SupervisorsDB.supervisors))  # ty:ignore[invalid-argument-type]
+    ):
+        states[supervisors.user_id].supervisors.append(supervisors)
+    return states
+
+
+def _update_valid_fields(
+    sess: Session,
+    user: UserMatch,
+    db_user: UserDB,
+    state: _UserState | None,
+    ids: dict[MatchID, int],
+) -> None:
+    """Merge the validity fields of `user` in `db_user`.
+
+    `state` holds the current rows of `db_user`, None if they are not known.
+    """
+
+    def map_super(match_id: MatchID) -> int:
+        try:
+            return ids[match_id]
+        except KeyError:
+            raise ValueError(f"Supervisor ({match_id}) not found in database") from None
+
+    def map_supervisors(matches: list[MatchID]) -> list[SupervisorsHelper]:
+        return [
+            SupervisorsHelper(pos=i, supervisor=sid)
+            for i, sid in enumerate(sorted(map_super(m) for m in matches))
+        ]
+
+    for domain, creds in user.associated_accounts.items():
+        valid_merge(
+            sess,
+            creds,
+            db_user.associated_accounts[domain],
+            None if state is None else state.credentials.get(domain, []),
+        )
+    valid_merge(
+        sess,
+        user.member_type,
+        db_user.member_type,
+        None if state is None else state.member_type,
+    )
+    valid_merge(
+        sess,
+        user.supervisors,
+        db_user._supervisors,
+        None if state is None else state.supervisors,
+        map=map_supervisors,
+    )
 
 
 @overload
 def valid_merge[T](
-    valid: ValidField[T], db_valid: ValidFieldDB[T], *, map: None = None
+    sess: Session,
+    valid: ValidField[T],
+    db_valid: ValidFieldDB[T],
+    records: Sequence[ValidDB] | None,
+    *,
+    map: None = None,
 ) -> None: ...
 
 
 @overload
 def valid_merge[T, U](
-    valid: ValidField[T], db_valid: ValidFieldDB[U], *, map: Callable[[T], U]
+    sess: Session,
+    valid: ValidField[T],
+    db_valid: ValidFieldDB[U],
+    records: Sequence[ValidDB] | None,
+    *,
+    map: Callable[[T], U],
 ) -> None: ...
 
 
 @trace_decorator()
 def valid_merge[T, U](
+    sess: Session,
     valid: ValidField[T],
     db_valid: ValidFieldDB[U],
+    records: Sequence[ValidDB] | None,
     *,
     map: Callable[[T], U] | None = None,
 ) -> None:
+    """Merge the values of `valid` in `db_valid`, whose rows are `records`.
+
+    If there are no rows, the values are added to the session without querying.
+    If the rows already hold all the values, nothing is done. Otherwise, or if
+    `records` is None (unknown), the values are inserted one at a time.
+    """
     if map is None:
 
         def mapf(v: T) -> U:
@@ -333,45 +598,39 @@ def valid_merge[T, U](
 
         map = mapf
 
-    for tag in valid.values:
-        db_valid.insert(map(tag.value), tag.valid.lower, tag.valid.upper)
-
-
-@trace_decorator()
-def update_user_db(sess: Session, user: UserMatch, db_user: UserDB) -> None:
-    for domain, creds in user.associated_accounts.items():
-        valid_merge(creds, db_user.associated_accounts[domain])
-    valid_merge(user.member_type, db_user.member_type)
-
-    def map_super(match_id: MatchID) -> int:
-        res = lookup_match_id(sess, match_id)
-        if len(res) == 0:
-            raise ValueError("Supervisor (%s) not found in database")
-        else:
-            if len(res) > 1:
-                logger.error(
-                    "Multiple matching users in DB for match id (%s), selecting the first one",
-                    match_id,
-                )
-            assert res[0].id is not None
-            return res[0].id
-
-    valid_merge(
-        user.supervisors,
-        db_user.supervisors,
-        map=lambda v: sorted(map_super(m) for m in v),
-    )  # ty:ignore[no-matching-overload]
-
-
-@trace_decorator()
-def insert_new(sess: Session, user: UserMatch) -> None:
-    if user.display_name is None or user.email is None:
-        logger.error("Attempting to add a new user with missing attributes: %s", user)
-        return
-    db_user = UserDB(display_name=user.display_name, email=user.email)
-    sess.add(db_user)
-    sess.flush()
-    for match_id in user.known_matches:
-        db_user.matching_ids[match_id.name] = match_id.mid
-    db_user.matching_ids[user.matching_id.name] = user.matching_id.mid
-    update_user_db(sess, user, db_user)
+    tags = [
+        (map(tag.value), Range(tag.valid.lower, tag.valid.upper, bounds="[)"))
+        for tag in valid.values
+    ]
+    if records is not None and not records:
+        for value, valid_range in _coalesce(tags):
+            sess.add(db_valid._create_record(valid=valid_range, value=value))
+    elif records is None or not all(
+        any(
+            getattr(record, db_valid.col_ref) == value
+            and record.valid.contains(valid_range)
+            for record in records
+        )
+        for value, valid_range in tags
+    ):
+        for value, valid_range in tags:
+            db_valid.insert(value, valid_range.lower, valid_range.upper)
+
+
+def _coalesce[U](
+    tags: list[tuple[U, Range[datetime]]],
+) -> list[tuple[U, Range[datetime]]]:
+    """Merge the overlapping or adjacent ranges of equal values, as ValidField.insert does."""
+    result: list[tuple[U, Range[datetime]]] = []
+    for value, valid_range in sorted(
+        tags, key=lambda tag: (tag[1].lower is not None, tag[1].lower)
+    ):
+        if result:
+            prev_value, prev_range = result[-1]
+            if prev_value == value and (
+                prev_range.overlaps(valid_range) or prev_range.adjacent_to(valid_range)
+            ):
+                result[-1] = (value, prev_range.union(valid_range))
+                continue
+        result.append((value, valid_range))
+    return result
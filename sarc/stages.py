@@ -0,0 +1,149 @@
+"""Timing and volume metrics for the stages of the acquire and parse pipelines.
+
+Each stage reports, with its name and labels such as the cluster:
+
+- ``sarc.stage.duration``: seconds spent in the stage, per call;
+- ``sarc.stage.rows``: rows (jobs, series, users...) it handled;
+- ``sarc.stage.bytes``: bytes it read or wrote.
+
+They go through the OpenTelemetry metrics API, so they are only exported when
+a MeterProvider is set up (see `sarc.logging.setup_opentelemetry_metrics`).
+Independently, `enable_stage_profile` keeps in-process totals per stage, which
+``sarc --profile`` prints at the end of a command.
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from opentelemetry.metrics import get_meter
+
+_meter = get_meter("sarc.stages")
+_duration = _meter.create_histogram(
+    "sarc.stage.duration", unit="s", description="Time spent in a pipeline stage"
+)
+_rows = _meter.create_counter(
+    "sarc.stage.rows", unit="{row}", description="Rows handled by a pipeline stage"
+)
+_bytes = _meter.create_counter(
+    "sarc.stage.bytes", unit="By", description="Bytes handled by a pipeline stage"
+)
+
+
+@dataclass
+class StageTotals:
+    calls: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+
+_profile: dict[str, StageTotals] | None = None
+
+
+def enable_stage_profile() -> dict[str, StageTotals]:
+    """Start keeping totals per stage name, and return them (live)."""
+    global _profile  # noqa: PLW0603
+    _profile = {}
+    return _profile
+
+
+def disable_stage_profile() -> None:
+    global _profile  # noqa: PLW0603
+    _profile = None
+
+
+class Stage:
+    """Measurements of one stage, recorded by `record`.
+
+    Use `using_stage` or `accumulated_stage` rather than this class directly.
+    """
+
+    def __init__(self, name: str, attributes: dict[str, str]):
+        self.name = name
+        self.attributes = {"stage": name, **attributes}
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows: int = 0, nbytes: int = 0) -> None:
+        self.rows += rows
+        self.bytes += nbytes
+
+    @contextmanager
+    def timed(self) -> Iterator[None]:
+        """Count the time spent in the block towards this stage."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - t0
+
+    def record(self, calls: int = 1) -> None:
+        _duration.record(self.seconds, self.attributes)
+        if self.rows:
+            _rows.add(self.rows, self.attributes)
+        if self.bytes:
+            _bytes.add(self.bytes, self.attributes)
+        if _profile is not None:
+            totals = _profile.setdefault(self.name, StageTotals())
+            totals.calls += calls
+            totals.seconds += self.seconds
+            totals.rows += self.rows
+            totals.bytes += self.bytes
+
+
+@contextmanager
+def using_stage(name: str, **attributes: str) -> Iterator[Stage]:
+    """Time the block as one call of stage `name`.
+
+    The block reports what it handled with ``stage.add(rows=..., nbytes=...)``.
+    The measurements are recorded even if the block raises.
+    """
+    stage = Stage(name, attributes)
+    try:
+        with stage.timed():
+            yield stage
+    finally:
+        stage.record()
+
+
+@contextmanager
+def accumulated_stage(name: str, **attributes: str) -> Iterator[Stage]:
+    """Stage whose work is spread over the block, e.g. interleaved in a loop.
+
+    Only the parts of the block wrapped in ``stage.timed()`` count, and they are
+    recorded as a single call when the block exits.
+    """
+    stage = Stage(name, attributes)
+    try:
+        yield stage
+    finally:
+        stage.record()
+
+
+def _size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
+
+def format_stage_profile(totals: dict[str, StageTotals], wall_seconds: float) -> str:
+    """Table of the time and volume of each stage, slowest first."""
+    lines = [
+        f"{'stage':<24} {'calls':>7} {'seconds':>9} {'wall %':>7}"
+        f" {'rows':>10} {'bytes':>11} {'rows/s':>10}"
+    ]
+    for name, t in sorted(totals.items(), key=lambda item: -item[1].seconds):
+        share = 100 * t.seconds / wall_seconds if wall_seconds > 0 else 0.0
+        rate = f"{t.rows / t.seconds:.0f}" if t.rows and t.seconds > 0 else "-"
+        lines.append(
+            f"{name:<24} {t.calls:>7} {t.seconds:>9.3f} {share:>6.1f}%"
+            f" {t.rows or '-':>10} {_size(t.bytes) if t.bytes else '-':>11}"
+            f" {rate:>10}"
+        )
+    lines.append(f"{'wall time':<24} {'':>7} {wall_seconds:>9.3f}")
+    return "\n".join(lines)
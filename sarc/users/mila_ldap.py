@@ -84,7 +84,8 @@ from datetime import datetime
 from pathlib import Path
 
 from ldap3 import ALL_ATTRIBUTES, SUBTREE, Connection, Server, Tls
-from sqlmodel import func, select
+from sqlalchemy import ARRAY, String, any_, bindparam
+from sqlmodel import col, func, select
 
 from sarc.config import PrivateKeyInfo, config
 from sarc.db.users import CredentialsDB
@@ -123,36 +124,46 @@ class MilaLDAPScraper(UserScraper[MilaLDAPConfig]):
         displayName[0] -> display_name
         suspended[0]   -> status  (as string "enabled" or "disabled")
         """
-        with config.db.session() as s:
-            for user_raw in json.loads(data.decode()):
-                creds = Credentials()
-                if user_raw["suspended"][0] != "true":
-                    creds.insert(user_raw["posixUid"][0], start=cache_time)
-                # different behavior depending on current state in the db
-                elif s.exec(
-                    select(
-                        select(CredentialsDB)
-                        .where(
-                            CredentialsDB.domain == "mila",
-                            CredentialsDB.username == user_raw["posixUid"][0],
-                            func.upper_inf(CredentialsDB.valid),
-                        )
-                        .exists()
-                    )
-                ).one():
-                    # if the user already exists, it ends now
-                    creds.insert(
-                        user_raw["posixUid"][0], start=cache_time, end=cache_time
-                    )
-                if creds.values != []:
-                    yield UserMatch(
-                        display_name=user_raw["displayName"][0],
-                        email=user_raw["mail"][0].lower(),
-                        matching_id=MatchID(
-                            name="mila_ldap", mid=user_raw["mail"][0].lower()
-                        ),
-                        associated_accounts={"mila": creds},
-                    )
+        users_raw = json.loads(data.decode())
+        # Suspended users only get their credentials ended if they are still
+        # open in the database.
+        open_suspended = _open_credentials(
+            [u["posixUid"][0] for u in users_raw if u["suspended"][0] == "true"]
+        )
+        for user_raw in users_raw:
+            username = user_raw["posixUid"][0]
+            creds = Credentials()
+            if user_raw["suspended"][0] != "true":
+                creds.insert(username, start=cache_time)
+            elif username in open_suspended:
+                # if the user already exists, it ends now
+                creds.insert(username, start=cache_time, end=cache_time)
+            if creds.values != []:
+                yield UserMatch(
+                    display_name=user_raw["displayName"][0],
+                    email=user_raw["mail"][0].lower(),
+                    matching_id=MatchID(
+                        name="mila_ldap", mid=user_raw["mail"][0].lower()
+                    ),
+                    associated_accounts={"mila": creds},
+                )
+
+
+def _open_credentials(usernames: list[str]) -> set[str]:
+    """Usernames among `usernames` with open-ended mila credentials."""
+    if not usernames:
+        return set()
+    with config.db.session() as s:
+        return set(
+            s.exec(
+                select(CredentialsDB.username).where(
+                    CredentialsDB.domain == "mila",
+                    col(CredentialsDB.username)
+                    == any_(bindparam("usernames", usernames, type_=ARRAY(String))),
+                    func.upper_inf(CredentialsDB.valid),
+                )
+            )
+        )
 
 
 _builtin_scrapers["mila_ldap"] = MilaLDAPScraper()
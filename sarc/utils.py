@@ -1,7 +1,8 @@
 from datetime import UTC, datetime
-from typing import Any, Mapping
+from typing import TYPE_CHECKING, Any, Mapping
 
-from fabric import Connection
+if TYPE_CHECKING:
+    from fabric import Connection
 
 
 def flatten(d: Mapping[str, Any]) -> dict[str, Any]:
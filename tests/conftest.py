@@ -47,6 +47,13 @@ def base_config(test_config_path):
         yield
 
 
+@pytest.fixture(autouse=True)
+def clear_cluster_timelines():
+    """Tests use many databases, whose clusters share the same IDs."""
+    yield
+    SlurmClusterDB.clear_timelines()
+
+
 @pytest.fixture(scope="session")
 def base_config_with_logging():
     """To be used where config.logging is required"""
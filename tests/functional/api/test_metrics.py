@@ -9,6 +9,7 @@ import math
 import re
 from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
+from urllib.parse import urlencode
 
 import pytest
 from fastapi.testclient import TestClient
@@ -443,6 +444,9 @@ def test_job_times_with_data(dash_client):
     assert data["total_jobs"] > 0
     for grid in (data["elapsed_vs_limit"], data["wait_vs_limit"]):
         assert grid.keys() >= {"x", "y", "z", "total"}
+        # Both grids count every job once, from the same grouped statement.
+        assert grid["total"] == data["total_jobs"]
+        assert sum(map(sum, grid["z"])) == data["total_jobs"]
 
 
 def test_jobs_table_with_data(dash_client, dash_db):
@@ -1686,3 +1690,77 @@ def test_view_as_storage_key_is_distinct(app):
     user_direct = _storage_key(app.client(_USER))
 
     assert len({admin_own, admin_as_user, user_direct}) == 3
+
+
+# === Batch ==================================================================
+
+# Panels of /metrics/batch, with parameters of their own.
+_BATCH_PANELS = [
+    ("job_counts", {"period": "d", "submitted": "true"}),
+    ("metric_distribution", {"metric": "gpu_utilization"}),
+    ("metric_comparison", {}),
+    ("rgu_usage", {"whole": "true"}),
+    ("rgu_by_cluster", {}),
+    ("jobs", {"limit": "2", "sort_by": "waste"}),
+]
+
+
+def test_batch_matches_the_endpoints(dash_client, dash_db):
+    """Each panel of a batch is what its endpoint returns for the same
+    parameters, shared or its own."""
+    panels = [
+        f"{name}?{urlencode(params)}" if params else name
+        for name, params in _BATCH_PANELS
+    ]
+    batch = dash_client.get(
+        "/dash/metrics/batch", params={**WINDOW, "panels": panels}
+    ).json()
+    assert batch.keys() == {name for name, _ in _BATCH_PANELS}
+    for name, params in _BATCH_PANELS:
+        alone = dash_client.get(
+            f"/dash/metrics/{name}", params={**WINDOW, **params}
+        ).json()
+        assert batch[name] == alone, name
+
+
+@pytest.mark.usefixtures("read_only_db")
+def test_batch_panel_parameters_override_the_shared_ones(dash_client):
+    batch = dash_client.get(
+        "/dash/metrics/batch",
+        params={
+            "start": "2023-02-15",
+            "end": "2023-02-15",
+            "panels": ["job_counts", f"jobs?{urlencode(WINDOW)}"],
+        },
+    ).json()
+    assert batch["job_counts"] == []
+    assert batch["jobs"]["total"] > 0
+
+
+@pytest.mark.usefixtures("read_only_db")
+@pytest.mark.parametrize(
+    "panel",
+    [
+        "unknown",
+        "jobs?bogus=1",
+        "jobs?limit=0",
+        f"jobs?as_user={_OTHER_USER}",
+        # Slow panels load on their own.
+        "job_times_vs_limit",
+        "metric_trend",
+        "rgu_by_user",
+    ],
+)
+def test_batch_rejects_invalid_panels(dash_client, panel):
+    dash_client.get(
+        "/dash/metrics/batch", params={**WINDOW, "panels": [panel]}, expect_status=422
+    )
+
+
+@pytest.mark.usefixtures("read_only_db")
+def test_batch_as_user_forbidden_for_non_admin(app):
+    app.client(_USER).get(
+        "/dash/metrics/batch",
+        params={**WINDOW, "as_user": _OTHER_USER, "panels": ["job_counts"]},
+        expect_status=403,
+    )
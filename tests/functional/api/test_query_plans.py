@@ -0,0 +1,275 @@
+"""Query-plan regression tests for the ``/dash`` and ``/v0`` endpoints.
+
+Every SELECT an endpoint runs is EXPLAINed on the request's own connection,
+just before it executes, so the plan is the one the planner picks in the
+request's transaction (``join_collapse_limit`` included). A plan fails when it:
+
+- reads ``slurm_jobs`` or ``jobstatisticdb`` with a sequential scan;
+- reads one of them through a scan costing more than COST_BUDGET times its
+  sequential scan, i.e. does not use the window to narrow its reads;
+- does not use the indexes its endpoint is meant to use.
+
+The database holds a few years of synthetic jobs while the queried windows
+are one week, and sequential scans and parallel plans are disabled: on a
+test-sized table the planner would often prefer reading everything, or a
+parallel scan of a whole index, even with a perfectly good index. What is
+checked is that an index *can* serve each query shape, which is what breaks
+when an index, the view or a predicate the partial index relies on changes.
+"""
+
+import json
+import random
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import col, select
+
+from sarc.config import UTC, config
+from sarc.db.cluster import SlurmClusterDB
+from sarc.db.job import JobStatisticDB, SlurmJobDB, SlurmState
+from sarc.db.support import GpuRguDB
+from sarc.db.users import UserDB
+from tests.conftest import DbConfiguration, custom_db_config
+
+# Relations that must never be read whole.
+_LARGE_RELATIONS = {"slurm_jobs", "jobstatisticdb"}
+
+# A scan of one of _LARGE_RELATIONS may cost at most this many sequential scans
+# of it. The windows hold a few percent of the jobs, so a scan costing about as
+# much as reading everything does not use its window to narrow its reads. Only
+# the scans are bounded: the cost of the rest of a plan is not about its reads.
+COST_BUDGET = 1.0
+
+_N_JOBS = 10_000
+_FIRST_SUBMIT = datetime(2021, 1, 1, tzinfo=UTC)
+_SUBMIT_SPAN = timedelta(days=1000)
+_GPU = "PLAN-TEST-GPU"
+_STATS = ("gpu_sm_occupancy", "gpu_utilization", "gpu_memory", "system_memory")
+
+# The jobs are submitted from 2021-01-01 to 2023-09-28. /dash selects the runs
+# that end after the window starts, so the last weeks are the narrow ones, while
+# /v0 bounds submit_time from above only, so for it the first weeks are.
+_WINDOW = {"start": "2023-09-01", "end": "2023-09-08"}
+_WINDOW_V0 = {"start": "2021-01-10T00:00Z", "end": "2021-01-17T00:00Z"}
+
+_SUBMIT = "ix_slurm_jobs_submit"
+_END_GPU = "ix_slurm_jobs_end_gpu"
+_STATS_INDEX = "ix_jobstatisticdb_name_job_covering"
+
+# (path, params, indexes that the endpoint's plans must use between them)
+_QUERY_SHAPES = [
+    ("/dash/metrics/job_counts", _WINDOW, {_END_GPU}),
+    ("/dash/metrics/job_counts", {**_WINDOW, "submitted": "true"}, {_SUBMIT}),
+    ("/dash/metrics/job_times_vs_limit", _WINDOW, {_SUBMIT}),
+    ("/dash/metrics/metric_distribution", _WINDOW, {_END_GPU, _STATS_INDEX}),
+    ("/dash/metrics/metric_comparison", _WINDOW, {_END_GPU, _STATS_INDEX}),
+    ("/dash/metrics/rgu_usage", _WINDOW, {_END_GPU, _STATS_INDEX}),
+    ("/dash/metrics/rgu_by_cluster", _WINDOW, {_END_GPU}),
+    ("/dash/metrics/metric_trend", _WINDOW, {_END_GPU, _STATS_INDEX}),
+    ("/dash/metrics/rgu_by_user", _WINDOW, {_END_GPU, _STATS_INDEX}),
+    ("/dash/metrics/jobs", _WINDOW, {_END_GPU}),
+    (
+        "/dash/metrics/jobs",
+        {**_WINDOW, "cluster_user": "planuser1", "sort_by": "waste"},
+        {_END_GPU},
+    ),
+    ("/v0/job/query", _WINDOW_V0, {_SUBMIT}),
+    ("/v0/job/query", {**_WINDOW_V0, "cluster_name": "raisin"}, {_SUBMIT}),
+    ("/v0/job/count", _WINDOW_V0, {_SUBMIT}),
+    ("/v0/job/series", _WINDOW_V0, {_SUBMIT, _STATS_INDEX}),
+    (
+        "/v0/job/series",
+        {**_WINDOW_V0, "extra_fields": "rgu,gpu_sm_occupancy_mean,gpu_memory_max"},
+        {_SUBMIT, _STATS_INDEX},
+    ),
+]
+
+
+def _plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+@contextmanager
+def explained_queries(engine) -> Iterator[list[tuple[str, dict]]]:
+    """Collect (statement, plan) for every SELECT run on `engine` in the block."""
+    plans: list[tuple[str, dict]] = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().lower().startswith(("select", "with")):
+            return
+        explain_cursor = conn.connection.cursor()
+        try:
+            explain_cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            (result,) = explain_cursor.fetchone()
+        finally:
+            explain_cursor.close()
+        if isinstance(result, str):
+            result = json.loads(result)
+        plans.append((statement, result[0]["Plan"]))
+
+    event.listen(engine, "before_cursor_execute", explain)
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+
+
+def _seed(sess) -> None:
+    """Years of GPU and CPU jobs, with statistics for the GPU ones."""
+    rng = random.Random(0)
+    sess.add(GpuRguDB(name=_GPU, rgu=4.0, drac_rgu=4.0))
+    sess.flush()
+    cluster_ids = sess.exec(select(SlurmClusterDB.id)).all()
+    user_ids = sess.exec(select(UserDB.id)).all()
+
+    jobs = []
+    for i in range(_N_JOBS):
+        submit = _FIRST_SUBMIT + _SUBMIT_SPAN * i / _N_JOBS
+        start = submit + timedelta(seconds=rng.randint(0, 3600))
+        elapsed = float(rng.randint(0, 2 * 86400))
+        gpus = rng.choice((0, 1, 1, 2, 4))
+        user = rng.randrange(len(user_ids))
+        job = SlurmJobDB(
+            cluster_id=rng.choice(cluster_ids),
+            account="mila",
+            job_id=10_000_000 + i,
+            name=f"job-{i}",
+            cluster_user=f"planuser{user}",
+            group=f"planuser{user}",
+            job_state=rng.choice(list(SlurmState)),
+            partition="long",
+            nodes=["cn-c021"],
+            work_dir="/network/scratch",
+            submit_line=None,
+            time_limit=2 * 86400,
+            submit_time=submit,
+            start_time=start,
+            end_time=start + timedelta(seconds=elapsed),
+            elapsed_time=elapsed,
+            allocated_cpu=4,
+            allocated_mem=16384,
+            allocated_gres_gpu=gpus,
+            allocated_gpu_type=_GPU if gpus else None,
+            harmonized_gpu_type=_GPU if gpus else None,
+            sarc_user_id=user_ids[user],
+        )
+        jobs.append(job.model_dump(exclude={"id"}))
+    for i in range(0, len(jobs), 500):
+        sess.exec(pg_insert(SlurmJobDB).values(jobs[i : i + 500]))
+
+    gpu_job_ids = sess.exec(
+        select(SlurmJobDB.id).where(col(SlurmJobDB.allocated_gres_gpu) > 0)
+    ).all()
+    stats = [
+        {
+            "job_id": job_id,
+            "name": name,
+            "mean": (value := rng.random()),
+            "std": 0.0,
+            "q05": value,
+            "q25": value,
+            "median": value,
+            "q75": value,
+            "max": value,
+        }
+        for job_id in gpu_job_ids
+        for name in _STATS
+    ]
+    for i in range(0, len(stats), 2000):
+        sess.exec(pg_insert(JobStatisticDB).values(stats[i : i + 2000]))
+
+
+plans_db_config_object = DbConfiguration("plans", read_only=True).fixture()
+
+
+@pytest.fixture(scope="module")
+def plans_db(plans_db_config_object):
+    """Seeded and analyzed database, with sequential scans and parallel plans
+    disabled.
+
+    Returns the cost of sequentially scanning each of _LARGE_RELATIONS, the
+    units of COST_BUDGET.
+    """
+    with custom_db_config(plans_db_config_object):
+        with config.db.session() as sess:
+            _seed(sess)
+            sess.commit()
+        with config.db.engine.execution_options(
+            isolation_level="AUTOCOMMIT"
+        ).connect() as conn:
+            conn.execute(text("VACUUM ANALYZE"))
+            seq_scan_costs = {}
+            for relation in sorted(_LARGE_RELATIONS):
+                (result,) = conn.execute(
+                    text(f"EXPLAIN (FORMAT JSON) SELECT * FROM {relation}")
+                ).one()
+                if isinstance(result, str):
+                    result = json.loads(result)
+                seq_scan_costs[relation] = result[0]["Plan"]["Total Cost"]
+            for setting in (
+                "enable_seqscan = off",
+                "max_parallel_workers_per_gather = 0",
+            ):
+                conn.execute(
+                    text(f'ALTER DATABASE "{plans_db_config_object}" SET {setting}')
+                )
+        # New connections pick up the database setting.
+        config.db.engine.dispose()
+    yield seq_scan_costs
+
+
+@pytest.fixture
+def plans_client(plans_db, plans_db_config_object, app):
+    with custom_db_config(plans_db_config_object):
+        # As admin, the widest scope.
+        yield app.client("admin@admin.admin")
+
+
+@pytest.mark.parametrize(
+    "path,params,expected_indexes",
+    _QUERY_SHAPES,
+    ids=[f"{path}-{i}" for i, (path, _, _) in enumerate(_QUERY_SHAPES)],
+)
+def test_query_plan(plans_client, plans_db, path, params, expected_indexes):
+    seq_scan_costs = plans_db
+    with explained_queries(config.db.engine) as plans:
+        response = plans_client.get(path, params=params)
+    assert response.status_code == 200, response.text
+    assert plans, f"{path} ran no query"
+
+    used_indexes = set()
+    for statement, plan in plans:
+        nodes = list(_plan_nodes(plan))
+        seq_scans = {
+            node["Relation Name"]
+            for node in nodes
+            if node["Node Type"] == "Seq Scan"
+            and node.get("Relation Name") in _LARGE_RELATIONS
+        }
+        assert not seq_scans, (
+            f"sequential scan of {sorted(seq_scans)} in:\n{statement}\n"
+            f"{json.dumps(plan, indent=2)}"
+        )
+        for node in nodes:
+            relation = node.get("Relation Name")
+            if relation not in _LARGE_RELATIONS:
+                continue
+            budget = COST_BUDGET * seq_scan_costs[relation]
+            assert node["Total Cost"] <= budget, (
+                f"{node['Node Type']} of {relation} costs {node['Total Cost']}, "
+                f"over budget ({budget}) in:\n{statement}\n"
+                f"{json.dumps(plan, indent=2)}"
+            )
+        used_indexes.update(
+            node["Index Name"] for node in nodes if "Index Name" in node
+        )
+
+    assert expected_indexes <= used_indexes, (
+        f"{path} does not use {sorted(expected_indexes - used_indexes)}"
+    )
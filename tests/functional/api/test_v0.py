@@ -1,10 +1,18 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
+import gifnoc
 import pytest
+from fastapi import HTTPException
 from pydantic import ValidationError
-from sqlalchemy.exc import ProgrammingError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, ProgrammingError
 
 from sarc.alerts.common import HealthCheck
+from sarc.api.metrics import _session as dash_session
+from sarc.api.v0 import cancel_on_disconnect, query_session
 from sarc.config import UTC
 from sarc.db.healthcheck import HealthCheckStateDB
 from sarc.models.api import JobSeriesList, SlurmJobList, UserList
@@ -741,3 +749,70 @@ def test_health_list_with_error_trace(empty_read_write_db, client):
     assert frame["filename"].endswith("definitions.py")
     assert frame["code"] == 'raise ValueError("What a beastly number")'
     assert isinstance(frame["line"], int)
+
+
+def _run_in(gen, sess, sql):
+    """Run `sql` in `sess`, from the `query_session` generator `gen`, like a handler."""
+    try:
+        sess.exec(text(sql))
+    except DBAPIError as e:
+        gen.throw(e)
+    gen.close()
+
+
+@pytest.mark.usefixtures("read_only_db")
+def test_query_session_statement_timeout():
+    gen = query_session(statement_timeout=50)
+    with pytest.raises(HTTPException) as exc_info:
+        _run_in(gen, next(gen), "SELECT pg_sleep(1)")
+    assert exc_info.value.status_code == 503
+
+
+@pytest.mark.usefixtures("read_only_db")
+def test_query_session_settings_are_local():
+    gen = query_session(join_collapse_limit=3)
+    sess = next(gen)
+    assert sess.exec(text("SHOW join_collapse_limit")).one() == ("3",)
+    assert sess.exec(text("SHOW statement_timeout")).one() == ("0",)
+    pid = sess.exec(text("SELECT pg_backend_pid()")).one()[0]
+    assert sess.info["backend_pid"] == pid
+    sess.rollback()
+    assert sess.exec(text("SHOW join_collapse_limit")).one() == ("8",)
+    gen.close()
+
+
+@pytest.mark.usefixtures("read_only_db")
+@pytest.mark.parametrize(("timeout", "expected"), [("0s", "0"), ("50ms", "50ms")])
+def test_dash_session_statement_timeout(timeout, expected):
+    # Only the /dash sessions are bounded by the configured timeout.
+    with gifnoc.overlay({"sarc.server.statement_timeout": timeout}):
+        dash = dash_session()
+        assert next(dash).exec(text("SHOW statement_timeout")).one() == (expected,)
+        dash.close()
+        v0 = query_session()
+        assert next(v0).exec(text("SHOW statement_timeout")).one() == ("0",)
+        v0.close()
+
+
+@pytest.mark.usefixtures("read_only_db")
+def test_cancel_on_disconnect():
+    start = time.monotonic()
+
+    async def is_disconnected():
+        # Once the query has started.
+        return time.monotonic() - start > 0.5
+
+    gone = SimpleNamespace(
+        url=SimpleNamespace(path="/gone"), is_disconnected=is_disconnected
+    )
+
+    async def handle():
+        gen = query_session()
+        sess = next(gen)
+        async with cancel_on_disconnect(gone, sess):
+            await asyncio.to_thread(_run_in, gen, sess, "SELECT pg_sleep(10)")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(handle())
+    assert exc_info.value.status_code == 503
+    assert time.monotonic() - start < 5
@@ -109,6 +109,35 @@ def test_single_harmonized_name(jobless_read_write_db):
     assert _count_rgu(sess) == nb_rgu_before
 
 
+def test_jobs_of_same_nodes_updated_together(jobless_read_write_db, caplog):
+    """Jobs sharing cluster, nodes and GPU type are harmonized by the same update."""
+    sess = jobless_read_write_db
+    cluster, user = _cluster_and_user(sess)
+    _add_rgu(sess, GPU_C018, 10.0)
+    _add_rgu(sess, GPU_C019, 10.0)
+    jobs = [
+        _add_gpu_job(
+            sess, cluster, user, gpu_type="asupergpu", nodes=nodes, job_id=job_id
+        )
+        for job_id, nodes in enumerate(
+            [["cn-c018"], ["cn-c018"], ["cn-c019"], ["cn-c018"]], start=1
+        )
+    ]
+    sess.commit()
+    jids = [job.id for job in jobs]
+
+    with caplog.at_level(logging.INFO):
+        assert fix_gpu_types(sess) == 4
+
+    assert [sess.get(SlurmJobDB, jid).harmonized_gpu_type for jid in jids] == [
+        GPU_C018,
+        GPU_C018,
+        GPU_C019,
+        GPU_C018,
+    ]
+    assert "Harmonized GPU names of 4 jobs" in caplog.text
+
+
 def test_compound_name_when_same_rgu(jobless_read_write_db):
     """Many names with same RGU -> compound name + new GpuRguDB row."""
     sess = jobless_read_write_db
@@ -21,6 +21,7 @@ import time_machine
 from sqlmodel import select
 
 from sarc.config import config
+from sarc.db.cluster import SlurmClusterDB
 from sarc.db.job import SlurmJobDB
 from sarc.models.job import SlurmState
 from tests.functional.common import MOCK_TIME
@@ -124,3 +125,66 @@ def test_check_old_running_jobs_with_resubmitted(
 
     assert cli_main(["health", "run", "--check", check_name]) == 0
     assert _get_error_logs(caplog.text) == expected
+
+
+def _seed_story(sess, base_job: SlurmJobDB, job_id: int, entries, cluster_id=None):
+    """Add entries of a job: (hours after 2023-06-01, state) for each."""
+    t0 = datetime(2023, 6, 1, tzinfo=UTC)
+    for hours, state in entries:
+        submit_time = t0 + timedelta(hours=hours)
+        job_data = base_job.model_dump()
+        job_data.update(
+            id=None,
+            job_id=job_id,
+            cluster_id=cluster_id or base_job.cluster_id,
+            job_state=state,
+            submit_time=submit_time,
+            start_time=submit_time,
+            end_time=None if state == SlurmState.RUNNING else submit_time,
+            time_limit=3600,
+        )
+        sess.add(SlurmJobDB.model_validate(job_data))
+
+
+@time_machine.travel(MOCK_TIME, tick=False)
+@pytest.mark.usefixtures("read_write_db", "health_config")
+def test_check_old_running_jobs_resubmission_histories(caplog, cli_main):
+    R, C, F = SlurmState.RUNNING, SlurmState.COMPLETED, SlurmState.FAILED
+    with config.db.session() as sess:
+        (base_job,) = sess.exec(
+            select(SlurmJobDB).where(SlurmJobDB.job_state == R)
+        ).all()
+        other_cluster_id = sess.exec(
+            select(SlurmClusterDB.id).where(SlurmClusterDB.id != base_job.cluster_id)
+        ).first()
+        # Re-submitted, then completed.
+        _seed_story(sess, base_job, 9001, [(0, R), (1, C)])
+        # Two stale RUNNING entries of a same job, which then failed.
+        _seed_story(sess, base_job, 9002, [(0, R), (1, R), (2, F)])
+        # Never re-submitted: the same job ID on another cluster is another job.
+        _seed_story(sess, base_job, 9003, [(0, R)])
+        _seed_story(sess, base_job, 9003, [(5, C)], cluster_id=other_cluster_id)
+        # Completed after some entries which are not RUNNING.
+        _seed_story(sess, base_job, 9004, [(0, F), (1, R), (2, C)])
+        # Still within its time limit: not counted, even if re-submitted.
+        job_data = base_job.model_dump()
+        job_data.update(
+            id=None,
+            job_id=9005,
+            submit_time=MOCK_TIME - timedelta(minutes=30),
+            start_time=MOCK_TIME - timedelta(minutes=20),
+            time_limit=3600,
+        )
+        sess.add(SlurmJobDB.model_validate(job_data))
+        _seed_story(sess, base_job, 9005, [(0, C)])
+        sess.commit()
+
+    assert cli_main(["health", "run", "--check", "old_running_jobs_all"]) == 0
+    # Job 7 of the test database is not re-submitted either.
+    assert _get_error_logs(caplog.text) == [
+        "Found 6 RUNNING job entries which should have already finished, "
+        "distributed in 5 jobs (cluster name + job ID), "
+        "from which 2 not re-submitted, "
+        "2 with a latest entry COMPLETED, 1 with a latest entry FAILED",
+        "[old_running_jobs_all] FAILURE: old_running_jobs_all",
+    ]
@@ -0,0 +1,98 @@
+"""
+Test the job window shared by the SQL-based health checks.
+
+Checks run together read their jobs from the shared window. They must find
+the same problems as when each of them is run alone and reads `slurm_jobs`.
+"""
+
+import functools
+from datetime import UTC, datetime, timedelta
+
+import pytest
+import time_machine
+from sqlalchemy import text
+
+from sarc.alerts.usage_alerts.gpu_usage import NodeGpuUsageCheck
+from sarc.alerts.usage_alerts.gpu_util_per_user import GpuUtilPerUserCheck
+from sarc.alerts.usage_alerts.job_window import job_window_interval, shared_job_window
+from sarc.alerts.usage_alerts.same_job_id import SameJobIdCheck
+from sarc.config import config
+from tests.functional.common import _get_warnings
+
+get_warnings = functools.partial(
+    _get_warnings,
+    modules=[
+        "sarc.alerts.usage_alerts.gpu_usage:gpu_usage.py",
+        "sarc.alerts.usage_alerts.gpu_util_per_user:gpu_util_per_user.py",
+        "sarc.alerts.usage_alerts.same_job_id:same_job_id.py",
+        "sarc.alerts.usage_alerts.prometheus_stats_occurrences:prometheus_stats_occurrences.py",
+    ],
+)
+
+# Checks of [now - time_interval, now], with default intervals of 24 hours and 7 days.
+CHECKS = [
+    "node_gpu_usage_6",
+    "gpu_util_per_user_0",
+    "same_job_id_default",
+    "prometheus_cpu_stat_0",
+    "prometheus_gpu_stat_default",
+]
+
+# Close to the jobs of the test database, so that the windows are not empty.
+WINDOW_TIME = datetime(2023, 2, 20, tzinfo=UTC)
+
+
+@time_machine.travel(WINDOW_TIME, tick=False)
+@pytest.mark.usefixtures("read_only_db", "health_config")
+def test_shared_window_same_results(caplog, cli_main):
+    expected = []
+    for check_name in CHECKS:
+        caplog.clear()
+        assert cli_main(["health", "run", "--check", check_name]) == 0
+        expected.extend(get_warnings(caplog.text))
+    assert expected
+
+    caplog.clear()
+    assert cli_main(["health", "run", "--check", *CHECKS]) == 0
+    assert sorted(get_warnings(caplog.text)) == sorted(expected)
+
+
+def test_job_window_interval():
+    gpu_usage = NodeGpuUsageCheck(active=True, gpu_type="A100")
+    gpu_util = GpuUtilPerUserCheck(active=True, threshold=timedelta(hours=1))
+    all_jobs = GpuUtilPerUserCheck(active=True, time_interval=None)
+    since = SameJobIdCheck(active=True, since=datetime(2023, 2, 18, tzinfo=UTC))
+
+    assert job_window_interval([gpu_usage, gpu_util]) == timedelta(days=7)
+    # Not worth it for a single check.
+    assert job_window_interval([gpu_usage]) is None
+    assert job_window_interval([gpu_usage, all_jobs, since]) is None
+
+
+def _window_tables():
+    with config.db.session() as sess:
+        return (
+            sess.execute(
+                text(
+                    "SELECT tablename FROM pg_tables"
+                    " WHERE starts_with(tablename, 'health_job_window_')"
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+
+@time_machine.travel(WINDOW_TIME, tick=False)
+@pytest.mark.usefixtures("read_write_db")
+def test_shared_window_dropped():
+    # Left behind by a run two days before.
+    left_behind = f"health_job_window_{int(WINDOW_TIME.timestamp()) - 2 * 86400}_0"
+    with config.db.session() as sess:
+        sess.execute(text(f"CREATE UNLOGGED TABLE {left_behind} (id int)"))
+        sess.commit()
+
+    with shared_job_window(timedelta(days=1)) as window:
+        assert window is not None
+        assert _window_tables() == [window.table.name]
+    assert _window_tables() == []
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 
+from sqlalchemy import text
+
 from sarc.alerts.common import CheckResult, HealthCheck
+from sarc.config import config
 
 
 @dataclass
@@ -37,3 +40,27 @@ class LetterCheck(HealthCheck):
             return self.fail
         else:
             raise ValueError("I DO NOT KNOW THIS LETTER")
+
+
+@dataclass
+class WaitCheck(HealthCheck):
+    """OK once `barrier` is passed by as many checks as it has parties."""
+
+    wait: float = 5.0
+
+    barrier = None
+
+    def check(self):
+        type(self).barrier.wait(timeout=self.wait)
+        return self.ok
+
+
+class StatementTimeoutCheck(HealthCheck):
+    """OK, and records the statement timeout of its database session."""
+
+    seen = None
+
+    def check(self):
+        with config.db.session() as sess:
+            type(self).seen = sess.execute(text("SHOW statement_timeout")).scalar_one()
+        return self.ok
@@ -1,10 +1,17 @@
 import logging
 import re
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 import pytest
 
+from sarc.alerts.common import CheckStatus
+from sarc.cli.health.run import _DaemonRunner, dependency_levels, run_checks
 from sarc.db.healthcheck import HealthCheckStateDB
 
+from .definitions import BeanCheck, StatementTimeoutCheck, WaitCheck
+
 
 @pytest.mark.usefixtures("empty_read_write_db")
 def test_list_empty(beans_config, cli_main, capsys, caplog):
@@ -162,3 +169,77 @@ def test_run_check_with_param_and_dep_wrong_order(
         assert re.search(
             r"INFO +.+Check complete: 2 checks run, 0 skipped", caplog.text
         )
+
+
+def test_dependency_levels():
+    checks = {
+        "a": BeanCheck(active=True, name="a"),
+        "b": BeanCheck(active=True, name="b", depends=["a"]),
+        "c": BeanCheck(active=True, name="c"),
+        "d": BeanCheck(active=True, name="d", depends=["b", "c"]),
+        # Dependency after it: looked up in the database, like in a serial run.
+        "e": BeanCheck(active=True, name="e", depends=["f"]),
+        "f": BeanCheck(active=True, name="f"),
+    }
+    assert dependency_levels(checks) == [["a", "c", "e", "f"], ["b"], ["d"]]
+
+
+def test_run_checks_level_concurrently(frozen_gifnoc_time):
+    WaitCheck.barrier = threading.Barrier(2)
+    checks = {
+        "w1": WaitCheck(active=True, name="w1"),
+        "w2": WaitCheck(active=True, name="w2"),
+        "after": BeanCheck(active=True, name="after", beans=20, depends=["w1"]),
+    }
+    # Each WaitCheck only passes if the other one runs at the same time.
+    outcomes = run_checks(checks, lambda dep: None, max_workers=2)
+    assert {name: o.result.status for name, o in outcomes.items()} == {
+        "w1": CheckStatus.OK,
+        "w2": CheckStatus.OK,
+        "after": CheckStatus.OK,
+    }
+
+
+def test_run_checks_skips_on_failed_dependency():
+    checks = {
+        "evil": BeanCheck(active=True, name="evil", beans=666),
+        "many": BeanCheck(active=True, name="many", beans=20, depends=["evil"]),
+        "other": BeanCheck(active=True, name="other", beans=20, depends=["old"]),
+    }
+    outcomes = run_checks(checks, {"old": CheckStatus.OK}.get)
+    assert outcomes["evil"].result.status == CheckStatus.ERROR
+    assert outcomes["many"].result is None
+    assert outcomes["other"].result.status == CheckStatus.OK
+
+
+def test_run_checks_timeout():
+    WaitCheck.barrier = threading.Barrier(2)
+    checks = {"stuck": WaitCheck(active=True, name="stuck", wait=1.0)}
+    outcomes = run_checks(checks, lambda dep: None, timeout=0.1)
+    result = outcomes["stuck"].result
+    assert result.status == CheckStatus.ERROR
+    assert result.exception.type == "TimeoutError"
+
+
+def test_daemon_runner_abandon_frees_slot():
+    release = threading.Event()
+    runner = _DaemonRunner(max_workers=1)
+    stuck = runner.submit(release.wait)
+    while not stuck.running():
+        time.sleep(0.01)
+    after = runner.submit(lambda: "done")
+    with pytest.raises(FutureTimeoutError):
+        after.result(timeout=0.1)
+    runner.abandon(stuck)
+    assert after.result(timeout=1) == "done"
+    release.set()
+
+
+@pytest.mark.usefixtures("empty_read_write_db")
+@pytest.mark.parametrize(("timeout", "expected"), [(None, "0"), (2.5, "2500ms")])
+def test_run_checks_timeout_bounds_statements(timeout, expected):
+    StatementTimeoutCheck.seen = None
+    checks = {"st": StatementTimeoutCheck(active=True, name="st")}
+    outcomes = run_checks(checks, lambda dep: None, timeout=timeout)
+    assert outcomes["st"].result.status == CheckStatus.OK
+    assert StatementTimeoutCheck.seen == expected
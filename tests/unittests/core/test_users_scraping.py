@@ -9,9 +9,10 @@ from typing import Any
 from unittest.mock import patch
 
 import pytest
+from sqlmodel import func, select
 
 from sarc.cache import Cache
-from sarc.db.users import UserDB
+from sarc.db.users import CredentialsDB, MemberTypeDB, UserDB
 from sarc.models.user import MemberType
 from sarc.scraping.users import (
     Credentials,
@@ -19,11 +20,14 @@ from sarc.scraping.users import (
     UserMatch,
     UserScraper,
     _builtin_scrapers,
+    changed_users,
     fetch_users,
     get_user_scraper,
     parse_ce,
     update_user,
     update_user_match,
+    update_users,
+    user_digest,
 )
 
 one_hour = timedelta(hours=1)
@@ -548,3 +552,106 @@ def test_parse_users_supervisor_ordering_before_fix(mock_get_scraper, read_write
     sups = u.supervisors.values_in_range(None, None)
     assert len(sups) == 1
     assert len(sups[0]) == 1
+
+
+def _batch() -> list[UserMatch]:
+    student = UserMatch(
+        display_name="Alice Student",
+        email="alice@example.com",
+        matching_id=MatchID(name="plugin", mid="student1"),
+        associated_accounts={"drac": Credentials()},
+    )
+    student.associated_accounts["drac"].insert(
+        "alice", start=datetime(2024, 1, 1, tzinfo=UTC)
+    )
+    student.member_type.insert(
+        MemberType.MASTER_RESEARCH, start=datetime(2024, 1, 1, tzinfo=UTC)
+    )
+    student.supervisors.insert([MatchID(name="plugin", mid="supervisor1")])
+    supervisor = UserMatch(
+        display_name="Bob Supervisor",
+        email="bob@example.com",
+        matching_id=MatchID(name="plugin", mid="supervisor1"),
+    )
+    supervisor.member_type.insert(MemberType.PROFESSOR)
+    # The supervisor comes after the student in the batch.
+    return [student, supervisor]
+
+
+def test_update_users_batch(read_write_db):
+    sess = read_write_db
+
+    def count(model) -> int:
+        return sess.exec(select(func.count()).select_from(model)).one()
+
+    update_users(sess, _batch())
+    alice = UserDB.by_email(sess, "alice@example.com")
+    bob = UserDB.by_email(sess, "bob@example.com")
+    assert alice is not None and bob is not None
+    assert alice.matching_ids == {"plugin": "student1"}
+    assert alice.associated_accounts["drac"].get_value() == "alice"
+    assert alice.supervisors.get_value() == [bob.id]
+    assert bob.member_type.get_value() == MemberType.PROFESSOR
+    counts = count(CredentialsDB), count(MemberTypeDB)
+
+    # Nothing changed: nothing is written.
+    update_users(sess, _batch())
+    assert (count(CredentialsDB), count(MemberTypeDB)) == counts
+
+    # A new current value closes the previous one.
+    later = datetime(2025, 1, 1, tzinfo=UTC)
+    batch = _batch()
+    batch[0].member_type.insert(MemberType.PHD_STUDENT, start=later)
+    update_users(sess, batch)
+    assert alice.member_type.get_value(later - one_hour) == MemberType.MASTER_RESEARCH
+    assert alice.member_type.get_value(later) == MemberType.PHD_STUDENT
+
+
+def _ldap_user(entry_time: datetime, email: str = "alice@mila.quebec") -> UserMatch:
+    creds = Credentials()
+    creds.insert("alice", start=entry_time)
+    return UserMatch(
+        display_name="Alice",
+        email=email,
+        matching_id=MatchID(name="mila_ldap", mid="alice@mila.quebec"),
+        associated_accounts={"mila": creds},
+    )
+
+
+def test_user_digest_ignores_entry_time():
+    day1 = datetime(2025, 6, 1, tzinfo=UTC)
+    day2 = datetime(2025, 6, 2, tzinfo=UTC)
+    assert user_digest(_ldap_user(day1), day1) == user_digest(_ldap_user(day2), day2)
+    assert user_digest(_ldap_user(day1), day1) != user_digest(_ldap_user(day1), day2)
+    assert user_digest(_ldap_user(day1), day1) != user_digest(
+        _ldap_user(day1, email="alice@example.com"), day1
+    )
+
+
+def test_changed_users():
+    day1 = datetime(2025, 6, 1, tzinfo=UTC)
+    day2 = datetime(2025, 6, 2, tzinfo=UTC)
+    bob = UserMatch(
+        display_name="Bob",
+        email="bob@mila.quebec",
+        matching_id=MatchID(name="mila_ldap", mid="bob@mila.quebec"),
+    )
+    digests: dict[tuple[str, str], str] = {}
+
+    assert list(changed_users([_ldap_user(day1), bob], day1, digests)) == [
+        _ldap_user(day1),
+        bob,
+    ]
+    assert set(digests) == {
+        ("mila_ldap", "alice@mila.quebec"),
+        ("mila_ldap", "bob@mila.quebec"),
+    }
+    # Nothing changed.
+    assert list(changed_users([_ldap_user(day2), bob], day2, digests)) == []
+
+    # Alice changed and Bob is gone.
+    alice = _ldap_user(day2, email="alice@example.com")
+    assert list(changed_users([alice], day2, digests)) == [alice]
+    assert set(digests) == {("mila_ldap", "alice@mila.quebec")}
+    # Bob is new again when he comes back.
+    assert list(changed_users([alice, bob], day2, digests)) == [bob]
@@ -37,14 +37,37 @@ GPUS_PER_NODES = {
     ],
 )
 def test_harmonize_gpu(node, gpu_type, expected, gpus_per_nodes):
-    cluster = ClusterConfig(
+    cluster = _cluster(gpus_per_nodes)
+    assert cluster.harmonize_gpu(node, gpu_type) == expected
+    # Memoized
+    assert cluster.harmonize_gpu(node, gpu_type) == expected
+
+
+def _cluster(gpus_per_nodes) -> ClusterConfig:
+    return ClusterConfig(
         timezone="America/Montreal",
         gpus_per_nodes=gpus_per_nodes,
         host="test",
         private_key=PrivateKeyInfo(file=Path("tests/id_test"), password="12345"),
         user_domain="mydomain",
     )
-    assert cluster.harmonize_gpu(node, gpu_type) == expected
+
+
+def test_harmonize_gpu_table_matches_mapping():
+    cluster = _cluster(GPUS_PER_NODES)
+    gpu_types = {t for gpus in GPUS_PER_NODES.values() for t in gpus}
+    for node in ["node1", "node9", "node15", "node_mig20", "DoesNotExist", None]:
+        for gpu_type in [*gpu_types, "gpu:GPU2:1", "DoesNotExist"]:
+            assert cluster.harmonize_gpu(node, gpu_type) == cluster._resolve_gpu(
+                node, gpu_type
+            )
+
+
+def test_harmonize_gpu_unrecognized_mig():
+    cluster = _cluster({"node_mig": {"gpu3": "GPU 3", "badmig": f"{MIG_FLAG}gpu3"}})
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Unrecognized harmonized GPU type"):
+            cluster.harmonize_gpu("node_mig", "badmig")
 
 
 @pytest.mark.parametrize(
@@ -7,7 +7,11 @@ from sqlmodel import select
 
 from sarc.db.cluster import SlurmClusterDB
 from sarc.db.users import UserDB
-from sarc.notifications.usage import classify_cycle, get_underusers_usage
+from sarc.notifications.usage import (
+    classify_cycle,
+    classify_cycles,
+    get_underusers_usage,
+)
 from tests.unittests.notifications._factory import add_gpu_job
 
 # A single 14-day cycle (matches _CYCLE_LENGTH_WEEKS=2), so with
@@ -182,3 +186,46 @@ def test_utilization_ceiling_adjustment(classify_db):
     )
     assert below.wasted == pytest.approx(0.0, abs=1e-6)
     assert below.sm_occ_mean == pytest.approx(0.10)
+
+
+def test_classify_cycles_trailing_window(classify_db):
+    users = {
+        u.email.split("@")[0]: u.id for u in classify_db.exec(select(UserDB)).all()
+    }
+    mila_id = next(
+        c.id for c in classify_db.exec(select(SlurmClusterDB)).all() if c.name == "mila"
+    )
+    # bramin, previous cycle: wasted=4.8*25*0.80=96, ratio=0.80 but under the
+    # activity floor. Over 2 cycles, 336 + 96 = 432 clears the PA floor (400).
+    _job(
+        classify_db,
+        user_id=users["bramin"],
+        cluster_id=mila_id,
+        elapsed_h=25,
+        utilization=0.20,
+        job_id=90004,
+        end_offset_h=-24,
+    )
+    classify_db.commit()
+
+    current, previous = classify_cycles(
+        _CYCLE_END,
+        2,
+        min_waste_ratio=_MIN_WASTE_RATIO,
+        min_waste_rgu_hours=_MIN_WASTE_RGU_HOURS,
+        personalized_action_min_waste_rgu_hours=_PA_MIN_WASTE_RGU_HOURS,
+        recurrence_active_cycles=2,
+        cycle_length_weeks=_CYCLE_LENGTH_WEEKS,
+    )
+    # Each cycle reads as its own single-cycle classification.
+    assert current == _classify(recurrence_active_cycles=2)
+
+    current = {s.user_id: s for s in current}
+    assert current[users["bramin"]].isunderuser is True
+    assert current[users["bramin"]].flagged is True
+
+    (earlier,) = previous
+    assert earlier.user_id == users["bramin"]
+    assert earlier.wasted == pytest.approx(96.0)
+    assert earlier.isunderuser is False
+    assert earlier.flagged is False
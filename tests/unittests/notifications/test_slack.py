@@ -1,18 +1,21 @@
+import json
 import logging
 import ssl
-from unittest.mock import MagicMock, patch
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
 
 import pytest
+from slack_sdk.errors import SlackApiError
 
-from sarc.notifications.slack import MENTION_TOKEN, SendStatus, SlackClient
+from sarc.notifications.slack import MENTION_TOKEN, SendStatus, SlackClient, TokenBucket
 
 
 def _make_client(mock_web_client):
-    with patch("sarc.notifications.slack.SlackClient.__init__") as init:
-        init.return_value = None
-        client = SlackClient.__new__(SlackClient)
-        client._client = mock_web_client
-        return client
+    # WebClient construction makes no network calls; a fake token is fine.
+    client = SlackClient("xoxb-fake")
+    client._client = mock_web_client
+    return client
 
 
 # ── __init__ ──────────────────────────────────────────────────────────────────
@@ -269,3 +272,138 @@ def test_lookup_failures_log_at_error_level(caplog):
         client.dm_user("alice@example.com", "hi")
 
     assert any(r.levelno == logging.ERROR for r in caplog.records)
+
+
+# ── recipients cache ──────────────────────────────────────────────────────────
+
+
+def test_dm_user_caches_recipient():
+    web = MagicMock()
+    web.users_lookupByEmail.return_value = {"user": {"id": "U12345"}}
+    web.conversations_open.return_value = {"channel": {"id": "C99999"}}
+    client = _make_client(web)
+
+    client.dm_user("alice@example.com", "first")
+    client.dm_user("alice@example.com", "second")
+
+    web.users_lookupByEmail.assert_called_once()
+    web.conversations_open.assert_called_once()
+    assert web.chat_postMessage.call_count == 2
+    assert client.recipients == {"alice@example.com": ("U12345", "C99999")}
+
+
+def test_dm_user_stale_cached_recipient_is_looked_up_again():
+    web = MagicMock()
+    web.users_lookupByEmail.return_value = {"user": {"id": "U2"}}
+    web.conversations_open.return_value = {"channel": {"id": "C2"}}
+    web.chat_postMessage.side_effect = [
+        SlackApiError("channel_not_found", {"ok": False, "error": "channel_not_found"}),
+        {"ts": "1"},
+    ]
+    client = _make_client(web)
+    client.recipients = {"alice@example.com": ("U1", "C1")}
+
+    result = client.dm_user("alice@example.com", f"Hi {MENTION_TOKEN}")
+
+    assert result.status == SendStatus.OK
+    assert web.chat_postMessage.call_args.kwargs == {
+        "channel": "C2",
+        "text": "Hi <@U2>",
+    }
+    assert client.recipients == {"alice@example.com": ("U2", "C2")}
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        SlackApiError("msg_too_long", {"ok": False, "error": "msg_too_long"}),
+        TimeoutError("timed out"),
+    ],
+)
+def test_dm_user_cached_recipient_other_error_not_looked_up(exc):
+    web = MagicMock()
+    web.chat_postMessage.side_effect = exc
+    client = _make_client(web)
+    client.recipients = {"alice@example.com": ("U1", "C1")}
+
+    result = client.dm_user("alice@example.com", f"Hi {MENTION_TOKEN}")
+
+    assert result.status == SendStatus.FAILED
+    web.users_lookupByEmail.assert_not_called()
+    assert client.recipients == {"alice@example.com": ("U1", "C1")}
+
+
+# ── TokenBucket ───────────────────────────────────────────────────────────────
+
+
+def test_token_bucket_waits_after_burst():
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(2.0, 2, clock=lambda: now[0], sleep=waits.append)
+
+    for _ in range(4):
+        bucket.acquire()
+    # The burst goes through, then calls are spaced by 1 / rate.
+    assert waits == [pytest.approx(0.5), pytest.approx(1.0)]
+
+    now[0] = 10.0
+    bucket.acquire()
+    assert len(waits) == 2
+
+
+# ── Fake Slack server ─────────────────────────────────────────────────────────
+
+
+class _FakeSlackHandler(BaseHTTPRequestHandler):
+    responses = {
+        "users.lookupByEmail": {"ok": True, "user": {"id": "U12345"}},
+        "conversations.open": {"ok": True, "channel": {"id": "D12345"}},
+        "chat.postMessage": {"ok": True, "ts": "111.222"},
+    }
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        method = self.path.rsplit("/", 1)[-1]
+        self.server.calls.append(method)
+        body = json.dumps(self.responses[method]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_slack():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeSlackHandler)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_dm_user_against_fake_slack_server(fake_slack):
+    base_url = f"http://127.0.0.1:{fake_slack.server_port}/api/"
+    client = SlackClient("xoxb-fake", base_url=base_url)
+
+    results = [client.dm_user("alice@example.com", "hi") for _ in range(3)]
+
+    assert all(r.status == SendStatus.OK for r in results)
+    assert fake_slack.calls == [
+        "users.lookupByEmail",
+        "conversations.open",
+        "chat.postMessage",
+        "chat.postMessage",
+        "chat.postMessage",
+    ]
+
+    # A client preloaded with the recipients of a past run does no lookup.
+    fake_slack.calls.clear()
+    client = SlackClient("xoxb-fake", recipients=client.recipients, base_url=base_url)
+    client.dm_user("alice@example.com", "hi")
+    assert fake_slack.calls == ["chat.postMessage"]
@@ -241,6 +241,25 @@ def test_select_user_jobs_empty_list_returns_no_rows(underusage_db):
     assert underusage_db.exec(stmt).all() == []
 
 
+def test_select_user_jobs_max_jobs_per_user_keeps_ranked_candidates(underusage_db):
+    """Only jobs ranked in the first 2 * max_jobs_per_user by occupancy or by
+    waste come back."""
+    all_rows = underusage_db.exec(
+        _select_user_jobs(None, _WINDOW_START, _WINDOW_END)
+    ).all()
+    ranked_rows = underusage_db.exec(
+        _select_user_jobs(None, _WINDOW_START, _WINDOW_END, max_jobs_per_user=1)
+    ).all()
+    for uid in {r.sarc_user_id for r in all_rows}:
+        jobs = [r for r in all_rows if r.sarc_user_id == uid]
+        ranked = {r.job_db_id for r in ranked_rows if r.sarc_user_id == uid}
+        assert len(ranked) <= 4
+        most_wasteful = max(jobs, key=lambda r: r.rgu_hours - r.rgu_used)
+        assert most_wasteful.job_db_id in ranked
+    # petitbonhomme has more jobs than the candidates kept.
+    assert len(ranked_rows) < len(all_rows)
+
+
 # ── _run_concurrently ─────────────────────────────────────────────────────────
 
 
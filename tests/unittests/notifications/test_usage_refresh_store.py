@@ -166,6 +166,66 @@ def test_upsert_updates_changed_values_in_place(recurring_db, cli_main, monkeypa
     assert len(after) == len(before)
 
 
+# ── Incremental refresh ─────────────────────────────────────────────────────
+
+
+def test_rerun_only_reclassifies_changed_cycles(
+    recurring_db,  # noqa: F811
+    cli_main,
+    monkeypatch,
+    caplog,
+):
+    from tests.unittests.notifications._factory import add_gpu_job
+    from tests.unittests.notifications.test_recurring import _W4_START
+
+    with caplog.at_level("INFO"):
+        assert _run(cli_main, monkeypatch) == 0
+    assert f"{_HISTORY_CYCLES} cycles reclassified, 0 skipped" in caplog.text
+
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        assert _run(cli_main, monkeypatch) == 0
+    assert f"0 cycles reclassified, {_HISTORY_CYCLES} skipped" in caplog.text
+
+    firstuser_id = _user_id(recurring_db, "firstuser")
+    mila_id = _mila_id(recurring_db)
+    before = {
+        r.end_date: r.unused_rguh
+        for r in _stored_rows(recurring_db, user_id=firstuser_id, cluster_id=mila_id)
+    }
+    # A late W-4 job (position 2): W-4 and the 2 cycles whose trailing
+    # recurrence_active_cycles=3 window includes it are reclassified.
+    add_gpu_job(
+        recurring_db,
+        user_id=firstuser_id,
+        cluster_id=mila_id,
+        elapsed_h=20,
+        submit_time=_W4_START,
+        job_id=99998,
+        utilization=0.05,
+    )
+    recurring_db.commit()
+
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        assert _run(cli_main, monkeypatch) == 0
+    assert f"3 cycles reclassified, {_HISTORY_CYCLES - 3} skipped" in caplog.text
+    after = {
+        r.end_date: r.unused_rguh
+        for r in _stored_rows(recurring_db, user_id=firstuser_id, cluster_id=mila_id)
+    }
+    w4_end = _TEST_END - 2 * _14D
+    assert after[w4_end] > before[w4_end]
+    assert {d: v for d, v in after.items() if d != w4_end} == {
+        d: v for d, v in before.items() if d != w4_end
+    }
+
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        assert _run(cli_main, monkeypatch, "--full") == 0
+    assert f"{_HISTORY_CYCLES} cycles reclassified, 0 skipped" in caplog.text
+
+
 # ── elevated matches _restrictive_action_flags ──────────────────────────────
 
 
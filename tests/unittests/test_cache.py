@@ -1,9 +1,12 @@
+import os
+import socket
 from datetime import UTC, datetime, timedelta, timezone
 from zipfile import ZIP_LZMA, ZipFile
 
 import gifnoc
+import pytest
 
-from sarc.cache import Cache, CacheEntry
+from sarc.cache import INDEX_NAME, Cache, CacheEntry, CacheIndex, CacheWrite
 from sarc.utils import ensure_utc
 
 
@@ -384,3 +387,73 @@ def test_cache_proper_iteration(enabled_cache):
     assert len(data1) == 9
     data2 = list(cache.read_from(datetime(2022, 4, 1, tzinfo=UTC)))
     assert len(data2) == 3
+
+
+def test_cache_index_counts_entries(tmp_path):
+    with gifnoc.overlay({"sarc.cache": str(tmp_path)}):
+        index = CacheIndex(tmp_path)
+        cache = Cache("jobs")
+        cache.save("a", datetime(2024, 3, 15, 10, tzinfo=UTC), b"x" * 1000)
+        with cache.create_entry(datetime(2024, 3, 16, 10, tzinfo=UTC)) as ce:
+            ce.add_value("b", b"y" * 1000)
+            # Registered while it is written, by this very process
+            (write,) = index.writes()
+            assert write.path == "jobs/2024/03/16/10:00:00.current"
+            assert write.in_progress()
+        Cache("prometheus").save("c", datetime(2024, 4, 1, tzinfo=UTC), b"z")
+
+    assert index.writes() == []
+    sizes = {(size.subdirectory, size.month): size for size in index.sizes()}
+    assert set(sizes) == {("jobs", "2024/03"), ("prometheus", "2024/04")}
+    assert sizes["jobs", "2024/03"].files == 2
+    on_disk = sum(
+        path.stat().st_size
+        for path in tmp_path.rglob("*")
+        if path.is_file() and path.name != INDEX_NAME
+    )
+    assert index.total_size() == on_disk
+    # Never computed from disk
+    assert not index.is_reconciled()
+
+
+def test_cache_index_reconcile(tmp_path):
+    with gifnoc.overlay({"sarc.cache": str(tmp_path)}):
+        Cache("jobs").save("a", datetime(2024, 3, 15, 10, tzinfo=UTC), b"x" * 1000)
+    # Written by other means than Cache
+    (tmp_path / "notes.txt").write_bytes(b"1234")
+    day_dir = tmp_path / "users" / "2024" / "01" / "02"
+    day_dir.mkdir(parents=True)
+    (day_dir / "03:00:00.000.current").write_bytes(b"12")
+
+    index = CacheIndex(tmp_path)
+    index.reconcile()
+    assert index.is_reconciled()
+    sizes = {(size.subdirectory, size.month): size.bytes for size in index.sizes()}
+    assert sizes["", ""] == 4
+    assert sizes["users", "2024/01"] == 2
+    assert index.total_size() == sum(sizes.values())
+    (write,) = index.writes()
+    assert write.path == "users/2024/01/02/03:00:00.000.current"
+    # Left behind by a process we know nothing about
+    assert write.pid is None
+    assert not write.in_progress()
+
+
+def test_cache_index_reuses_connection(tmp_path):
+    index = CacheIndex(tmp_path)
+    with index._connect() as conn:
+        pass
+    with CacheIndex(tmp_path)._connect() as conn2:
+        assert conn2 is conn
+
+    # Removed, e.g. to rebuild it: created again.
+    (tmp_path / INDEX_NAME).unlink()
+    index.start_write(tmp_path / "x.current")
+    assert [write.path for write in index.writes()] == ["x.current"]
+
+
+def test_cache_write_of_dead_process():
+    write = CacheWrite("x.current", socket.gethostname(), 2**22 + 1, None)
+    with pytest.raises(ProcessLookupError):
+        os.kill(write.pid, 0)
+    assert not write.in_progress()
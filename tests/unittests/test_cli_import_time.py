@@ -0,0 +1,120 @@
+"""
+Regression test for the cold-start time of the `sarc` command.
+
+Commands are run by timers many times a day, so `sarc --help` must not import
+heavy dependencies: subcommands (and what they need) are only imported when
+they are actually dispatched.
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Modules that must only be imported by the subcommands that need them.
+HEAVY_MODULES = [
+    "fabric",
+    "fastapi",
+    "numpy",
+    "opentelemetry.instrumentation.sqlalchemy",
+    "pandas",
+    "paramiko",
+    "prometheus_api_client",
+    "rapporteur",
+    "slack_sdk",
+]
+
+# Generous bound on the cumulative import time of `sarc.cli`, in microseconds.
+IMPORT_TIME_BUDGET_US = 1_500_000
+
+
+def _write_config(tmp_path) -> Path:
+    cfg = tmp_path / "sarc.yaml"
+    cfg.write_text(
+        textwrap.dedent("""\
+        sarc:
+          db:
+            host: localhost
+            name: sarc-test
+          clusters: {}
+          patches: patches
+    """)
+    )
+    return cfg
+
+
+def _importtime(tmp_path, *args: str) -> dict[str, int]:
+    """Run `python -X importtime -m sarc <args>`, return cumulative times per module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "sarc", *args],
+        env={**os.environ, "SARC_CONFIG": str(_write_config(tmp_path))},
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+
+    # Lines look like: "import time:       123 |       4567 |   package.module"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _self, cumulative, module = line.split(":", 1)[1].split("|")
+        if not cumulative.strip().isdigit():
+            # Header line
+            continue
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_help_does_not_import_heavy_modules(tmp_path):
+    times = _importtime(tmp_path, "--help")
+    assert "sarc.cli" in times
+    imported = [
+        module
+        for module in HEAVY_MODULES
+        if any(name == module or name.startswith(f"{module}.") for name in times)
+    ]
+    assert imported == []
+
+
+def test_help_import_time_budget(tmp_path):
+    times = _importtime(tmp_path, "--help")
+    assert times["sarc.cli"] < IMPORT_TIME_BUDGET_US
+
+
+def _loaded_modules(tmp_path, *args: str) -> set[str]:
+    """Run `sarc <args>`, return the modules imported when it exits.
+
+    NB: -X importtime does not report the modules imported with
+    importlib.import_module, which is how subcommands are loaded.
+    """
+    script = textwrap.dedent("""\
+        import atexit, runpy, sys
+        atexit.register(lambda: print("\\n".join(sys.modules), file=sys.stderr))
+        runpy.run_module("sarc", run_name="__main__", alter_sys=True)
+    """)
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        env={**os.environ, "SARC_CONFIG": str(_write_config(tmp_path))},
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    return set(result.stderr.splitlines())
+
+
+def test_subcommand_help_imports_only_its_group(tmp_path):
+    modules = _loaded_modules(tmp_path, "fetch", "jobs", "--help")
+    assert "sarc.cli.fetch.jobs" in modules
+    assert "sarc.cli.fetch.prometheus" not in modules
+    assert "sarc.cli.parse" not in modules
+    assert "sarc.cli.usage" not in modules
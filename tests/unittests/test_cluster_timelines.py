@@ -0,0 +1,63 @@
+from datetime import UTC, date, datetime
+
+import pytest
+
+from sarc.db.cluster import GPUBillingDB, NodeGPUMappingDB, SlurmClusterDB
+
+
+def _dt(month: int) -> datetime:
+    return datetime(2024, month, 1, tzinfo=UTC)
+
+
+def _cluster(id: int, mappings: dict[int, str], billings: dict[int, float]):
+    return SlurmClusterDB(
+        id=id,
+        name=f"cluster{id}",
+        domain="domain",
+        start_date=date(2024, 1, 1),
+        node_gpu_mapping=[
+            NodeGPUMappingDB(cluster_id=id, since=_dt(month), node_to_gpu={"n": [gpu]})
+            for month, gpu in mappings.items()
+        ],
+        gpu_billing=[
+            GPUBillingDB(cluster_id=id, since=_dt(month), gpu_to_billing={"g": value})
+            for month, value in billings.items()
+        ],
+    )
+
+
+@pytest.fixture
+def clusters():
+    yield (_cluster(1, {6: "h100", 3: "a100"}, {3: 1.0, 6: 2.0}), _cluster(2, {}, {}))
+    SlurmClusterDB.clear_timelines()
+
+
+def test_get_node_to_gpu(clusters):
+    cluster, empty = clusters
+    assert cluster.get_node_to_gpu().node_to_gpu == {"n": ["h100"]}
+    # Before the first mapping, the first one is assumed.
+    assert cluster.get_node_to_gpu(_dt(1)).node_to_gpu == {"n": ["a100"]}
+    assert cluster.get_node_to_gpu(_dt(3)).node_to_gpu == {"n": ["a100"]}
+    assert cluster.get_node_to_gpu(_dt(7)).node_to_gpu == {"n": ["h100"]}
+    assert empty.get_node_to_gpu() is None
+    assert empty.get_node_to_gpu(_dt(7)) is None
+
+
+def test_get_gpu_billing(clusters):
+    cluster, empty = clusters
+    assert cluster.get_gpu_billing().gpu_to_billing == {"g": 2.0}
+    # No billing before the first one.
+    assert cluster.get_gpu_billing(_dt(1)) is None
+    assert cluster.get_gpu_billing(_dt(5)).gpu_to_billing == {"g": 1.0}
+    assert empty.get_gpu_billing() is None
+
+
+def test_timelines_cached_until_cleared(clusters):
+    cluster, _ = clusters
+    assert cluster.get_node_to_gpu(_dt(7)).node_to_gpu == {"n": ["h100"]}
+    cluster.node_gpu_mapping.append(
+        NodeGPUMappingDB(cluster_id=1, since=_dt(7), node_to_gpu={"n": ["l40s"]})
+    )
+    assert cluster.get_node_to_gpu(_dt(7)).node_to_gpu == {"n": ["h100"]}
+    SlurmClusterDB.clear_timelines()
+    assert cluster.get_node_to_gpu(_dt(7)).node_to_gpu == {"n": ["l40s"]}
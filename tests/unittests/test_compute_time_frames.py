@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from sarc.client.series import compute_time_frames
+from sarc.config import UTC
+
+
+def _dt(day: int, hour: int = 0) -> datetime:
+    return datetime(2023, 3, day, hour, tzinfo=UTC)
+
+
+@pytest.fixture
+def jobs():
+    return pd.DataFrame(
+        [
+            [_dt(5), _dt(6), "a", 10.0],
+            [_dt(6), _dt(9), "a", 10.0],
+            [_dt(6), _dt(7), "b", 20.0],
+            # Ends on a frame boundary: not in the next frame.
+            [_dt(6), _dt(7, 0), "b", 20.0],
+            [_dt(7, 12), pd.NaT, "c", 5.0],
+            [pd.NaT, _dt(8), "c", 5.0],
+        ],
+        columns=["start_time", "end_time", "user", "cost"],
+        index=[10, 11, 12, 13, 14, 15],
+    )
+
+
+def test_compute_time_frames(jobs):
+    frames = compute_time_frames(
+        jobs, columns=["cost"], end=_dt(9), frame_size=timedelta(days=2)
+    )
+    # Ordered by frame, then as the jobs; jobs without a start or end are left out.
+    assert list(frames.index) == [10, 11, 12, 13, 11]
+    assert list(frames["timestamp"]) == [_dt(5)] * 4 + [_dt(7)]
+    assert list(frames["start_time"]) == [_dt(5), _dt(6), _dt(6), _dt(6), _dt(7)]
+    assert list(frames["end_time"]) == [_dt(6), _dt(7), _dt(7), _dt(7), _dt(9)]
+    assert list(frames["duration"]) == [86400.0] * 4 + [172800.0]
+    assert list(frames["cost"]) == pytest.approx([10.0, 10 / 3, 20.0, 20.0, 20 / 3])
+    assert list(frames.columns) == [*jobs.columns, "duration", "timestamp"]
+
+
+def test_compute_time_frames_explicit_window(jobs):
+    frames = compute_time_frames(
+        jobs, start=_dt(7, 6), end=_dt(8), frame_size=timedelta(hours=12)
+    )
+    # No frame starts after `end`; only job 11 overlaps the two frames.
+    assert list(frames.index) == [11, 11]
+    assert list(frames["timestamp"]) == [_dt(7, 6), _dt(7, 18)]
+    assert list(frames["end_time"]) == [_dt(7, 18), _dt(8, 6)]
+    assert list(frames["duration"]) == [43200.0] * 2
@@ -0,0 +1,69 @@
+import pytest
+
+from sarc.cli.daemon import Task, run_schedule, run_task
+
+
+class FakeClock:
+    """Clock and stop event: waiting advances the clock, until `until`."""
+
+    def __init__(self, until: float):
+        self.now = 0.0
+        self.until = until
+        self.waits = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def is_set(self) -> bool:
+        return self.now >= self.until
+
+    def wait(self, timeout: float) -> None:
+        self.waits.append(timeout)
+        self.now += timeout
+
+
+def test_run_schedule_periods():
+    clock = FakeClock(until=3600)
+    runs = []
+    tasks = [
+        Task("jobs", 1200, lambda: runs.append(("jobs", clock.now))),
+        Task("health", 1800, lambda: runs.append(("health", clock.now))),
+    ]
+    run_schedule(tasks, clock, clock)
+    assert runs == [
+        ("jobs", 0),
+        ("health", 0),
+        ("jobs", 1200),
+        ("health", 1800),
+        ("jobs", 2400),
+    ]
+
+
+def test_run_schedule_keeps_pipeline_order():
+    clock = FakeClock(until=1)
+    runs = []
+    tasks = [Task(name, 60, lambda name=name: runs.append(name)) for name in "abc"]
+    run_schedule(tasks, clock, clock)
+    assert runs == ["a", "b", "c"]
+
+
+def test_run_task_logs_errors(caplog):
+    def fail():
+        raise RuntimeError("ssh down")
+
+    task = Task("jobs", 60, fail)
+    run_task(task, lambda: 100.0)
+    assert task.next_run == 160.0
+    assert "jobs failed: RuntimeError: ssh down" in caplog.text
+
+
+def test_overrun_runs_next_right_away():
+    clock = FakeClock(until=100)
+
+    def slow():
+        clock.now += 90
+
+    task = Task("slow", 60, slow)
+    run_schedule([task], clock, clock)
+    # Started at 0 and 90: the second run did not wait for 120.
+    assert clock.waits[0] == pytest.approx(0)
@@ -9,3 +9,9 @@ def test_engine_url_with_port():
 def test_engine_url_without_port():
     url = DbConfig(host="myhost", name="mydb", user="myuser").engine.url
     assert url.port is None
+
+
+def test_engine_pool_pre_ping_opt_in():
+    assert not DbConfig(host="myhost", name="mydb", user="u").engine.pool._pre_ping
+    db = DbConfig(host="myhost", name="mydb", user="u", pool_pre_ping=True)
+    assert db.engine.pool._pre_ping
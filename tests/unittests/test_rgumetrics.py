@@ -1,6 +1,9 @@
+import numpy as np
+import pandas as pd
 import pytest
 
-from sarc.client.rgumetrics import GpuError, get_gpu_type_rgu
+from sarc.client.rgumetrics import GpuError, get_gpu_type_rgu, get_gpu_types_rgu
+from sarc.db.job import get_rgus
 
 THRESHOLD = 1e-10
 
@@ -75,3 +78,27 @@ def test_get_gpu_type_rgu_unknown_gpu():
 def test_get_gpu_type_rgu_unknown_mig_main_type():
     with pytest.raises(GpuError, match="Unknown GPU type for MIGs: FAKE-GPU"):
         get_gpu_type_rgu("FAKE-GPU: 1g.10gb")
+
+
+def test_get_gpu_types_rgu():
+    gpu_types = pd.Series(
+        ["A100-SXM4-40GB", None, "H100-SXM5-80GB: 1g.10gb", "A100-SXM4-40GB", np.nan]
+    )
+    np.testing.assert_allclose(
+        get_gpu_types_rgu(gpu_types), [4.0, np.nan, 1.74, 4.0, np.nan], rtol=THRESHOLD
+    )
+    np.testing.assert_allclose(
+        get_gpu_types_rgu(["H100-SXM5-80GB: 1g.10gb"], mig_ref="mila"),
+        [RGU_H100 / 8],
+        rtol=THRESHOLD,
+    )
+    assert get_gpu_types_rgu([]).shape == (0,)
+    with pytest.raises(GpuError, match="No RGU for FAKE-GPU"):
+        get_gpu_types_rgu(["A100-SXM4-40GB", "FAKE-GPU"])
+
+
+def test_get_rgus_returns_a_copy():
+    rgus = get_rgus()
+    rgus["A100-SXM4-40GB"] = 0.0
+    assert get_rgus()["A100-SXM4-40GB"] == 4.0
+    assert get_gpu_type_rgu("A100-SXM4-40GB") == 4.0
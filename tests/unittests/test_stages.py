@@ -0,0 +1,93 @@
+import io
+from datetime import UTC, datetime
+from zipfile import ZipFile
+
+import pytest
+
+from sarc.cache import CacheEntry
+from sarc.stages import (
+    accumulated_stage,
+    disable_stage_profile,
+    enable_stage_profile,
+    format_stage_profile,
+    using_stage,
+)
+
+
+@pytest.fixture
+def profile():
+    yield enable_stage_profile()
+    disable_stage_profile()
+
+
+def test_using_stage(profile):
+    for _ in range(3):
+        with using_stage("decode", cluster="raisin") as stage:
+            stage.add(rows=10, nbytes=100)
+
+    totals = profile["decode"]
+    assert totals.calls == 3
+    assert totals.rows == 30
+    assert totals.bytes == 300
+    assert totals.seconds > 0
+
+
+def test_using_stage_records_on_error(profile):
+    with pytest.raises(ValueError):
+        with using_stage("decode") as stage:
+            stage.add(rows=1)
+            raise ValueError("bad payload")
+
+    assert profile["decode"].calls == 1
+    assert profile["decode"].rows == 1
+
+
+def test_accumulated_stage_only_counts_timed_parts(profile):
+    with accumulated_stage("upsert") as stage:
+        for _ in range(5):
+            with stage.timed():
+                pass
+            stage.add(rows=2)
+
+    totals = profile["upsert"]
+    assert totals.calls == 1
+    assert totals.rows == 10
+
+
+def test_no_profile_by_default():
+    # Nothing to check but that it does not fail without a profile.
+    with using_stage("decode") as stage:
+        stage.add(rows=1)
+
+
+def test_cache_entry_stages(profile):
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode="w") as zf:
+        ce = CacheEntry(zf, datetime(2024, 1, 1, tzinfo=UTC))
+        ce.add_value("a", b"12345")
+        ce.add_value("b", b"678")
+    ce = CacheEntry(ZipFile(buffer), datetime(2024, 1, 1, tzinfo=UTC))
+    assert list(ce.items()) == [("a", b"12345"), ("b", b"678")]
+
+    assert profile["cache.write"].calls == 2
+    assert profile["cache.write"].bytes == 8
+    assert profile["cache.read"].calls == 1
+    assert profile["cache.read"].rows == 2
+    assert profile["cache.read"].bytes == 8
+
+
+def test_format_stage_profile(profile):
+    with using_stage("fast") as stage:
+        stage.add(rows=1)
+    with using_stage("slow") as stage:
+        stage.add(nbytes=3 * 2**20)
+    profile["slow"].seconds = 2.0
+    profile["fast"].seconds = 1.0
+
+    table = format_stage_profile(profile, 4.0)
+    lines = table.splitlines()
+    assert lines[0].split()[0] == "stage"
+    assert lines[1].split()[:4] == ["slow", "1", "2.000", "50.0%"]
+    assert "3.0 MiB" in lines[1]
+    assert lines[2].split()[:4] == ["fast", "1", "1.000", "25.0%"]
+    assert lines[-1].split() == ["wall", "time", "4.000"]